@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+全变量两两的超前/滞后相关（交叉相关）及显著性。
+
+r[l, i, j] = corr(x_i(t), x_j(t+l))，即变量 i 超前 l 期与变量 j 的皮尔逊相关，
+只用两序列重叠的 T-|l| 期，与 df[i].corr(df[j].shift(-l)) 一致。
+计算一次完成：
+    交叉积 Σ x_i(t)·x_j(t+l)   对全部列做一次 rfft，两两相乘后 irfft 得到所有 (i, j, l)
+    重叠段的和与平方和          由累积和的前缀/后缀相减得到
+p 值为重叠期数 T-|l| 下相关系数的 t 检验（双侧）。序列自相关较强时 p 值偏小，
+宜对平稳化后的数据解读。
+
+用法：
+    from 交叉相关 import cross_correlation, best_lags
+    lc = cross_correlation(df_clean, max_lag=12)
+    best_lags(lc)                   # 每对变量相关最强的滞后
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.fft import irfft, next_fast_len, rfft
+
+# r/p 形状为 (2L+1, k, k)：[滞后, 变量 i, 变量 j]；n 为各滞后的重叠期数
+LagCorr = namedtuple('LagCorr', ['names', 'lags', 'r', 'p', 'n'])
+
+
+def cross_correlation(df, max_lag):
+    """df 的各列两两在 -max_lag..max_lag 的滞后相关，返回 LagCorr"""
+    if df.isna().any().any():
+        raise ValueError("交叉相关要求数据没有缺失值，请先插补")
+    X = df.to_numpy(dtype=float)
+    T, k = X.shape
+    if not 0 <= max_lag <= T - 3:
+        raise ValueError(f"滞后阶数须在 0..{T - 3} 之间（共 {T} 期）")
+    X = X - X.mean(axis=0)            # 不改变相关系数，减小交叉积的舍入误差
+
+    nfft = next_fast_len(2 * T - 1, real=True)
+    F = rfft(X, nfft, axis=0)                                        # (nf, k)
+    cross = irfft(F.conj()[:, :, None] * F[:, None, :], nfft, axis=0)  # (nfft, k, k)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    n = T - np.abs(lags)
+    sxy = cross[lags % nfft]                                         # (2L+1, k, k)
+    c1 = np.vstack([np.zeros(k), np.cumsum(X, axis=0)])
+    c2 = np.vstack([np.zeros(k), np.cumsum(X * X, axis=0)])
+    # 滞后 l ≥ 0 时 x_i 取前 n 期、x_j 取后 n 期；l < 0 时相反
+    lead = (lags >= 0)[:, None]
+    head1, tail1 = c1[n], c1[T] - c1[T - n]
+    head2, tail2 = c2[n], c2[T] - c2[T - n]
+    si, sj = np.where(lead, head1, tail1), np.where(lead, tail1, head1)
+    sii, sjj = np.where(lead, head2, tail2), np.where(lead, tail2, head2)
+
+    m = n[:, None, None]
+    cov = sxy - si[:, :, None] * sj[:, None, :] / m
+    # 重叠段内为常数的序列（插补出的平坦段）方差按 0 处理，相关系数记为 NaN
+    tol = 1e-10 * c2[T]
+    var_i = sii - si ** 2 / n[:, None]
+    var_j = sjj - sj ** 2 / n[:, None]
+    var_i, var_j = np.where(var_i > tol, var_i, np.nan), np.where(var_j > tol, var_j, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = cov / np.sqrt(var_i[:, :, None] * var_j[:, None, :])
+        r = np.clip(r, -1.0, 1.0)
+        t = r * np.sqrt((m - 2) / (1 - r ** 2))
+    p = 2 * stats.t.sf(np.abs(t), m - 2)
+    return LagCorr(list(df.columns), lags, r, p, n)
+
+
+def best_lags(lc):
+    """
+    每对变量（i < j）绝对相关最大的滞后。滞后为正表示 变量1 超前 变量2。
+    返回列：变量1、变量2、最佳滞后、相关系数、p值、重叠期数、同期相关
+    """
+    k = len(lc.names)
+    i, j = np.triu_indices(k, 1)
+    r = lc.r[:, i, j]                                   # (2L+1, 对数)
+    valid = ~np.isnan(r).all(axis=0)
+    best = np.abs(np.nan_to_num(r)).argmax(axis=0)
+    cols = np.arange(len(i))
+    zero = int(np.flatnonzero(lc.lags == 0)[0]) if (lc.lags == 0).any() else None
+    out = pd.DataFrame({
+        '变量1': np.array(lc.names)[i],
+        '变量2': np.array(lc.names)[j],
+        '最佳滞后': lc.lags[best],
+        '相关系数': r[best, cols],
+        'p值': lc.p[best, i, j],
+        '重叠期数': lc.n[best],
+        '同期相关': r[zero] if zero is not None else np.nan,
+    })
+    return out[valid].sort_values('相关系数', key=np.abs, ascending=False).reset_index(drop=True)
+
+
+def plot_lag_grid(lc, labels=None, alpha=0.05, max_pairs=40):
+    """
+    紧凑的滞后热力图：每行一对变量，每列一个滞后，颜色为相关系数；
+    按最强相关排序取前 max_pairs 对，p < alpha 的格子加点标记，最佳滞后加框。
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.patches import Rectangle
+
+    labels = labels or {}
+    top = best_lags(lc).head(max_pairs)
+    idx = {name: n for n, name in enumerate(lc.names)}
+    i, j = top['变量1'].map(idx).to_numpy(), top['变量2'].map(idx).to_numpy()
+    r = lc.r[:, i, j].T                                # (对数, 2L+1)
+    p = lc.p[:, i, j].T
+    rows = [f"{labels.get(a, a)} → {labels.get(b, b)}" for a, b in zip(top['变量1'], top['变量2'])]
+
+    fig, ax = plt.subplots(figsize=(max(6, 0.35 * len(lc.lags) + 4), max(3, 0.3 * len(rows) + 1.5)))
+    sns.heatmap(pd.DataFrame(r, index=rows, columns=lc.lags), cmap='coolwarm', vmin=-1, vmax=1,
+                linewidths=0.3, ax=ax, cbar_kws={'label': '相关系数'})
+    yy, xx = np.nonzero(p < alpha)
+    ax.scatter(xx + 0.5, yy + 0.5, s=4, c='k')
+    best = np.searchsorted(lc.lags, top['最佳滞后'].to_numpy())
+    for row, col in enumerate(best):
+        ax.add_patch(Rectangle((col, row), 1, 1, fill=False, edgecolor='k', lw=1.2))
+    ax.set_xlabel('滞后（正值：左侧变量超前）', fontproperties='SimHei')
+    ax.set_ylabel('')
+    ax.set_title('超前/滞后相关（点：p < %.2f，框：最佳滞后）' % alpha, fontproperties='SimHei')
+    plt.yticks(fontproperties='SimHei', fontsize=8)
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+分地区的奶价分析：地区 × 时期的长表面板，逐地区并行运行 平稳化 → VAR → IRF，并给出合并面板估计。
+
+奶价取自 全国主产省生鲜乳价格 工作簿中 地区 列的每个取值（面板.SERIES 中的 MilkPrice 规则去掉
+地区 == 全国 的筛选），与全国层面的协变量（乳制品进口量、玉米价格、人均消费量）对齐到同一日历。
+每个地区的序列在进程池中独立建模；合并估计把各地区平稳化、标准化后的数据按地区去均值
+（地区固定效应）后堆叠，用 OLS 估计共同的 VAR 系数。全国是各省的汇总，有省级数据时
+不参与合并，只有全国一个地区时才用它。
+
+用法：
+    python 区域分析.py --freq M
+    python 数据分析.py --freq M --regional
+"""
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from 面板 import SERIES, build_panel
+from 脉冲响应 import ma_coefs
+from 滚动VAR import design
+
+MILK_SOURCE = '全国主产省生鲜乳价格（已补充最新数据）'
+COVARIATES = ['DairyImport', 'CornPrice', 'PerCapitaConsumption']
+VARS_SEL = ['MilkPrice', *COVARIATES]
+POOLED = '合并'
+NATIONAL = '全国'
+
+
+def regions(frames):
+    """奶价工作簿中出现的地区（全国排在最前）"""
+    names = frames[MILK_SOURCE]['地区'].dropna().astype(str).unique().tolist()
+    return sorted(names, key=lambda r: (r != NATIONAL, r))
+
+
+def region_panel(frames, freq='M', start=None, end=None):
+    """
+    长表面板：索引为 (地区, 时期)，列为 MilkPrice 与全国协变量。
+    各地区奶价与协变量共用一个日历，协变量在各地区间相同。
+    """
+    milk = next(s for s in SERIES if s['name'] == 'MilkPrice')
+    specs = [dict(milk, name=r, where=lambda df, r=r: df['地区'] == r) for r in regions(frames)]
+    specs += [s for s in SERIES if s['name'] in COVARIATES]
+    wide = build_panel(frames, specs, freq, start, end)
+    names = [s['name'] for s in specs[:len(specs) - len(COVARIATES)]]
+    period = wide.index.name
+    long = wide[names].reset_index().melt(id_vars=period, var_name='地区', value_name='MilkPrice')
+    long = long.join(wide[COVARIATES], on=period)
+    return long.set_index(['地区', period])
+
+
+def _prepare(df, freq):
+    """
+    截到该地区奶价首末观测之间（各地区共用全国日历，首尾的空段会被插补成平坦序列），
+    再 插补 → 平稳化 → 标准化。返回 (标准化数据, 是否差分, 最大滞后)
+    """
+    from 数据分析 import clean, make_stationary, max_lag, standardize
+    first, last = df['MilkPrice'].first_valid_index(), df['MilkPrice'].last_valid_index()
+    if first is None:
+        raise ValueError("该地区没有奶价数据")
+    df = clean(df.loc[first:last]).dropna(axis=1, how='all')
+    stationary = make_stationary(df)
+    return standardize(stationary), len(stationary) < len(df), max_lag(len(stationary), freq)
+
+
+def _irf_row(region, phi, names, lag, nobs, differenced):
+    """MilkPrice 对各变量冲击的累计响应与峰值响应"""
+    row = {'地区': region, '样本期数': nobs, '差分': differenced, '滞后': lag}
+    m = names.index('MilkPrice')
+    for j, shock in enumerate(names):
+        path = phi[:, m, j]
+        row[f'{shock}_累计'] = path.sum()
+        row[f'{shock}_峰值'] = path[np.abs(path).argmax()]
+    return row
+
+
+def analyze_region(task):
+    """进程池任务：单个地区的 平稳化 → VAR → IRF，返回汇总行（失败时含 错误 字段）"""
+    from 数据分析 import select_lag
+    from statsmodels.tsa.api import VAR
+
+    region, df, freq, periods = task
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            scaled, differenced, maxlag = _prepare(df, freq)
+            if 'MilkPrice' not in scaled:
+                raise ValueError("该地区没有奶价数据")
+            names = [v for v in VARS_SEL if v in scaled]
+            lag = select_lag(scaled[names], maxlag)
+            res = VAR(scaled[names]).fit(lag)
+            phi = res.irf(periods).irfs
+        except (ValueError, np.linalg.LinAlgError) as e:
+            return {'地区': region, '错误': str(e)}
+    return _irf_row(region, phi, names, lag, res.nobs, differenced)
+
+
+def pooled_var(panel, freq='M', periods=10, lag=None):
+    """
+    合并面板 VAR（地区固定效应）：各地区分别平稳化、标准化，
+    构造滞后回归矩阵后按地区去均值并堆叠，OLS 估计共同系数。返回汇总行。
+    有其它可用地区时不含全国（全国由各省汇总而来，合并会重复计数）。
+    """
+    from 数据分析 import select_lag
+
+    blocks, frames = [], {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for region, df in panel.groupby(level='地区'):
+            try:
+                scaled, differenced, maxlag = _prepare(df.droplevel('地区'), freq)
+            except (ValueError, np.linalg.LinAlgError):
+                continue                                      # 与 analyze_region 一样跳过该地区
+            if set(VARS_SEL) <= set(scaled.columns):
+                frames[region] = (scaled[VARS_SEL], differenced, maxlag)
+        if not frames:
+            raise ValueError("没有可用于合并估计的地区")
+        if len(frames) > 1:
+            frames.pop(NATIONAL, None)
+        if lag is None:
+            # 各地区 AIC 滞后阶数的中位数
+            lag = int(np.median([select_lag(s, m) for s, _, m in frames.values()]))
+        # 样本期数不超过滞后阶数的地区构造不出回归矩阵
+        frames = {r: f for r, f in frames.items() if len(f[0]) > lag + 1}
+        if not frames:
+            raise ValueError("没有样本期数足够的地区")
+    for scaled, _, _ in frames.values():
+        X, Z = design(scaled.to_numpy(dtype=float), lag)
+        X = X[:, 1:]                                          # 常数项由去均值代替
+        blocks.append((X - X.mean(axis=0), Z - Z.mean(axis=0)))
+    X = np.vstack([b[0] for b in blocks])
+    Z = np.vstack([b[1] for b in blocks])
+    B = np.linalg.lstsq(X, Z, rcond=None)[0]                 # (kp, k)
+    k = len(VARS_SEL)
+    A = B.reshape(lag, k, k).transpose(0, 2, 1)
+    phi = ma_coefs(A, periods)
+    differenced = all(d for _, d, _ in frames.values())
+    row = _irf_row(POOLED, phi, VARS_SEL, lag, X.shape[0], differenced)
+    row['地区数'] = len(frames)
+    return row
+
+
+def run_regions(frames, freq='M', periods=10, start=None, end=None, max_workers=None):
+    """各地区并行建模并加上合并估计，返回汇总表（每个地区一行，最后一行为合并）"""
+    panel = region_panel(frames, freq, start, end)
+    tasks = [(region, df.droplevel('地区'), freq, periods)
+             for region, df in panel.groupby(level='地区', sort=False)]
+    if max_workers == 1 or len(tasks) == 1:
+        rows = [analyze_region(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            rows = list(pool.map(analyze_region, tasks))
+    try:
+        rows.append(pooled_var(panel, freq, periods))
+    except ValueError as e:
+        rows.append({'地区': POOLED, '错误': str(e)})
+    return pd.DataFrame(rows).set_index('地区')
+
+
+def main():
+    from 数据读取 import load_sources
+
+    parser = argparse.ArgumentParser(description='分地区奶价的并行 VAR/IRF 分析')
+    parser.add_argument('--freq', choices=['Y', 'M'], default='M')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--periods', type=int, default=10, help='脉冲响应期数')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--out', default='区域分析.xlsx')
+    args = parser.parse_args()
+
+    frames = load_sources()
+    summary = run_regions(frames, args.freq, args.periods, args.start, args.end, args.workers)
+    print(f"共 {len(summary) - 1} 个地区：奶价对各变量冲击的 {args.periods} 期累计/峰值响应")
+    print(summary.round(4).to_string())
+    summary.to_excel(args.out)
+
+
+if __name__ == '__main__':
+    main()
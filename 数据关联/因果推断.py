@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+DoWhy 因果推断的批量运行：多组 处理→结果、多种估计方法与反驳检验并行执行。
+
+每组 (处理, 结果, 共同原因) 只识别一次估计量（identify_effect），识别结果按数据哈希缓存到
+.cache/因果推断/；随后把 估计方法 × 反驳检验 拆成独立任务分配到进程池，
+每个任务在工作进程内重建 CausalModel、用缓存的估计量估计效应，再跑一个反驳检验。
+各任务的结果（纯数值）按 数据哈希 + 任务参数 缓存，数据未变时重跑直接读缓存。
+
+估计方法（处理变量均为连续变量，倾向得分/匹配类方法只适用于二值处理，不在其列）：
+    backdoor.linear_regression      线性回归，共同原因的影响假定为线性
+    backdoor.econml.dml.LinearDML   双重机器学习：结果与处理对共同原因的依赖用随机森林交叉拟合，
+                                    再对两者的残差做回归，不要求共同原因的影响为线性
+
+dowhy 与 econml 为可选依赖，只在实际计算时导入；没有安装 econml 时跳过 LinearDML。
+
+用法：
+    from 因果推断 import run_causal
+    summary = run_causal(df_clean, pairs=[('DairyImport', 'MilkPrice')], simulations=100)
+
+    python 因果推断.py --freq Y --simulations 100
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, '.cache', '因果推断')
+
+# 处理 → 结果
+DEFAULT_PAIRS = [
+    ('DairyImport', 'MilkPrice'),
+    ('CornPrice', 'MilkPrice'),
+    ('FeedImport', 'MilkPrice'),
+    ('PerCapitaConsumption', 'MilkPrice'),
+    ('MilkPrice', 'MilkOutput'),
+]
+# 候选共同原因，每组去掉自身的处理与结果变量
+DEFAULT_COMMON_CAUSES = ['CornPrice', 'PerCapitaConsumption', 'MilkOutput']
+
+DML = 'backdoor.econml.dml.LinearDML'
+# 估计方法 → 参数（LinearDML 的参数由 _method_params 换成 econml 的 method_params）
+ESTIMATORS = {
+    'backdoor.linear_regression': None,
+    DML: {'n_estimators': 50, 'min_samples_leaf': 2, 'cv': 3},
+}
+# 反驳检验 → 额外参数（num_simulations 另行统一设置）
+REFUTERS = {
+    'random_common_cause': {},
+    'placebo_treatment_refuter': {'placebo_type': 'permute'},
+    'data_subset_refuter': {'subset_fraction': 0.8},
+    'bootstrap_refuter': {},
+}
+
+COLUMNS = ['处理', '结果', '估计方法', '检验', '估计值', '检验后效应', 'p值', '模拟次数', '耗时(秒)']
+
+
+def data_key(data, *spec):
+    """数据内容与任务参数的哈希"""
+    h = hashlib.sha256()
+    h.update(json.dumps(list(data.columns), ensure_ascii=False).encode())
+    h.update(np.ascontiguousarray(data.to_numpy(dtype=float)).tobytes())
+    h.update(json.dumps(spec, ensure_ascii=False, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _load_cache(path):
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    return {}
+
+
+def _save_cache(obj, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def _causal_model(data, treatment, outcome, common_causes):
+    from dowhy import CausalModel
+    return CausalModel(data=data, treatment=treatment, outcome=outcome,
+                       common_causes=list(common_causes))
+
+
+def identify(data, treatment, outcome, common_causes, cache_dir=CACHE_DIR):
+    """识别估计量；同一数据与变量组合只识别一次"""
+    if not cache_dir:
+        return _causal_model(data, treatment, outcome, common_causes).identify_effect()
+    path = os.path.join(cache_dir, 'estimand',
+                        data_key(data, treatment, outcome, common_causes) + '.pkl')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    estimand = _causal_model(data, treatment, outcome, common_causes).identify_effect()
+    _save_cache(estimand, path)
+    return estimand
+
+
+def available_estimators():
+    """依赖已安装的估计方法"""
+    has_econml = importlib.util.find_spec('econml') is not None
+    return tuple(e for e in ESTIMATORS if has_econml or not e.startswith('backdoor.econml'))
+
+
+def _method_params(estimator, seed):
+    """LinearDML 的结果/处理模型为随机森林（年度样本只有十几期，树数与叶子大小取小值）"""
+    params = ESTIMATORS.get(estimator)
+    if estimator != DML:
+        return params
+    from sklearn.ensemble import RandomForestRegressor
+
+    def forest():
+        return RandomForestRegressor(n_estimators=params['n_estimators'],
+                                     min_samples_leaf=params['min_samples_leaf'], random_state=seed)
+    return {'init_params': {'model_y': forest(), 'model_t': forest(), 'discrete_treatment': False,
+                            'cv': params['cv'], 'random_state': seed},
+            'fit_params': {}}
+
+
+def run_task(task):
+    """进程池任务：估计一次效应，可选跑一个反驳检验，返回结果记录"""
+    data, treatment, outcome, common_causes, estimand, estimator, refuter, params, seed = task
+    t0 = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = _causal_model(data, treatment, outcome, common_causes)
+        estimate = model.estimate_effect(estimand, method_name=estimator,
+                                         method_params=_method_params(estimator, seed))
+        new_effect = p_value = np.nan
+        if refuter is not None:
+            # 进程池已经并行，反驳检验内部不再开 joblib 进程
+            ref = model.refute_estimate(estimand, estimate, method_name=refuter,
+                                        random_seed=seed, n_jobs=1, **params)
+            new_effect = ref.new_effect
+            p_value = (getattr(ref, 'refutation_result', None) or {}).get('p_value', np.nan)
+    return (treatment, outcome, estimator, refuter or '估计', float(estimate.value),
+            float(np.mean(new_effect)), float(p_value), params.get('num_simulations', 0),
+            time.perf_counter() - t0)
+
+
+def run_causal(df, pairs=DEFAULT_PAIRS, common_causes=DEFAULT_COMMON_CAUSES,
+               estimators=None, refuters=tuple(REFUTERS), simulations=100, seed=0,
+               max_workers=None, cache_dir=CACHE_DIR):
+    """
+    对每组 (处理, 结果) 运行全部 估计方法 × 反驳检验，返回汇总表（每个任务一行）。
+    检验列为 '估计' 的行是未做反驳的原始估计；estimators 缺省为 available_estimators()。
+    """
+    estimators = available_estimators() if estimators is None else estimators
+    tasks, keys = [], []
+    for treatment, outcome in pairs:
+        causes = [c for c in common_causes if c not in (treatment, outcome)]
+        data = df[[treatment, outcome, *causes]].reset_index(drop=True).astype(float)
+        estimand = identify(data, treatment, outcome, causes, cache_dir)
+        for estimator in estimators:
+            for refuter in (None, *refuters):
+                params = dict(REFUTERS[refuter], num_simulations=simulations) if refuter else {}
+                tasks.append((data, treatment, outcome, causes, estimand, estimator, refuter,
+                              params, seed))
+                keys.append(data_key(data, treatment, outcome, causes, estimator,
+                                     ESTIMATORS.get(estimator), refuter, params, seed))
+
+    cache_path = os.path.join(cache_dir, 'results.pkl') if cache_dir else None
+    cache = _load_cache(cache_path) if cache_path else {}
+    todo = [i for i, k in enumerate(keys) if k not in cache]
+    if todo:
+        if max_workers == 1 or len(todo) == 1:
+            computed = [run_task(tasks[i]) for i in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                computed = list(pool.map(run_task, [tasks[i] for i in todo]))
+        cache.update((keys[i], row) for i, row in zip(todo, computed))
+        if cache_path:
+            _save_cache(cache, cache_path)
+    return pd.DataFrame([cache[k] for k in keys], columns=COLUMNS)
+
+
+def main():
+    from 数据分析 import clean, load_panel, var_zh
+
+    parser = argparse.ArgumentParser(description='DoWhy 估计方法与反驳检验的并行批量运行')
+    parser.add_argument('--freq', choices=['Y', 'M'], default='Y')
+    parser.add_argument('--simulations', type=int, default=100, help='每个反驳检验的模拟次数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='进程数（缺省为 CPU 核数）')
+    parser.add_argument('--out', default='因果推断汇总.xlsx')
+    args = parser.parse_args()
+
+    df_clean = clean(load_panel(args.freq))
+    t0 = time.perf_counter()
+    summary = run_causal(df_clean, simulations=args.simulations, seed=args.seed,
+                         max_workers=args.workers)
+    print(f"共 {len(summary)} 个任务，耗时 {time.perf_counter() - t0:.1f} 秒")
+    shown = summary.assign(处理=summary['处理'].map(var_zh), 结果=summary['结果'].map(var_zh))
+    print(shown.round(4).to_string(index=False))
+    summary.to_excel(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+全变量两两 Granger 因果检验矩阵。
+
+对 df_scaled 的每一对变量（两个方向）在进程池中检验，每对的滞后阶数按 AIC 选取，
+并对 1..该阶数的每个滞后记录 F 检验与 χ² 检验的统计量和 p 值。
+全部检验汇总后做多重检验校正（默认 Benjamini–Hochberg FDR）。
+
+每对检验的结果按 (原因序列, 结果序列, 最大滞后) 的数据哈希缓存，
+新增一个序列时只需计算与它有关的变量对。
+
+用法：
+    from 因果矩阵 import granger_matrix
+    tidy, matrix = granger_matrix(df_scaled, maxlag_allowed)
+"""
+import hashlib
+import os
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+
+import numpy as np
+import pandas as pd
+from statsmodels.stats.multitest import multipletests
+from statsmodels.tools.sm_exceptions import InfeasibleTestError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(HERE, '.cache', '因果矩阵', 'granger.pkl')
+COLUMNS = ['原因', '结果', '滞后', 'F统计量', 'F_p', '卡方统计量', '卡方_p']
+
+def pair_key(cause, effect, maxlag):
+    h = hashlib.sha256()
+    for s in (cause, effect):
+        h.update(np.ascontiguousarray(s, dtype=float).tobytes())
+    h.update(str(maxlag).encode())
+    return h.hexdigest()
+
+
+def test_pair(task):
+    """进程池任务：(原因名, 结果名, 原因值, 结果值, 最大滞后) → 记录列表（每个滞后一条）"""
+    from 数据分析 import granger_tests, select_lag
+
+    cause, effect, x, y, maxlag = task
+    data = pd.DataFrame({effect: y, cause: x})
+    # 插补后的平坦序列常使设计矩阵秩亏，几百对检验的警告不逐条打印
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        lag = select_lag(data, maxlag)
+        try:
+            res = granger_tests(data.to_numpy(), lag)
+        except (InfeasibleTestError, ValueError, np.linalg.LinAlgError):
+            return [(cause, effect, lag, np.nan, np.nan, np.nan, np.nan)]
+    return [(cause, effect, k,
+             tests['ssr_ftest'][0], tests['ssr_ftest'][1],
+             tests['ssr_chi2test'][0], tests['ssr_chi2test'][1])
+            for k, (tests, _) in sorted(res.items())]
+
+
+def _load_cache(path):
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    return {}
+
+
+def _save_cache(cache, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def granger_matrix(df, maxlag, columns=None, method='fdr_bh', alpha=0.05,
+                   max_workers=None, cache_path=CACHE_PATH):
+    """
+    返回 (tidy, matrix)：
+        tidy    每个 (原因, 结果, 滞后) 一行，含原始与校正后的 F/χ² p 值及是否显著
+        matrix  原因 × 结果 的校正后 F 检验 p 值（各滞后取最小）
+    method 为 statsmodels multipletests 的校正方法（fdr_bh、holm、bonferroni 等）。
+    """
+    columns = list(columns or df.columns)
+    values = {c: df[c].to_numpy(dtype=float) for c in columns}
+    cache = _load_cache(cache_path) if cache_path else {}
+
+    keys, todo = {}, []
+    for cause, effect in permutations(columns, 2):
+        key = pair_key(values[cause], values[effect], maxlag)
+        keys[cause, effect] = key
+        if key not in cache:
+            todo.append((cause, effect, values[cause], values[effect], maxlag))
+
+    if todo:
+        if max_workers == 1 or len(todo) == 1:
+            computed = [test_pair(t) for t in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                computed = list(pool.map(test_pair, todo, chunksize=max(1, len(todo) // 32)))
+        for task, records in zip(todo, computed):
+            cache[keys[task[0], task[1]]] = records
+        if cache_path:
+            _save_cache(cache, cache_path)
+
+    rows = []
+    for (cause, effect), key in keys.items():
+        # 缓存中的名称可能来自改名前的序列，按当前名称重写
+        rows += [(cause, effect) + tuple(r[2:]) for r in cache[key]]
+    tidy = pd.DataFrame(rows, columns=COLUMNS)
+
+    for col in ('F_p', '卡方_p'):
+        ok = tidy[col].notna().to_numpy()
+        adj = np.full(len(tidy), np.nan)
+        if ok.any():
+            adj[ok] = multipletests(tidy.loc[ok, col], alpha=alpha, method=method)[1]
+        tidy[f'{col}_校正'] = adj
+    tidy['显著'] = tidy['F_p_校正'] < alpha
+
+    matrix = (tidy.groupby(['原因', '结果'])['F_p_校正'].min()
+              .unstack().reindex(index=columns, columns=columns))
+    return tidy, matrix
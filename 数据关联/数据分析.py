@@ -1,15 +1,16 @@
 import pandas as pd
 import numpy as np
-from functools import reduce
+import argparse
+import inspect
 import matplotlib.pyplot as plt
-import seaborn as sns
 from scipy import stats
 from statsmodels.tsa.stattools import adfuller, grangercausalitytests
 from statsmodels.tsa.api import VAR
 from statsmodels.tools.sm_exceptions import InfeasibleTestError
 from sklearn.preprocessing import StandardScaler
-import dowhy
-from dowhy import CausalModel
+
+from 数据读取 import load_sources
+from 面板 import build_panel
 
 # —— 0. 中文字体设置（可选，但推荐） ——
 plt.rcParams['font.sans-serif'] = ['SimHei']
@@ -34,187 +35,208 @@ var_zh = {
     'YieldPerCow': '单头产奶量',
     'MilkOutput': '牛奶产量',
     'SoymealPrice': '豆粕价格',
-    'ProcessImport': '加工端进口额'
+    'ProcessImport': '加工端进口额',
+    'FeedCostPerKgMilk': '每公斤奶饲料成本',
+    'FeedMargin': '奶料差'
 }
 
-# —— 1. 加载并年度聚合各表 ——
-def load_and_agg():
-    df1 = pd.read_excel('汇总表.xlsx')
-    df1['年份'] = df1['月份'].astype(str).str[:4].astype(int)
-    df1 = df1.groupby('年份').agg({
-        '乳制品进口量(万吨)': 'sum',
-        '饲料进口量(万吨)':   'sum',
-        '乳制品出口量(万吨)': 'sum'
-    }).rename(columns={
-        '乳制品进口量(万吨)': 'DairyImport',
-        '饲料进口量(万吨)':   'FeedImport',
-        '乳制品出口量(万吨)': 'DairyExport'
-    }).reset_index()
-
-    df2 = pd.read_excel('品类进口明细汇总_标准整理.xlsx')
-    df2['年份'] = pd.to_datetime(df2['月份']).dt.year
-    df2 = df2.groupby('年份')['进口量(万吨)']\
-             .sum().reset_index()\
-             .rename(columns={'进口量(万吨)': 'ImportDetailVolume'})
-
-    df3 = pd.read_excel('全国奶类进出口数据.xlsx')
-    df3['年份'] = (df3['时间'] // 100).astype(int)
-    df3 = df3.groupby('年份').agg({
-        '当月进口金额（美元）': 'sum',
-        '当月进口数量（吨':   'sum',
-        '当月出口金额（美元）': 'sum',
-        '当月出口数量（吨）':  'sum'
-    }).rename(columns={
-        '当月进口金额（美元）': 'TradeImportValueUSD',
-        '当月进口数量（吨':   'TradeImportQtyT',
-        '当月出口金额（美元）': 'TradeExportValueUSD',
-        '当月出口数量（吨）':  'TradeExportQtyT'
-    }).reset_index()
-
-    df4 = pd.read_excel('常温白奶.xlsx')
-    df4 = df4.rename(columns={
-        '销售量 (万吨)':    'WhiteMilkSales',
-        '销售量增长率 (%)':'WhiteMilkGrowth'
-    })[['年份','WhiteMilkSales','WhiteMilkGrowth']]
-
-    df5 = pd.read_excel('全国奶牛存栏量、平均单产、305奶量.xlsx')
-    df5 = df5.rename(columns={
-        '年度':            '年份',
-        '奶牛存栏量（万头）':'CowCount',
-        '平均单产（千克）':   'YieldPerCow'
-    })[['年份','CowCount','YieldPerCow']]
-
-    df6 = pd.read_excel('全国牛奶产量.xlsx')
-    df6 = df6.rename(columns={
-        '年度':          '年份',
-        '牛奶产量（万吨）':'MilkOutput'
-    })[['年份','MilkOutput']]
-
-    df7 = pd.read_excel('全国饲料价格.xlsx')
-    df7 = df7.rename(columns={
-        '玉米（元/公斤）': 'CornPrice',
-        '豆粕（元/公斤）': 'SoymealPrice'
-    })
-    df7 = df7.groupby('年度')[['CornPrice','SoymealPrice']]\
-             .mean().rename_axis('年份').reset_index()
-
-    df8 = pd.read_excel('人均消费奶量.xlsx')
-    df8['年份'] = df8['时间'].astype(str).str[:4].astype(int)
-    df8 = df8.rename(columns={'全国居民人均（千克）':'PerCapitaConsumption'})\
-             [['年份','PerCapitaConsumption']]
-
-    df9 = pd.read_excel('全国主产省生鲜乳价格（已补充最新数据）.xlsx')
-    df9 = df9[df9['地区']=='全国'].copy()
-    df9['年份'] = df9['年度'].astype(int)
-    df9['MilkPrice'] = pd.to_numeric(df9['奶价（元/千克）'], errors='coerce')
-    df9 = df9.groupby('年份')['MilkPrice'].mean().reset_index()
-
-    df10 = pd.read_excel('加工端乳制品.xlsx')
-    df10 = df10.rename(columns={'总计':'ProcessImport'})[['年份','ProcessImport']]
-
-    return [df1, df2, df3, df4, df5, df6, df7, df8, df9, df10]
-
-tables = load_and_agg()
-df_all = reduce(lambda a, b: pd.merge(a, b, on='年份', how='outer'), tables)
-df_all = df_all.sort_values('年份').set_index('年份')
+# —— 1. 按统一日历构建面板（年度或月度） ——
+def load_panel(freq='Y', start=None, end=None, feed_margin=False):
+    """
+    各来源按 面板.SERIES 的规则对齐到同一日历；年度面板的索引为整数年份。
+    feed_margin 为 True 时加入按历史价格求解最优日粮得到的每公斤奶饲料成本与奶料差（饲料成本.py）。
+    """
+    frames = load_sources()
+    panel = build_panel(frames, freq=freq, start=start, end=end)
+    if freq == 'Y':
+        panel.index = pd.Index(panel.index.year, name='年份')
+    if feed_margin:
+        from 饲料成本 import panel_columns
+        panel = panel.join(panel_columns(freq, frames))
+    return panel
 
 # —— 2. 缺失值插补 ——
-df_clean = (df_all
-    .fillna(method='ffill')
-    .fillna(method='bfill')
-    .interpolate()
-)
+def clean(df_all):
+    return df_all.ffill().bfill().interpolate()
 
 # —— 3. ADF 检验 & 差分 ——
-adf_p = {col: adfuller(df_clean[col])[1] for col in df_clean.columns}
-if sum(p > 0.05 for p in adf_p.values()) > len(adf_p)/2:
-    df_proc = df_clean.diff().dropna()
-else:
-    df_proc = df_clean.copy()
+def make_stationary(df_clean):
+    adf_p = {col: adfuller(df_clean[col])[1] for col in df_clean.columns}
+    if sum(p > 0.05 for p in adf_p.values()) > len(adf_p)/2:
+        return df_clean.diff().dropna()
+    return df_clean.copy()
 
 # —— 4. 标准化 ——
-scaler = StandardScaler()
-df_scaled = pd.DataFrame(
-    scaler.fit_transform(df_proc),
-    index=df_proc.index,
-    columns=df_proc.columns
-)
-nobs = df_scaled.shape[0]
+def standardize(df_proc):
+    scaler = StandardScaler()
+    return pd.DataFrame(
+        scaler.fit_transform(df_proc),
+        index=df_proc.index,
+        columns=df_proc.columns
+    )
+
+def max_lag(nobs, freq='Y'):
+    """可用的最大滞后阶数；月度数据最多取 12 阶（一年）"""
+    lag = max(1, nobs // 3)
+    return min(lag, 12) if freq == 'M' else lag
+
+def select_lag(df, maxlag_allowed):
+    try:
+        return max(1, int(VAR(df).select_order(maxlags=maxlag_allowed).aic))
+    except ValueError:
+        return 1
 
 # —— 5. Granger 因果检验 ——
-maxlag_allowed = max(1, nobs // 3)
-pair = ['MilkPrice','DairyImport']
-try:
-    best_lag = int(VAR(df_scaled[pair]).select_order(maxlags=maxlag_allowed).aic)
-except ValueError:
-    best_lag = 1
-
-for cause, effect in [('DairyImport','MilkPrice'), ('MilkPrice','DairyImport')]:
-    try:
-        grangercausalitytests(
-            df_scaled[[effect, cause]],
-            maxlag=best_lag,
-            verbose=True
-        )
-    except InfeasibleTestError:
-        pass
+# 新版 statsmodels 去掉了 verbose 参数（不再打印），旧版默认打印全部结果
+_HAS_VERBOSE = 'verbose' in inspect.signature(grangercausalitytests).parameters
+
+def granger_tests(data, maxlag, verbose=False):
+    """与 statsmodels 版本无关的 grangercausalitytests：verbose 时逐阶打印 F 检验结果"""
+    if _HAS_VERBOSE:
+        return grangercausalitytests(data, maxlag=maxlag, verbose=verbose)
+    res = grangercausalitytests(data, maxlag=maxlag)
+    if verbose:
+        for lag, (tests, _) in sorted(res.items()):
+            F, p, df_denom, df_num = tests['ssr_ftest']
+            chi2, p_chi2, _ = tests['ssr_chi2test']
+            print(f"滞后 {lag}：F={F:.4f}, p={p:.4f}, df_denom={df_denom:.0f}, df_num={df_num:.0f}；"
+                  f"卡方={chi2:.4f}, p={p_chi2:.4f}")
+    return res
+
+def granger_pair(df_scaled, pair, maxlag_allowed):
+    best_lag = select_lag(df_scaled[pair], maxlag_allowed)
+    for cause, effect in [(pair[1], pair[0]), (pair[0], pair[1])]:
+        print(f"\nGranger 检验：{var_zh.get(cause, cause)} → {var_zh.get(effect, effect)}")
+        try:
+            granger_tests(df_scaled[[effect, cause]], best_lag, verbose=True)
+        except InfeasibleTestError:
+            pass
 
 # —— 6. VAR 建模 & IRF ——
-vars_sel = ['MilkPrice','DairyImport','CornPrice','PerCapitaConsumption']
-try:
-    lag_aic = int(VAR(df_scaled[vars_sel]).select_order(maxlags=maxlag_allowed).aic)
-except ValueError:
-    lag_aic = 1
-res = VAR(df_scaled[vars_sel]).fit(lag_aic)
-irf = res.irf(10)
-
-# 先画出默认的 IRF 图
-fig = irf.plot(orth=False)
-
-# 批量替换子图标题与坐标轴标签
-n = len(vars_sel)
-for i, resp in enumerate(vars_sel):
-    for j, imp in enumerate(vars_sel):
-        ax = fig.axes[i * n + j]
-        ax.set_title(f'{var_zh[resp]} 对 {var_zh[imp]} 冲击的响应',
-                     fontproperties='SimHei', fontsize=10)
-        ax.set_xlabel('期数', fontproperties='SimHei')
-        ax.set_ylabel('响应值', fontproperties='SimHei')
-
-fig.suptitle('脉冲响应函数（IRF）', fontproperties='SimHei', fontsize=14)
-plt.tight_layout()
-plt.show()
-
-# —— 7. DoWhy 因果推断（线性回归） ——
-data = df_clean.reset_index().rename(columns={'index':'年份'})
-causal = CausalModel(
-    data=data,
-    treatment='DairyImport',
-    outcome='MilkPrice',
-    common_causes=['CornPrice','PerCapitaConsumption','MilkOutput']
-)
-identified = causal.identify_effect()
-estimate = causal.estimate_effect(
-    identified,
-    method_name="backdoor.linear_regression"
-)
-print("DoWhy 线性回归估计：", estimate)
-print("DoWhy 反驳测试：", causal.refute_estimate(
-    identified, estimate, method_name="random_common_cause"
-))
-
-# —— 8. 相关性热力图 ——
-corr = df_clean.corr()
-plt.figure(figsize=(12,10))
-sns.heatmap(
-    corr, annot=True, fmt=".2f", cmap='coolwarm',
-    linewidths=0.5, square=True,
-    xticklabels=[var_zh.get(c, c) for c in corr.columns],
-    yticklabels=[var_zh.get(r, r) for r in corr.index]
-)
-plt.title('各变量间皮尔逊相关系数热力图',
-          fontproperties='SimHei', fontsize=16)
-plt.xticks(rotation=45, ha='right', fontproperties='SimHei')
-plt.yticks(rotation=0, fontproperties='SimHei')
-plt.tight_layout()
-plt.show()
+def fit_var(df_scaled, vars_sel, maxlag_allowed):
+    lag_aic = select_lag(df_scaled[vars_sel], maxlag_allowed)
+    return VAR(df_scaled[vars_sel]).fit(lag_aic)
+
+def plot_irf(res, vars_sel, periods=10, bands=None):
+    irf = res.irf(periods)
+
+    # 先画出默认的 IRF 图；给出自助法置信带时不画渐近标准误带
+    fig = irf.plot(orth=False, plot_stderr=bands is None)
+
+    # 批量替换子图标题与坐标轴标签
+    n = len(vars_sel)
+    for i, resp in enumerate(vars_sel):
+        for j, imp in enumerate(vars_sel):
+            ax = fig.axes[i * n + j]
+            if bands is not None:
+                ax.fill_between(range(periods + 1), bands.lower[:, i, j], bands.upper[:, i, j],
+                                alpha=0.2)
+            ax.set_title(f'{var_zh[resp]} 对 {var_zh[imp]} 冲击的响应',
+                         fontproperties='SimHei', fontsize=10)
+            ax.set_xlabel('期数', fontproperties='SimHei')
+            ax.set_ylabel('响应值', fontproperties='SimHei')
+
+    fig.suptitle('脉冲响应函数（IRF）', fontproperties='SimHei', fontsize=14)
+    plt.tight_layout()
+    plt.show()
+    return irf
+
+# —— 7. DoWhy 因果推断（估计方法 × 反驳检验并行，结果缓存） ——
+def dowhy_effect(df_clean, pairs=None, simulations=100):
+    from 因果推断 import DEFAULT_PAIRS, run_causal
+
+    summary = run_causal(df_clean, pairs=pairs or DEFAULT_PAIRS[:1], simulations=simulations)
+    shown = summary.assign(处理=summary['处理'].map(var_zh), 结果=summary['结果'].map(var_zh))
+    print("DoWhy 估计与反驳检验：")
+    print(shown.round(4).to_string(index=False))
+    return summary
+
+# —— 8. 超前/滞后相关热力图 ——
+def corr_heatmap(df_clean, max_lag, top=15):
+    from 交叉相关 import best_lags, cross_correlation, plot_lag_grid
+
+    lc = cross_correlation(df_clean, max_lag)
+    best = best_lags(lc)
+    print(f"超前/滞后相关（±{max_lag} 期，滞后为正表示变量1超前）：")
+    print(best.head(top).replace({'变量1': var_zh, '变量2': var_zh}).round(4).to_string(index=False))
+    plot_lag_grid(lc, var_zh)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='乳制品市场变量的 Granger / VAR / DoWhy 分析')
+    parser.add_argument('--freq', choices=['Y', 'M'], default='Y', help='年度或月度面板')
+    parser.add_argument('--start', help='起始时期，如 2018 或 2020-01')
+    parser.add_argument('--end', help='结束时期')
+    parser.add_argument('--all-pairs', action='store_true',
+                        help='对全部变量两两做 Granger 检验（并行、带多重检验校正）')
+    parser.add_argument('--granger-out', default='Granger矩阵.xlsx', help='--all-pairs 的结果文件')
+    parser.add_argument('--boot', type=int, default=0,
+                        help='IRF 残差自助法复制次数（0 为使用渐近标准误带）')
+    parser.add_argument('--seed', type=int, help='自助法随机种子')
+    parser.add_argument('--causal-all', action='store_true',
+                        help='DoWhy 步骤对 因果推断.DEFAULT_PAIRS 的全部处理/结果组合运行')
+    parser.add_argument('--simulations', type=int, default=100, help='DoWhy 反驳检验的模拟次数')
+    parser.add_argument('--corr-lag', type=int, help='超前/滞后相关的最大滞后（缺省同 VAR 最大滞后）')
+    parser.add_argument('--feed-margin', action='store_true',
+                        help='加入历史最优日粮的每公斤奶饲料成本与奶料差，并把奶料差放进 VAR')
+    parser.add_argument('--regional', action='store_true',
+                        help='按地区分别运行 平稳化 → VAR → IRF（并行），并给出合并面板估计')
+    args = parser.parse_args()
+
+    if args.regional:
+        from 区域分析 import run_regions
+        summary = run_regions(load_sources(), args.freq, start=args.start, end=args.end)
+        print("分地区奶价对各变量冲击的累计/峰值响应：")
+        print(summary.round(4).to_string())
+        return
+
+    df_all = load_panel(args.freq, args.start, args.end, feed_margin=args.feed_margin)
+    df_clean = clean(df_all)
+    df_proc = make_stationary(df_clean)
+    df_scaled = standardize(df_proc)
+    maxlag_allowed = max_lag(df_scaled.shape[0], args.freq)
+
+    if args.all_pairs:
+        from 因果矩阵 import granger_matrix
+        tidy, matrix = granger_matrix(df_scaled, maxlag_allowed)
+        print("Granger 检验（校正后 F 检验 p 值，行为原因、列为结果）：")
+        print(matrix.rename(index=var_zh, columns=var_zh).round(3).to_string())
+        with pd.ExcelWriter(args.granger_out) as writer:
+            matrix.to_excel(writer, sheet_name='矩阵')
+            tidy.to_excel(writer, sheet_name='明细', index=False)
+    else:
+        granger_pair(df_scaled, ['MilkPrice','DairyImport'], maxlag_allowed)
+
+    vars_sel = ['MilkPrice','DairyImport','CornPrice','PerCapitaConsumption']
+    if args.feed_margin:
+        pair = ['MilkPrice','FeedCostPerKgMilk']
+        if args.all_pairs:
+            # 全变量矩阵里已有这一对的检验结果，直接取出
+            rows = tidy[tidy['原因'].isin(pair) & tidy['结果'].isin(pair)]
+            print("Granger 检验：奶价 ↔ 每公斤奶饲料成本")
+            print(rows.replace(var_zh).round(4).to_string(index=False))
+        else:
+            granger_pair(df_scaled, pair, maxlag_allowed)
+        # 奶料差只覆盖有历史饲料价格与单产的时期，插补前的观测太少时放进 VAR 会使残差协方差奇异
+        n_obs = df_all['FeedMargin'].notna().sum()
+        if n_obs > 2 * (len(vars_sel) + 1):
+            vars_sel.append('FeedMargin')
+        else:
+            print(f"奶料差只有 {n_obs} 期观测，不加入 VAR")
+    res = fit_var(df_scaled, vars_sel, maxlag_allowed)
+    bands = None
+    if args.boot > 0:
+        from 脉冲响应 import bootstrap_irf
+        bands = bootstrap_irf(res, 10, args.boot, seed=args.seed)
+    plot_irf(res, vars_sel, bands=bands)
+
+    if args.causal_all:
+        from 因果推断 import DEFAULT_PAIRS
+        dowhy_effect(df_clean, DEFAULT_PAIRS, args.simulations)
+    else:
+        dowhy_effect(df_clean, simulations=args.simulations)
+    corr_heatmap(df_clean, args.corr_lag if args.corr_lag is not None
+                 else max_lag(df_clean.shape[0], args.freq))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+数据读取：Excel 工作簿的列式缓存与并行解析。
+
+每个工作簿解析一次后规整列类型，写成 .cache/数据读取/<文件名>.parquet，
+meta.json 记录来源文件的 mtime/大小/sha256。之后的运行：
+    mtime 与大小都没变            直接读 Parquet
+    mtime 变了但 sha256 相同      直接读 Parquet（并更新 mtime）
+    内容变了或缓存缺失            重新解析
+需要重新解析的工作簿在进程池中并行读取（openpyxl 解析是纯 Python，受 GIL 限制）。
+
+用法：
+    from 数据读取 import load_sources
+    frames = load_sources()            # {文件名（不含扩展名）: DataFrame}
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, '.cache', '数据读取')
+
+# 数据分析.py 使用的工作簿
+SOURCES = (
+    '汇总表',
+    '品类进口明细汇总_标准整理',
+    '全国奶类进出口数据',
+    '常温白奶',
+    '全国奶牛存栏量、平均单产、305奶量',
+    '全国牛奶产量',
+    '全国饲料价格',
+    '人均消费奶量',
+    '全国主产省生鲜乳价格（已补充最新数据）',
+    '加工端乳制品',
+)
+
+
+def _file_info(path, with_hash=True):
+    st = os.stat(path)
+    info = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+    if with_hash:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        info['sha256'] = h.hexdigest()
+    return info
+
+
+def _fresh(path, old):
+    """缓存对应的来源文件是否未变：mtime 与大小相同，或内容哈希相同"""
+    if not os.path.exists(path):
+        return False
+    now = _file_info(path, with_hash=False)
+    if now['mtime_ns'] == old['mtime_ns'] and now['size'] == old['size']:
+        return True
+    return now['size'] == old['size'] and _file_info(path)['sha256'] == old['sha256']
+
+
+def normalize(df):
+    """
+    规整列类型以便列式存储：列名转为去空白的字符串；
+    object 列能完整转成数值的转为数值，否则转为字符串。
+    """
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object:
+            num = pd.to_numeric(df[col], errors='coerce')
+            if num.notna().sum() == df[col].notna().sum():
+                df[col] = num
+            else:
+                df[col] = df[col].astype('string')
+    return df
+
+
+def parse_workbook(path, out_path):
+    """读取工作簿第一张表、规整后写 Parquet，返回来源文件信息（在工作进程中执行）"""
+    df = normalize(pd.read_excel(path))
+    df.to_parquet(out_path, index=False)
+    return _file_info(path)
+
+
+def load_sources(names=SOURCES, directory=HERE, cache_dir=CACHE_DIR, max_workers=None,
+                 verbose=False):
+    """读取 names 中的工作簿，返回 {名称: DataFrame}；只有变化过的工作簿会重新解析"""
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+
+    paths = {name: os.path.join(directory, f'{name}.xlsx') for name in names}
+    parquet = {name: os.path.join(cache_dir, f'{name}.parquet') for name in names}
+    stale = [name for name in names
+             if name not in meta or not os.path.exists(parquet[name])
+             or not _fresh(paths[name], meta[name])]
+
+    if stale:
+        if len(stale) == 1:
+            infos = [parse_workbook(paths[stale[0]], parquet[stale[0]])]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                infos = list(pool.map(parse_workbook, [paths[n] for n in stale],
+                                      [parquet[n] for n in stale]))
+        meta.update(zip(stale, infos))
+        if verbose:
+            print(f"重新解析 {len(stale)} 个工作簿：{stale}")
+    # 内容未变但 mtime 变了的，更新 mtime，下次无需再算哈希
+    touched = bool(stale)
+    for name in names:
+        now = _file_info(paths[name], with_hash=False)
+        if any(meta[name].get(k) != v for k, v in now.items()):
+            meta[name].update(now)
+            touched = True
+    if touched:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    return {name: pd.read_parquet(parquet[name]) for name in names}
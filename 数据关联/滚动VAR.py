@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+滚动/扩展窗口 VAR：用递推最小二乘（RLS）逐期更新系数，观察变量间关系随时间的变化。
+
+滞后阶数在全样本上按 AIC 选定后固定，回归项为 x_t = [1, y_{t-1}, …, y_{t-p}]。
+各方程回归项相同，共用一个 P = (XᵀX)⁻¹：
+    加入一期    g = Px / (1 + xᵀPx)，B += g (y − Bᵀx)ᵀ，P −= g (Px)ᵀ
+    移出一期    g = Px / (1 − xᵀPx)，B −= g (y − Bᵀx)ᵀ，P += g (Px)ᵀ   （仅滚动窗口）
+每期代价 O(m²k)（m = 1 + kp），与窗口长度无关；整窗 OLS 重拟合为 O(w·m²)。
+滚动窗口的反复增删会累积舍入误差，每 refresh 期用窗口数据重新求一次 P 与 B。
+插补出的平坦段会使窗口内 XᵀX 奇异（系数不可识别）：这些窗口的系数记为 NaN，
+直到窗口满秩后再由 OLS 重新起算递推；移出一期使 1 − xᵀPx 接近 0 时同样重新起算。
+
+各窗口的系数汇总后一次性计算 MA 系数，得到随时间变化的脉冲响应摘要。
+
+用法：
+    python 滚动VAR.py --freq M --window 60 --mode rolling
+"""
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from 脉冲响应 import ma_coefs
+
+# 移出一期时 1 − xᵀPx 低于此值视为窗口接近奇异，改用 OLS 重新起算
+DOWNDATE_TOL = 1e-8
+
+
+def design(Y, p):
+    """Y (T, k) → 回归矩阵 X (T-p, 1+kp) 与被解释变量 Z (T-p, k)"""
+    T = Y.shape[0]
+    X = np.hstack([np.ones((T - p, 1))] + [Y[p - i:T - i] for i in range(1, p + 1)])
+    return X, Y[p:]
+
+
+def regressor_names(names, p):
+    return ['const'] + [f'L{i}.{n}' for i in range(1, p + 1) for n in names]
+
+
+def _ols(X, Z):
+    """窗口 OLS，返回 (P, B)；XᵀX 奇异时返回 (None, None)"""
+    XtX = X.T @ X
+    if np.linalg.matrix_rank(XtX) < XtX.shape[0]:
+        return None, None
+    P = np.linalg.inv(XtX)
+    return P, P @ (X.T @ Z)
+
+
+def rls_path(Y, p, window, mode='rolling', refresh=50):
+    """
+    逐期更新 VAR(p) 系数。Y 为 (T, k) 数组，window 为首个（滚动时为每个）窗口包含的回归观测数。
+    返回 B (W, 1+kp, k)：第 w 个窗口的系数，窗口结束于回归观测 window-1+w；不可识别的窗口为 NaN。
+    """
+    if mode not in ('rolling', 'expanding'):
+        raise ValueError(f"未知的窗口方式：{mode}")
+    X, Z = design(np.asarray(Y, dtype=float), p)
+    n, m = X.shape
+    if window <= m:
+        raise ValueError(f"窗口 {window} 期不足以估计每个方程的 {m} 个参数")
+    if window > n:
+        raise ValueError(f"窗口 {window} 期超过可用的 {n} 期")
+
+    path = np.full((n - window + 1, m, Z.shape[1]), np.nan)
+    P = B = None
+    for w, t in enumerate(range(window - 1, n)):
+        start = t - window + 1 if mode == 'rolling' else 0
+        if P is None or (refresh and w % refresh == 0):
+            P, B = _ols(X[start:t + 1], Z[start:t + 1])
+        else:
+            x = X[t]
+            Px = P @ x
+            g = Px / (1 + x @ Px)
+            B = B + np.outer(g, Z[t] - x @ B)
+            P = P - np.outer(g, Px)
+            if mode == 'rolling':
+                x = X[t - window]
+                Px = P @ x
+                denom = 1 - x @ Px
+                if denom < DOWNDATE_TOL:
+                    P, B = _ols(X[start:t + 1], Z[start:t + 1])
+                else:
+                    g = Px / denom
+                    B = B - np.outer(g, Z[t - window] - x @ B)
+                    P = P + np.outer(g, Px)
+        if B is not None:
+            path[w] = B
+    return path
+
+
+def coef_frame(path, index, names, p):
+    """系数路径 → 宽表：行为窗口结束时期，列为 (方程, 回归项)"""
+    W, m, k = path.shape
+    columns = pd.MultiIndex.from_product([names, regressor_names(names, p)], names=['方程', '回归项'])
+    return pd.DataFrame(path.transpose(0, 2, 1).reshape(W, k * m), index=index, columns=columns)
+
+
+def irf_summary(path, index, names, p, periods=10):
+    """
+    各窗口的非正交化脉冲响应摘要（长表）：
+        累计响应   0..periods 期响应之和
+        峰值响应   绝对值最大的一期响应（带符号）及其期数
+    """
+    W, _, k = path.shape
+    A = path[:, 1:].reshape(W, p, k, k).transpose(0, 1, 3, 2)
+    phi = ma_coefs(A, periods)                              # (W, periods+1, k, k)
+    peak_h = np.abs(np.nan_to_num(phi)).argmax(axis=1)      # (W, k, k)
+    peak = np.take_along_axis(phi, peak_h[:, None], axis=1)[:, 0]
+    peak_h = np.where(np.isnan(peak), np.nan, peak_h)
+    w, i, j = np.meshgrid(np.arange(W), np.arange(k), np.arange(k), indexing='ij')
+    return pd.DataFrame({
+        '时期': np.asarray(index)[w.ravel()],
+        '响应': np.array(names)[i.ravel()],
+        '冲击': np.array(names)[j.ravel()],
+        '累计响应': phi.sum(axis=1).ravel(),
+        '峰值响应': peak.ravel(),
+        '峰值期数': peak_h.ravel(),
+    })
+
+
+def rolling_var(df, vars_sel, lag, window, mode='rolling', periods=10, refresh=50):
+    """
+    df 为平稳化、标准化后的面板。返回 (coefs, irf)：
+        coefs  行为窗口结束时期的系数宽表
+        irf    各窗口的脉冲响应摘要长表
+    """
+    Y = df[vars_sel].to_numpy(dtype=float)
+    path = rls_path(Y, lag, window, mode, refresh)
+    index = df.index[lag + window - 1:]
+    return (coef_frame(path, index, vars_sel, lag),
+            irf_summary(path, index, vars_sel, lag, periods))
+
+
+def main():
+    import matplotlib.pyplot as plt
+    from 数据分析 import (clean, load_panel, make_stationary, max_lag, select_lag, standardize,
+                          var_zh)
+
+    parser = argparse.ArgumentParser(description='滚动/扩展窗口 VAR（递推最小二乘）')
+    parser.add_argument('--freq', choices=['Y', 'M'], default='M')
+    parser.add_argument('--window', type=int, default=60, help='窗口长度（期）')
+    parser.add_argument('--mode', choices=['rolling', 'expanding'], default='rolling')
+    parser.add_argument('--lag', type=int, help='滞后阶数（缺省按全样本 AIC 选取）')
+    parser.add_argument('--periods', type=int, default=10, help='脉冲响应期数')
+    parser.add_argument('--out', default='滚动VAR.xlsx')
+    args = parser.parse_args()
+
+    vars_sel = ['MilkPrice', 'DairyImport', 'CornPrice', 'PerCapitaConsumption']
+    df_scaled = standardize(make_stationary(clean(load_panel(args.freq))))
+    lag = args.lag
+    if lag is None:
+        # 每个方程的参数个数不超过窗口的一半
+        cap = max(1, (args.window // 2 - 1) // len(vars_sel))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            lag = select_lag(df_scaled[vars_sel], min(max_lag(len(df_scaled), args.freq), cap))
+    coefs, irf = rolling_var(df_scaled, vars_sel, lag, args.window, args.mode, args.periods)
+    print(f"滞后 {lag} 阶，{args.mode} 窗口 {args.window} 期，共 {len(coefs)} 个窗口")
+
+    with pd.ExcelWriter(args.out) as writer:
+        coefs.to_excel(writer, sheet_name='系数')
+        irf.to_excel(writer, sheet_name='脉冲响应', index=False)
+
+    # 奶价对各变量冲击的累计响应随时间的变化
+    resp = irf[irf['响应'] == 'MilkPrice'].pivot(index='时期', columns='冲击', values='累计响应')
+    resp.index = resp.index.astype(str)
+    ax = resp.rename(columns=var_zh).plot(figsize=(10, 5))
+    ax.set_title(f'奶价的累计脉冲响应（{args.periods} 期，{args.window} 期窗口）', fontproperties='SimHei')
+    ax.set_xlabel('窗口结束时期', fontproperties='SimHei')
+    ax.legend(prop={'family': 'SimHei'})
+    plt.tight_layout()
+    plt.show()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+面板构建：把各来源的序列对齐到同一个日历索引（月度或年度）。
+
+每个序列由 SERIES 中的一条规则描述：
+    source   来源工作簿（数据读取.SOURCES 中的名称）
+    period   df → PeriodIndex，每条原始观测所属的时期（原生频率）
+    value    取值列
+    where    可选，df → 布尔掩码，筛选行（如 地区 == 全国）
+    how      同一时期多条观测、或向更粗频率汇总时的聚合方式：sum / mean / last
+    fill     原生频率比目标粗时展开到目标频率的方式：
+                 ffill   整个时期内各月取同一值（存量、价格、比率）
+                 spread  按月均分（年度流量，如年产量）
+聚合直接对原始观测按目标时期分组（周度饲料价格的年均值与原脚本逐周平均一致）；
+展开用时期映射一次性 reindex。每个序列独立转换后按列拼成矩阵，
+不做链式 outer merge，构建时间随序列数线性增长。
+
+用法：
+    from 面板 import build_panel
+    panel = build_panel(load_sources(), freq='M')    # 行为 Period('2020-01', 'M') …，列为英文变量名
+"""
+import numpy as np
+import pandas as pd
+
+FREQ_ORDER = {'W': 0, 'M': 1, 'Q': 2, 'Y': 3}
+
+
+def _monthly(df, year='年度', month='月份'):
+    return pd.PeriodIndex.from_fields(year=df[year].astype(int), month=df[month].astype(int), freq='M')
+
+
+def _annual(col, digits=False):
+    def period(df):
+        years = df[col].astype(str).str[:4].astype(int) if digits else df[col].astype(int)
+        return pd.PeriodIndex(years.astype(str), freq='Y')
+    return period
+
+
+SERIES = [
+    # —— 月度 ——
+    dict(name='DairyImport', source='汇总表', value='乳制品进口量(万吨)', how='sum',
+         period=lambda df: pd.PeriodIndex(df['月份'].astype(str).str[:7], freq='M')),
+    dict(name='FeedImport', source='汇总表', value='饲料进口量(万吨)', how='sum',
+         period=lambda df: pd.PeriodIndex(df['月份'].astype(str).str[:7], freq='M')),
+    dict(name='DairyExport', source='汇总表', value='乳制品出口量(万吨)', how='sum',
+         period=lambda df: pd.PeriodIndex(df['月份'].astype(str).str[:7], freq='M')),
+    dict(name='ImportDetailVolume', source='品类进口明细汇总_标准整理', value='进口量(万吨)', how='sum',
+         period=lambda df: pd.PeriodIndex(pd.to_datetime(df['月份']), freq='M')),
+    *[dict(name=name, source='全国奶类进出口数据', value=col, how='sum',
+           period=lambda df: _monthly(pd.DataFrame({'年度': df['时间'] // 100, '月份': df['时间'] % 100})))
+      for name, col in [('TradeImportValueUSD', '当月进口金额（美元）'),
+                        ('TradeImportQtyT', '当月进口数量（吨'),
+                        ('TradeExportValueUSD', '当月出口金额（美元）'),
+                        ('TradeExportQtyT', '当月出口数量（吨）')]],
+    # 周度价格，按月/年取均值
+    dict(name='CornPrice', source='全国饲料价格', value='玉米（元/公斤）', how='mean', period=_monthly),
+    dict(name='SoymealPrice', source='全国饲料价格', value='豆粕（元/公斤）', how='mean', period=_monthly),
+    # —— 季度 ——
+    dict(name='MilkPrice', source='全国主产省生鲜乳价格（已补充最新数据）', value='奶价（元/千克）',
+         how='mean', fill='ffill', where=lambda df: df['地区'] == '全国',
+         period=lambda df: pd.PeriodIndex.from_fields(year=df['年度'].astype(int),
+                                                      quarter=df['季度'].astype(int), freq='Q')),
+    # —— 年度 ——
+    dict(name='WhiteMilkSales', source='常温白奶', value='销售量 (万吨)', how='sum', fill='spread',
+         period=_annual('年份')),
+    dict(name='WhiteMilkGrowth', source='常温白奶', value='销售量增长率 (%)', how='mean', fill='ffill',
+         period=_annual('年份')),
+    dict(name='CowCount', source='全国奶牛存栏量、平均单产、305奶量', value='奶牛存栏量（万头）',
+         how='mean', fill='ffill', period=_annual('年度')),
+    dict(name='YieldPerCow', source='全国奶牛存栏量、平均单产、305奶量', value='平均单产（千克）',
+         how='sum', fill='spread', period=_annual('年度')),
+    dict(name='MilkOutput', source='全国牛奶产量', value='牛奶产量（万吨）', how='sum', fill='spread',
+         period=_annual('年度')),
+    dict(name='PerCapitaConsumption', source='人均消费奶量', value='全国居民人均（千克）', how='sum',
+         fill='spread', period=_annual('时间', digits=True)),
+    dict(name='ProcessImport', source='加工端乳制品', value='总计', how='sum', fill='spread',
+         period=_annual('年份')),
+]
+
+
+def _freq_code(index):
+    """PeriodIndex 的频率归为 W/M/Q/Y"""
+    code = index.freqstr[0]
+    return 'Y' if code == 'A' else code
+
+
+def observations(frames, spec):
+    """按规则取出一个序列的原始观测，返回以原生时期为索引的 Series（未聚合）"""
+    df = frames[spec['source']]
+    if spec.get('where') is not None:
+        df = df[spec['where'](df)]
+    values = pd.to_numeric(df[spec['value']], errors='coerce').to_numpy(dtype=float)
+    return pd.Series(values, index=spec['period'](df), name=spec['name']).dropna()
+
+
+def convert(obs, how, fill, target, calendar):
+    """把原始观测转换到目标频率并对齐到 calendar（目标频率的 PeriodIndex）"""
+    native = _freq_code(obs.index)
+    if FREQ_ORDER[native] <= FREQ_ORDER[target]:
+        # 原生频率不比目标粗：按目标时期直接聚合原始观测
+        agg = obs.groupby(obs.index.asfreq(target)).agg(how)
+        return agg.reindex(calendar).to_numpy()
+    # 原生频率更粗：先按原生时期聚合，再把目标时期映射到所属原生时期一次性取值
+    agg = obs.groupby(obs.index).agg(how)
+    values = agg.reindex(calendar.asfreq(native)).to_numpy()
+    if fill == 'spread':
+        # 每个原生时期包含的目标时期数，如年 → 12 个月、季 → 3 个月
+        parent = calendar.asfreq(native)
+        n_sub = (parent.asfreq(target, how='end') - parent.asfreq(target, how='start')).map(
+            lambda d: d.n).to_numpy() + 1
+        values = values / n_sub
+    elif fill not in ('ffill', None):
+        raise ValueError(f"未知的展开方式：{fill}")
+    return values
+
+
+def build_panel(frames, specs=SERIES, freq='M', start=None, end=None):
+    """
+    构建面板，返回 DataFrame（索引为 freq 频率的 PeriodIndex，列为各序列名）。
+    start/end 缺省为全部序列覆盖范围的并集。
+    """
+    series = [(spec, observations(frames, spec)) for spec in specs]
+    lo = min(obs.index.asfreq(freq).min() for _, obs in series if len(obs))
+    hi = max(obs.index.asfreq(freq).max() for _, obs in series if len(obs))
+    calendar = pd.period_range(start or lo, end or hi, freq=freq)
+    matrix = np.column_stack([convert(obs, spec.get('how', 'mean'), spec.get('fill', 'ffill'),
+                                      freq, calendar)
+                              for spec, obs in series])
+    index_name = '月份' if freq == 'M' else '年份'
+    return pd.DataFrame(matrix, index=pd.PeriodIndex(calendar, name=index_name),
+                        columns=[spec['name'] for spec in specs])
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+本地预测服务：面板只准备一次，拟合好的 VAR 按 (变量组, 滞后阶数, 数据哈希) 缓存，
+预测与脉冲响应查询直接用缓存的模型回答（毫秒级）。只依赖标准库 http.server。
+
+数据准备与 数据分析.py 相同（插补 → 平稳化 → 标准化）；返回值换算回原始单位
+（标准化还原，差分过的序列从最后一期水平值累加）。
+后台线程定期检查来源工作簿的 mtime/大小，有变化时在后台重新准备面板、
+重拟合缓存中的全部模型，完成后一次性替换；替换前查询继续使用旧模型。
+
+接口（GET，返回 JSON）：
+    /forecast?vars=MilkPrice,CornPrice&steps=6&shock=CornPrice&size=1&lag=auto
+        各变量未来 steps 期的基准预测；给出 shock 时另返回该变量在第 1 期受 size 个标准差
+        冲击后的预测（按非正交化脉冲响应叠加）
+    /irf?vars=...&impulse=CornPrice&response=MilkPrice&periods=10&orth=0
+    /status
+    POST /refresh   立即在后台重新加载数据
+
+用法：
+    python 预测服务.py --freq M --port 8765
+    curl 'http://127.0.0.1:8765/forecast?steps=6&shock=CornPrice'
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from 数据读取 import HERE, SOURCES
+from 脉冲响应 import ma_coefs
+
+DEFAULT_VARS = ('MilkPrice', 'DairyImport', 'CornPrice', 'PerCapitaConsumption')
+
+# scaled 为建模用数据；mean/std 为标准化参数，levels 为平稳化前的最后一期水平值
+# （后三者为 {变量: 数值}，查询时不经过 pandas 索引）
+Prepared = namedtuple('Prepared', ['freq', 'scaled', 'mean', 'std', 'differenced', 'levels', 'key'])
+
+
+def prepare(freq='M'):
+    """读取面板并按 数据分析.py 的流程准备建模数据"""
+    from 数据分析 import clean, load_panel, make_stationary
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        df_clean = clean(load_panel(freq))
+        df_proc = make_stationary(df_clean)
+    mean = df_proc.mean()
+    std = df_proc.std(ddof=0).replace(0, 1)          # 与 StandardScaler 一致：常数列不缩放
+    scaled = (df_proc - mean) / std
+    h = hashlib.sha256()
+    h.update(json.dumps([str(c) for c in scaled.columns] + [str(i) for i in scaled.index]).encode())
+    h.update(np.ascontiguousarray(scaled.to_numpy(dtype=float)).tobytes())
+    return Prepared(freq, scaled, mean.to_dict(), std.to_dict(), len(df_proc) < len(df_clean),
+                    df_clean.iloc[-1].to_dict(), h.hexdigest()[:16])
+
+
+def source_signature(directory=HERE, names=SOURCES):
+    """来源工作簿的 (mtime, 大小)，用于发现新数据"""
+    sig = []
+    for name in names:
+        st = os.stat(os.path.join(directory, f'{name}.xlsx'))
+        sig.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+class ModelStore:
+    """准备好的面板与拟合模型的缓存（线程安全）"""
+
+    def __init__(self, freq='M', max_models=64):
+        self.freq = freq
+        self.max_models = max_models
+        self.prepared = prepare(freq)
+        self.signature = source_signature()
+        self.models = OrderedDict()       # (变量组, 滞后, 数据哈希) → VARResults
+        self.auto_lags = {}               # (变量组, 数据哈希) → AIC 滞后阶数
+        self.lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.refreshed_at = time.time()
+
+    # —— 模型缓存 ——
+    def _resolve_lag(self, prepared, names, lag):
+        from 数据分析 import max_lag, select_lag
+        if lag not in (None, 'auto'):
+            lag = int(lag)
+            if lag < 1:
+                raise ValueError(f"滞后阶数须为正整数：{lag}")
+            # 与自动选择相同的上限；另外每个方程的参数个数须少于有效样本数，否则残差为零、预测无意义
+            nobs, upper = len(prepared.scaled), max_lag(len(prepared.scaled), prepared.freq)
+            if lag > upper or len(names) * lag + 1 >= nobs - lag:
+                raise ValueError(f"滞后阶数过大：{lag}（{nobs} 期数据、{len(names)} 个变量时最多 "
+                                 f"{min(upper, (nobs - 2) // (len(names) + 1))} 阶）")
+            return lag
+        key = (names, prepared.key)
+        if key not in self.auto_lags:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                self.auto_lags[key] = select_lag(prepared.scaled[list(names)],
+                                                 max_lag(len(prepared.scaled), prepared.freq))
+        return self.auto_lags[key]
+
+    @staticmethod
+    def _fit(prepared, names, lag):
+        from statsmodels.tsa.api import VAR
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return VAR(prepared.scaled[list(names)].to_numpy()).fit(lag)
+
+    def model(self, names, lag='auto'):
+        """返回 (Prepared, VARResults)；同一数据、变量组与滞后阶数只拟合一次"""
+        names = tuple(names)
+        unknown = [n for n in names if n not in self.prepared.scaled.columns]
+        if unknown:
+            raise ValueError(f"未知变量：{unknown}")
+        if len(names) < 2:
+            raise ValueError("VAR 至少需要两个变量")
+        if len(set(names)) < len(names):
+            raise ValueError(f"变量重复：{list(names)}")
+        with self.lock:
+            prepared = self.prepared
+            p = self._resolve_lag(prepared, names, lag)
+            key = (names, p, prepared.key)
+            if key in self.models:
+                self.hits += 1
+                self.models.move_to_end(key)
+                return prepared, self.models[key]
+            self.misses += 1
+            res = self._fit(prepared, names, p)
+            self.models[key] = res
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+            return prepared, res
+
+    # —— 后台重拟合 ——
+    def refresh(self, force=False):
+        """重新准备面板；数据有变化时重拟合缓存中的全部模型后一次性替换"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False                  # 已有刷新在进行
+        try:
+            signature = source_signature()
+            if not force and signature == self.signature:
+                return False
+            prepared = prepare(self.freq)
+            if prepared.key == self.prepared.key:
+                self.signature = signature
+                return False
+            with self.lock:
+                specs = list(dict.fromkeys((names, p) for names, p, _ in self.models))
+            models = OrderedDict(((names, p, prepared.key), self._fit(prepared, names, p))
+                                 for names, p in specs)
+            with self.lock:
+                self.prepared, self.models, self.signature = prepared, models, signature
+                self.auto_lags = {k: v for k, v in self.auto_lags.items() if k[1] == prepared.key}
+                self.refreshed_at = time.time()
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_async(self, force=False):
+        threading.Thread(target=self.refresh, args=(force,), daemon=True).start()
+
+    def watch(self, interval):
+        """每 interval 秒检查一次来源工作簿"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:        # 后台线程出错不影响服务，下次继续检查
+                    print(f"后台刷新失败：{e}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    # —— 查询 ——
+    def forecast(self, names, steps=6, lag='auto', shock=None, size=1.0):
+        if steps < 1:
+            raise ValueError(f"预测期数须为正整数：{steps}")
+        if not np.isfinite(size):
+            raise ValueError(f"冲击大小须为有限数：{size}")
+        prepared, res = self.model(names, lag)
+        names = list(names)
+        y = res.forecast(res.endog[-res.k_ar:], steps)                     # (steps, k)
+        out = {'期数': [_period_label(prepared.scaled.index[-1], h) for h in range(1, steps + 1)],
+               '滞后': res.k_ar, '数据': prepared.key,
+               '基准': _to_levels(prepared, names, y)}
+        if shock:
+            if shock not in names:
+                raise ValueError(f"冲击变量 {shock} 不在变量组中")
+            phi = ma_coefs(res.coefs, steps - 1)                          # (steps, k, k)
+            shocked = y + float(size) * phi[:, :, names.index(shock)]
+            out['冲击'] = {'变量': shock, '标准差倍数': float(size)}
+            out['冲击后'] = _to_levels(prepared, names, shocked)
+        return out
+
+    def irf(self, names, impulse, response=None, periods=10, lag='auto', orth=False):
+        if periods < 1:
+            raise ValueError(f"脉冲响应期数须为正整数：{periods}")
+        prepared, res = self.model(names, lag)
+        names = list(names)
+        if impulse not in names or (response and response not in names):
+            raise ValueError("冲击/响应变量须在变量组中")
+        phi = res.orth_ma_rep(periods) if orth else ma_coefs(res.coefs, periods)
+        j = names.index(impulse)
+        targets = [response] if response else names
+        return {'冲击': impulse, '滞后': res.k_ar, '正交化': orth, '数据': prepared.key,
+                '响应': {t: phi[:, names.index(t), j].tolist() for t in targets}}
+
+    def status(self):
+        with self.lock:
+            return {'频率': self.freq, '数据': self.prepared.key,
+                    '样本期数': len(self.prepared.scaled),
+                    '最后一期': str(self.prepared.scaled.index[-1]),
+                    '差分': self.prepared.differenced,
+                    '缓存模型': [{'变量': list(n), '滞后': p} for n, p, _ in self.models],
+                    '命中': self.hits, '未命中': self.misses, '后台重拟合中': self._refresh_lock.locked(),
+                    '数据更新时间': time.strftime('%Y-%m-%d %H:%M:%S',
+                                              time.localtime(self.refreshed_at))}
+
+
+def _period_label(last, h):
+    return str(last + h)
+
+
+def _to_levels(prepared, names, y):
+    """标准化（及差分）空间的预测 → 原始单位"""
+    std = np.array([prepared.std[n] for n in names])
+    mean = np.array([prepared.mean[n] for n in names])
+    values = y * std + mean
+    if prepared.differenced:
+        values = np.array([prepared.levels[n] for n in names]) + np.cumsum(values, axis=0)
+    return {n: values[:, i].tolist() for i, n in enumerate(names)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        store = self.server.store
+        names = tuple(q['vars'].split(',')) if q.get('vars') else DEFAULT_VARS
+        t0 = time.perf_counter()
+        try:
+            if url.path == '/forecast':
+                out = store.forecast(names, int(q.get('steps', 6)), q.get('lag', 'auto'),
+                                     q.get('shock'), float(q.get('size', 1.0)))
+            elif url.path == '/irf':
+                if 'impulse' not in q:
+                    raise ValueError("缺少 impulse 参数")
+                out = store.irf(names, q['impulse'], q.get('response'), int(q.get('periods', 10)),
+                                q.get('lag', 'auto'), q.get('orth', '0') in ('1', 'true'))
+            elif url.path == '/status':
+                out = store.status()
+            else:
+                return self._send(404, {'错误': f'未知路径 {url.path}'})
+        except (ValueError, KeyError, np.linalg.LinAlgError) as e:
+            # 滞后阶数过大时拟合会因样本不足或协方差奇异而失败，都按请求错误处理
+            return self._send(400, {'错误': str(e)})
+        out['耗时(毫秒)'] = round((time.perf_counter() - t0) * 1000, 3)
+        self._send(200, out)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/refresh':
+            return self._send(404, {'错误': f'未知路径 {self.path}'})
+        self.server.store.refresh_async(force=True)
+        self._send(202, {'状态': '已开始后台刷新'})
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+def serve(store, host='127.0.0.1', port=8765, verbose=False):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.store, server.verbose = store, verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VAR 预测与脉冲响应的本地 HTTP 服务')
+    parser.add_argument('--freq', choices=['Y', 'M'], default='M')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--watch', type=float, default=60, help='检查新数据的间隔（秒，0 为不检查）')
+    parser.add_argument('--max-models', type=int, default=64, help='缓存的模型个数上限')
+    parser.add_argument('--verbose', action='store_true', help='打印每个请求')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    store = ModelStore(args.freq, args.max_models)
+    store.model(DEFAULT_VARS)                    # 预先拟合默认变量组
+    if args.watch > 0:
+        store.watch(args.watch)
+    server = serve(store, args.host, args.port, args.verbose)
+    print(f"面板准备与默认模型拟合耗时 {time.perf_counter() - t0:.1f} 秒，数据 {store.prepared.key}")
+    print(f"服务地址 http://{args.host}:{args.port}/  （/forecast、/irf、/status，POST /refresh）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
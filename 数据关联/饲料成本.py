@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+历史饲料成本：按每个历史月份的原料价格批量求解各阶段最优配方，
+与奶价、单产合并得到每公斤奶的饲料成本与奶料差（奶价 − 每公斤奶饲料成本）。
+
+价格向量：以 饲料配方 原料目录的当前价格为基准，玉米、豆粕类原料（价格风险.HISTORY_MAP）
+按面板中 CornPrice/SoymealPrice 的月均价相对最近一个月的比例浮动，其余原料保持当前价格。
+各阶段的 StageModel 在进程池中对全部月份调用 solve_batch()（相邻月份热启动）。
+
+牛只一个产奶周期按阶段天数加权（CYCLE_DAYS），采食量取 采购计划.DEFAULT_DMI：
+    日粮成本（元/头/天）  = Σ 天数_s / 365 × 采食量_s × 最优成本_s（元/kg DM）
+    日产奶（kg/头/天）    = 年单产 / 365（面板中年单产按月均分，即 月值 × 12 / 365）
+    每公斤奶饲料成本      = 日粮成本 / 日产奶
+    奶料差（元/kg）       = 奶价 − 每公斤奶饲料成本
+
+用法：
+    python 饲料成本.py --out 饲料成本.xlsx
+    python 数据分析.py --freq M --feed-margin        # 作为新变量加入 VAR/Granger
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from 数据读取 import HERE, load_sources
+from 面板 import SERIES, build_panel
+
+FEED_DIR = os.path.normpath(os.path.join(HERE, '..', '饲料配方'))
+
+# 一个产奶周期（365 天）内各阶段的天数
+CYCLE_DAYS = {'泌乳早期': 100, '泌乳中期': 100, '泌乳后期': 105, '干奶前期': 39, '干奶后期': 21}
+# 加入面板的变量
+COLUMNS = ['FeedCostPerKgMilk', 'FeedMargin']
+
+
+def _feed_path():
+    """饲料配方 目录下的模块按脚本方式相互导入，需要把该目录加入 sys.path"""
+    if FEED_DIR not in sys.path:
+        sys.path.insert(0, FEED_DIR)
+
+
+def stage_models(stages=tuple(CYCLE_DAYS)):
+    """按当前原料目录编译所需阶段的 LP，返回 ({阶段: StageModel}, 基准价格字典)"""
+    _feed_path()
+    import 配方
+    from 原料目录 import load_catalog
+
+    catalog = load_catalog(配方.price_dict, 配方.nutr_val, 配方.nut_idx, 配方.stage_ingredients,
+                           verbose=False)
+    models = 配方.build_stage_models(catalog)
+    return {s: models[s] for s in stages if s in models}, catalog.price_dict()
+
+
+def history_map():
+    """面板序列名 → 跟随其价格浮动的配方原料（由 面板.SERIES 的取值列对应 HISTORY_MAP）"""
+    _feed_path()
+    from 价格风险 import HISTORY_MAP
+    return {spec['name']: HISTORY_MAP[spec['value']] for spec in SERIES
+            if spec['value'] in HISTORY_MAP}
+
+
+def price_matrix(panel, base_prices, mapping):
+    """
+    历史价格表（行为月份，列为原料）：映射到的原料 = 当前价格 × 该月均价 / 最近一个月均价。
+    只保留全部驱动序列都有数据的月份。
+    """
+    drivers = panel[list(mapping)].dropna()
+    if drivers.empty:
+        raise ValueError("面板中没有可用的历史饲料价格")
+    prices = pd.DataFrame({ing: float(p) for ing, p in base_prices.items()},
+                          index=drivers.index, dtype=float)
+    rel = drivers / drivers.iloc[-1]
+    for name, ings in mapping.items():
+        for ing in ings:
+            if ing in prices:
+                prices[ing] = base_prices[ing] * rel[name]
+    return prices
+
+
+def _solve_stage(task):
+    """进程池任务：(阶段, StageModel, 价格矩阵) → (阶段, BatchResult)"""
+    stage, model, C = task
+    return stage, model.solve_batch(C)
+
+
+def solve_history(models, prices, max_workers=None):
+    """各阶段对全部历史月份批量求解，返回 (成本表 元/kg DM, {阶段: BatchResult})；无解的月份为 NaN"""
+    tasks = [(stage, model, prices[model.ingredients].to_numpy())
+             for stage, model in models.items()]
+    if max_workers == 1 or len(tasks) == 1:
+        results = dict(_solve_stage(t) for t in tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = dict(pool.map(_solve_stage, tasks))
+    costs = pd.DataFrame({stage: np.where(results[stage].status == 0, results[stage].cost, np.nan)
+                          for stage in models}, index=prices.index)
+    return costs, results
+
+
+def margin_table(panel, costs, dmi=None, cycle_days=CYCLE_DAYS):
+    """由各阶段成本与面板的奶价、单产计算每月的日粮成本、每公斤奶饲料成本与奶料差"""
+    _feed_path()
+    from 采购计划 import DEFAULT_DMI
+
+    dmi = dict(DEFAULT_DMI, **(dmi or {}))
+    total = sum(cycle_days.values())
+    stages = [s for s in cycle_days if s in costs]
+    missing = set(cycle_days) - set(stages)
+    if missing:
+        raise ValueError(f"缺少阶段的成本：{sorted(missing)}")
+    weights = np.array([cycle_days[s] / total * dmi[s] for s in stages])
+    out = pd.DataFrame(index=costs.index)
+    out['日粮成本'] = costs[stages].to_numpy() @ weights
+    out['日产奶'] = panel['YieldPerCow'].reindex(costs.index) * 12 / 365
+    out['MilkPrice'] = panel['MilkPrice'].reindex(costs.index)
+    out['FeedCostPerKgMilk'] = out['日粮成本'] / out['日产奶']
+    out['FeedMargin'] = out['MilkPrice'] - out['FeedCostPerKgMilk']
+    out['每头日毛利'] = out['FeedMargin'] * out['日产奶']
+    return out
+
+
+def feed_margin(frames=None, start=None, end=None, max_workers=None):
+    """完整流程，返回 (月度奶料差表, 各阶段成本表)；索引为月度 PeriodIndex"""
+    frames = frames if frames is not None else load_sources()
+    panel = build_panel(frames, freq='M', start=start, end=end)
+    models, base = stage_models()
+    prices = price_matrix(panel, base, history_map())
+    costs, _ = solve_history(models, prices, max_workers)
+    return margin_table(panel, costs), costs
+
+
+def panel_columns(freq='M', frames=None, start=None, end=None):
+    """供 数据分析.load_panel 合并的变量：月度原样返回，年度取各年均值（索引为整数年份）"""
+    table, _ = feed_margin(frames, start, end)
+    table = table[COLUMNS]
+    if freq == 'Y':
+        table = table.groupby(table.index.year).mean().rename_axis('年份')
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='历史月度最优日粮成本与奶料差')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--out', default='饲料成本.xlsx')
+    args = parser.parse_args()
+
+    table, costs = feed_margin(start=args.start, end=args.end, max_workers=args.workers)
+    pd.set_option('display.width', 200)
+    print(f"共 {len(table)} 个月（{table.index[0]} – {table.index[-1]}）")
+    print("各阶段最优成本（元/kg DM）：")
+    print(costs.describe().round(4).to_string())
+    print("\n每公斤奶饲料成本与奶料差（有奶价与单产的月份）：")
+    print(table.dropna().round(4).to_string())
+    with pd.ExcelWriter(args.out) as writer:
+        table.to_excel(writer, sheet_name='奶料差')
+        costs.to_excel(writer, sheet_name='阶段成本')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+阶段定义检查与不可行诊断。
+
+validate_stages()  求解前检查阶段定义：缺少营养标准的阶段、标准中未知的营养、
+                   上下限颠倒、最小/最大配比冲突、原料池无论如何配都达不到的营养界限等。
+diagnose()         阶段不可行时，给每个营养约束和每个配比界限加上带惩罚的松弛变量，
+                   只求解一次，报告使阶段可行所需的放宽：
+                       min_count=True   （缺省）先最小化被放宽的约束个数（混合整数），再最小化放宽量
+                       min_count=False  放宽量（按界限相对值计）之和最小的线性规划，更快但可能
+                                        把放宽分摊到更多约束上
+                   混合整数在时间限制内没有找到可行解时退回线性规划。
+
+用法：python 不可行诊断.py [--l1]
+"""
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from 求解器 import NutrientTable, nutrient_table
+
+# relaxations 为放宽明细表，x 为放宽后的配比，cost 为该配比在当前价格下的成本
+Diagnosis = namedtuple('Diagnosis', ['relaxations', 'x', 'cost', 'status'])
+
+# 松弛量小于该值视为未放宽
+SLACK_TOL = 1e-7
+
+
+def validate_stages(stages_req, stage_ingredients, nutr_val, nut_idx,
+                    max_ingredient_pct=None, min_ingredient_pct=None):
+    """检查阶段定义，返回问题列表（每项一行说明），不抛异常"""
+    table = nutr_val if isinstance(nutr_val, NutrientTable) else nutrient_table(
+        {i: v for i, v in nutr_val.items()}, nut_idx)
+    max_ingredient_pct = max_ingredient_pct or {}
+    min_ingredient_pct = min_ingredient_pct or {}
+    issues = []
+    for stage in stage_ingredients:
+        if stage not in stages_req:
+            issues.append(f"{stage}: 没有营养标准（stages_req），不会求解")
+    for stage, req in stages_req.items():
+        if stage not in stage_ingredients:
+            issues.append(f"{stage}: 有营养标准但没有原料池")
+            continue
+        ings = stage_ingredients[stage]
+        known = [i for i in ings if i in table.index]
+        for ing in ings:
+            if ing not in table.index:
+                issues.append(f"{stage}: 原料 {ing} 没有营养数据，已忽略")
+        if not known:
+            issues.append(f"{stage}: 原料池中没有任何有营养数据的原料，无法检查营养界限")
+        for nut, (lo, hi) in req.items():
+            if nut not in nut_idx:
+                issues.append(f"{stage}: 营养 {nut} 不在 nut_idx 中")
+                continue
+            if lo is not None and hi is not None and lo > hi:
+                issues.append(f"{stage}: {nut} 下限 {lo} 大于上限 {hi}")
+            if known:
+                vals = table.matrix[nut_idx[nut], [table.index[i] for i in known]].toarray().ravel()
+                if lo is not None and vals.max() < lo:
+                    issues.append(f"{stage}: {nut} 下限 {lo} 高于原料池最大值 {vals.max():g}")
+                if hi is not None and vals.min() > hi:
+                    issues.append(f"{stage}: {nut} 上限 {hi} 低于原料池最小值 {vals.min():g}")
+        mx, mn = max_ingredient_pct.get(stage, {}), min_ingredient_pct.get(stage, {})
+        for ing in sorted((set(mx) | set(mn)) - set(ings)):
+            issues.append(f"{stage}: 配比界限中的原料 {ing} 不在原料池中，已忽略")
+        for ing in set(mx) & set(mn) & set(ings):
+            if mn[ing] > mx[ing]:
+                issues.append(f"{stage}: {ing} 最小配比 {mn[ing]} 大于最大配比 {mx[ing]}")
+        low_sum = sum(v for i, v in mn.items() if i in ings)
+        if low_sum > 1:
+            issues.append(f"{stage}: 最小配比之和 {low_sum:g} 超过 1")
+        high_sum = sum(min(mx.get(i, 1.0), 1.0) for i in known)
+        if high_sum < 1:
+            issues.append(f"{stage}: 最大配比之和 {high_sum:g} 不足 1")
+    return issues
+
+
+def _weight(bound):
+    # 按界限的相对量计罚，使不同量纲的约束可比
+    return 1.0 / max(abs(bound), 1e-2)
+
+
+def diagnose(model, min_count=True, time_limit=30.0):
+    """
+    对一个 StageModel 做弹性求解，返回 Diagnosis。
+    第 0 行（总配比 = 1）不放宽；其余每行的下/上限、每个原料的最小/最大配比各有一个松弛变量。
+    min_count 的混合整数到 time_limit 秒仍无可行解时，改用放宽量之和最小的线性规划。
+    """
+    k = model.n
+    A = model.A.tocsr()
+    m = A.shape[0] - 1
+    rl, ru = model.row_lower[1:], model.row_upper[1:]
+    lo_idx = np.flatnonzero(model.lower > 0)
+    hi_idx = np.flatnonzero(model.upper < 1)
+    p, q = len(lo_idx), len(hi_idx)
+    ns = 2 * m + p + q
+
+    # 变量：[x (k), s_lo (m), s_hi (m), t_lo (p), t_hi (q)]
+    I_m = sparse.identity(m, format='csr')
+    rows = [
+        sparse.hstack([A[:1], sparse.csr_matrix((1, ns))]),
+        sparse.hstack([A[1:], I_m, -I_m, sparse.csr_matrix((m, p + q))]),
+        sparse.hstack([sparse.csr_matrix((np.ones(p), (np.arange(p), lo_idx)), shape=(p, k)),
+                       sparse.csr_matrix((p, 2 * m)), sparse.identity(p), sparse.csr_matrix((p, q))]),
+        sparse.hstack([sparse.csr_matrix((np.ones(q), (np.arange(q), hi_idx)), shape=(q, k)),
+                       sparse.csr_matrix((q, 2 * m + p)), -sparse.identity(q)]),
+    ]
+    A_el = sparse.vstack(rows).tocsr()
+    row_lower = np.r_[1.0, rl, model.lower[lo_idx], np.full(q, -np.inf)]
+    row_upper = np.r_[1.0, ru, np.full(p, np.inf), model.upper[hi_idx]]
+
+    # 无穷界限一侧的松弛没有意义，上界取 0；有限的一侧以可能的最大偏差为上界
+    reach = np.asarray(abs(A[1:]).max(axis=1).todense()).ravel()
+    s_lo_ub = np.where(np.isfinite(rl), reach + np.abs(np.nan_to_num(rl, posinf=0, neginf=0)), 0.0)
+    s_hi_ub = np.where(np.isfinite(ru), reach + np.abs(np.nan_to_num(ru, posinf=0, neginf=0)), 0.0)
+    slack_ub = np.r_[s_lo_ub, s_hi_ub, model.lower[lo_idx], 1.0 - model.upper[hi_idx]]
+    w = np.r_[[_weight(b) if np.isfinite(b) else 0.0 for b in rl],
+              [_weight(b) if np.isfinite(b) else 0.0 for b in ru],
+              [_weight(b) for b in model.lower[lo_idx]],
+              [_weight(b) for b in model.upper[hi_idx]]]
+
+    if min_count:
+        # 每个松弛变量配一个 0/1 指示：s ≤ ub·z，目标以被放宽的个数为主、放宽量为次
+        A_big = sparse.vstack([
+            sparse.hstack([A_el, sparse.csr_matrix((A_el.shape[0], ns))]),
+            sparse.hstack([sparse.csr_matrix((ns, k)), sparse.identity(ns), -sparse.diags(slack_ub)]),
+        ]).tocsr()
+        cost = np.r_[np.zeros(k), 1e-3 * w, np.ones(ns)]
+        res = milp(cost, constraints=LinearConstraint(A_big, np.r_[row_lower, np.full(ns, -np.inf)],
+                                                      np.r_[row_upper, np.zeros(ns)]),
+                   integrality=np.r_[np.zeros(k + ns), np.ones(ns)],
+                   bounds=Bounds(np.zeros(k + 2 * ns), np.r_[np.ones(k), slack_ub, np.ones(ns)]),
+                   options={'time_limit': time_limit})
+        if res.x is None and res.status == 1:
+            return diagnose(model, min_count=False)
+    else:
+        res = milp(np.r_[np.zeros(k), w], constraints=LinearConstraint(A_el, row_lower, row_upper),
+                   bounds=Bounds(np.zeros(k + ns), np.r_[np.ones(k), slack_ub]))
+    if res.x is None:
+        return Diagnosis(pd.DataFrame(), None, np.nan, res.status)
+
+    x, s = res.x[:k], res.x[k:k + ns]
+    labels = model.row_labels[1:]
+    ax = A[1:] @ x
+    records = []
+    for i, nut in enumerate(labels):
+        if s[i] > SLACK_TOL:
+            records.append(('营养', nut, '下限', rl[i], ax[i], rl[i] - ax[i]))
+        if s[m + i] > SLACK_TOL:
+            records.append(('营养', nut, '上限', ru[i], ax[i], ax[i] - ru[i]))
+    for r, j in enumerate(lo_idx):
+        if s[2 * m + r] > SLACK_TOL:
+            records.append(('最小配比', model.ingredients[j], '下限', model.lower[j], x[j],
+                            model.lower[j] - x[j]))
+    for r, j in enumerate(hi_idx):
+        if s[2 * m + p + r] > SLACK_TOL:
+            records.append(('最大配比', model.ingredients[j], '上限', model.upper[j], x[j],
+                            x[j] - model.upper[j]))
+    df = pd.DataFrame(records, columns=['约束类型', '名称', '方向', '原界限', '放宽后', '放宽量'])
+    df['相对放宽'] = df['放宽量'] / df['原界限'].abs().clip(lower=1e-2)
+    cost = float(model.c @ x) if model.c is not None else np.nan
+    return Diagnosis(df, x, cost, res.status)
+
+
+def print_diagnosis(diag):
+    if diag.x is None:
+        print("弹性求解也失败，请检查原料池与配比界限")
+        return
+    print(f"需要放宽 {len(diag.relaxations)} 项约束（放宽后成本 {diag.cost:.2f} 元/kg DM）:")
+    for r in diag.relaxations.itertuples():
+        print(f"  {r.约束类型} {r.名称} {r.方向} {r.原界限:g} → {r.放宽后:.4g}"
+              f"（放宽 {r.放宽量:.4g}，{r.相对放宽:.1%}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检查阶段定义并诊断不可行的阶段')
+    parser.add_argument('--l1', action='store_true',
+                        help='只最小化放宽量之和（线性规划），不求被放宽的约束个数最少')
+    args = parser.parse_args()
+
+    import 配方
+    for issue in validate_stages(配方.stages_req, 配方.stage_ingredients, 配方.nutr_val, 配方.nut_idx,
+                                 配方.max_ingredient_pct, 配方.min_ingredient_pct):
+        print(issue)
+    for stage, model in 配方.build_stage_models().items():
+        if model.solve().success:
+            continue
+        print(f"\n===== {stage} 不可行 =====")
+        print_diagnosis(diagnose(model, min_count=not args.l1))
+
+
+if __name__ == '__main__':
+    main()
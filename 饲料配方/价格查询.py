@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+预计算的价格查询面：离线求出驱动原料价格网格上的最优基，在线查询只需查表加一次小规模线性求解。
+
+价格只出现在目标函数中，同一个最优基对应的配方（顶点 x）与价格无关。离线阶段对
+驱动原料（缺省 玉米、豆粕、苜蓿、玉米青贮 中在原料池里的）的价格网格逐点热启动求解，
+记录每个网格点的最优基，去重后为每个基保存顶点 x 与基矩阵的逆。
+
+在线查询：
+    1. 由驱动原料价格找到所在网格单元，取单元各角点的最优基作为候选
+    2. 对候选基解 Bᵀy = c_B 得到对偶价格，检查检验数符号（最优性证书）
+    3. 第一个通过检查的基即为最优，配方为其顶点 x，成本 c·x
+超出网格范围或所有候选都不满足最优性时，退回 linprog 实际求解。
+证书对整条价格向量成立，非驱动原料的价格也可以一并修改。
+
+用法：
+    python 价格查询.py build --grid 9 --range 0.5        # 预计算并保存到 .cache/价格查询/
+    python 价格查询.py query 泌乳早期 豆粕=3.8 玉米青贮=0.5
+"""
+import argparse
+import itertools
+import os
+import time
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+import 求解器
+from 求解器 import STATUS_MESSAGES
+from 求解缓存 import problem_key
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SURFACE_DIR = os.path.join(HERE, '.cache', '价格查询')
+DEFAULT_DRIVERS = ('玉米', '豆粕', '苜蓿', '玉米青贮')
+
+# 变量状态：基变量、非基在下界、非基在上界、固定（上下界相同，检验数不限符号）
+BASIC, AT_LOWER, AT_UPPER, FIXED = 0, 1, 2, 3
+# 检验数、界限判断的容差
+DUAL_TOL = 1e-9
+PRIMAL_TOL = 1e-9
+
+
+def _full_bounds(model):
+    """结构变量与行变量（r = A x）的界限，顺序为 [x, r]"""
+    return np.r_[model.lower, model.row_lower], np.r_[model.upper, model.row_upper]
+
+
+def _basis_from_highs(model):
+    """从 HiGHS 当前的基读取各变量状态"""
+    basis = model._highs.getBasis()
+    raw = np.r_[[int(s) for s in basis.col_status], [int(s) for s in basis.row_status]]
+    lo, hi = _full_bounds(model)
+    status = np.where(raw == int(求解器.highspy.HighsBasisStatus.kBasic), BASIC,
+                      np.where(raw == int(求解器.highspy.HighsBasisStatus.kUpper), AT_UPPER, AT_LOWER))
+    status[(status != BASIC) & (lo == hi)] = FIXED
+    return status
+
+
+def _basis_from_x(model, x):
+    """
+    没有 highspy 时由顶点 x 推出基：严格在界限内的变量为基变量，
+    退化时从取界的变量中补足到满秩；推不出时返回 None。
+    """
+    M = np.hstack([model.A.toarray(), -np.eye(model.A.shape[0])])
+    v = np.r_[x, model.A @ x]
+    lo, hi = _full_bounds(model)
+    at_lo, at_hi = np.abs(v - lo) < PRIMAL_TOL, np.abs(v - hi) < PRIMAL_TOL
+    basic = list(np.flatnonzero(~at_lo & ~at_hi))
+    m = M.shape[0]
+    if len(basic) > m or np.linalg.matrix_rank(M[:, basic]) < len(basic):
+        return None
+    for j in np.flatnonzero(at_lo | at_hi):
+        if len(basic) == m:
+            break
+        if np.linalg.matrix_rank(M[:, basic + [j]]) == len(basic) + 1:
+            basic.append(j)
+    if len(basic) < m:
+        return None
+    status = np.where(at_hi, AT_UPPER, AT_LOWER)
+    status[lo == hi] = FIXED
+    status[basic] = BASIC
+    return status
+
+
+class PriceSurface:
+    """单个阶段的价格查询面"""
+
+    def __init__(self, model, drivers, axes, cell_basis, statuses, vertices, key):
+        self.model = model
+        self.drivers = list(drivers)
+        self.driver_cols = np.array([model.index[d] for d in self.drivers], dtype=int)
+        self.axes = [np.asarray(a, dtype=float) for a in axes]
+        self.cell_basis = np.asarray(cell_basis)      # 网格点 → 基编号（-1 为无解）
+        self.statuses = np.asarray(statuses)          # 基编号 × (k+m) 变量状态
+        self.vertices = np.asarray(vertices)          # 基编号 × k 顶点配比
+        self.key = key
+        self._prepare()
+
+    def _prepare(self):
+        A = self.model.A.toarray()
+        m = A.shape[0]
+        self._M = np.hstack([A, -np.eye(m)])
+        self._basic = [np.flatnonzero(s == BASIC) for s in self.statuses]
+        self._binv_t = [np.linalg.inv(self._M[:, b]).T for b in self._basic]
+
+    # —— 离线构建 ——
+    @classmethod
+    def build(cls, model, drivers=DEFAULT_DRIVERS, grid=9, span=0.5):
+        """驱动原料各取 grid 个价格点（当前价格的 ±span），逐点热启动求解"""
+        drivers = [d for d in drivers if d in model.index]
+        base = model.c.copy()
+        axes = [np.linspace(base[model.index[d]] * (1 - span), base[model.index[d]] * (1 + span), grid)
+                for d in drivers]
+        cols = [model.index[d] for d in drivers]
+        cell_basis = np.full([grid] * len(drivers), -1, dtype=np.int32)
+        seen, statuses, vertices = {}, [], []
+        for idx in itertools.product(range(grid), repeat=len(drivers)):
+            c = base.copy()
+            c[cols] = [axes[a][i] for a, i in enumerate(idx)]
+            status, _, x = model._solve_one(c)
+            if status != 0:
+                continue
+            st = _basis_from_highs(model) if 求解器.highspy is not None else _basis_from_x(model, x)
+            if st is None:
+                continue
+            sig = st.tobytes()
+            if sig not in seen:
+                seen[sig] = len(statuses)
+                statuses.append(st)
+                vertices.append(x)
+            cell_basis[idx] = seen[sig]
+        k = model.n + model.A.shape[0]
+        return cls(model, drivers, axes, cell_basis,
+                   np.array(statuses, dtype=np.int8).reshape(-1, k),
+                   np.array(vertices).reshape(-1, model.n), problem_key(model, base))
+
+    # —— 在线查询 ——
+    def _candidates(self, c):
+        """驱动价格所在网格单元各角点的基编号；超出网格返回 None"""
+        corners = []
+        for axis, p in zip(self.axes, c[self.driver_cols]):
+            if not axis[0] <= p <= axis[-1]:
+                return None
+            i = min(int(np.searchsorted(axis, p, side='right')) - 1, len(axis) - 2)
+            i = max(i, 0)
+            # 离价格较近的角点排在前面，通常第一个候选就通过检查
+            corners.append((i, i + 1) if p - axis[i] <= axis[i + 1] - p else (i + 1, i))
+        ids = [self.cell_basis[idx] for idx in itertools.product(*corners)] if corners else [
+            self.cell_basis[()]]
+        return list(dict.fromkeys(int(b) for b in ids if b >= 0))
+
+    def certify(self, b, c):
+        """基 b 在价格 c 下是否最优（检验数符号检查）"""
+        c_full = np.r_[c, np.zeros(self._M.shape[0])]
+        y = self._binv_t[b] @ c_full[self._basic[b]]
+        d = c_full - self._M.T @ y
+        st = self.statuses[b]
+        return not ((d[st == AT_LOWER] < -DUAL_TOL).any() or (d[st == AT_UPPER] > DUAL_TOL).any())
+
+    def query(self, prices=None, c=None):
+        """
+        prices 为 {原料: 价格}（未给出的原料用建面时的价格），或直接给出完整价格向量 c。
+        返回 OptimizeResult（x, fun, status, success, message, source）；
+        source 为 '查表' 或 'linprog'。
+        """
+        if c is None:
+            c = self.model.c.copy()
+            for ing, p in (prices or {}).items():
+                c[self.model.index[ing]] = p
+        c = np.asarray(c, dtype=float)
+        for b in self._candidates(c) or ():
+            if self.certify(b, c):
+                x = self.vertices[b]
+                return OptimizeResult(x=x, fun=float(c @ x), status=0, success=True,
+                                      message=STATUS_MESSAGES[0], source='查表')
+        status, fun, x = self.model._solve_linprog(c)
+        return OptimizeResult(x=x, fun=fun, status=status, success=status == 0,
+                              message=STATUS_MESSAGES.get(status, STATUS_MESSAGES[4]), source='linprog')
+
+    # —— 保存与读取 ——
+    def save(self, path):
+        np.savez_compressed(path, drivers=np.array(self.drivers), cell_basis=self.cell_basis,
+                            statuses=self.statuses, vertices=self.vertices, key=np.array(self.key),
+                            **{f'axis{i}': a for i, a in enumerate(self.axes)})
+
+    @classmethod
+    def load(cls, path, model):
+        """读取查询面；模型（价格与约束）与建面时不同则返回 None"""
+        with np.load(path) as f:
+            if str(f['key']) != problem_key(model, model.c):
+                return None
+            drivers = [str(d) for d in f['drivers']]
+            axes = [f[f'axis{i}'] for i in range(len(drivers))]
+            return cls(model, drivers, axes, f['cell_basis'], f['statuses'], f['vertices'],
+                       str(f['key']))
+
+
+def surface_path(stage, directory=SURFACE_DIR):
+    return os.path.join(directory, f'{stage}.npz')
+
+
+def build_all(stage_models, drivers=DEFAULT_DRIVERS, grid=9, span=0.5, directory=SURFACE_DIR):
+    """为所有可行阶段构建并保存查询面，返回 {阶段: PriceSurface}"""
+    os.makedirs(directory, exist_ok=True)
+    surfaces = {}
+    for stage, model in stage_models.items():
+        if not model.solve().success:
+            continue
+        surfaces[stage] = PriceSurface.build(model, drivers, grid, span)
+        surfaces[stage].save(surface_path(stage, directory))
+    return surfaces
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预计算价格查询面与实时查询')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    b = sub.add_parser('build', help='预计算全部阶段的查询面')
+    b.add_argument('--grid', type=int, default=9, help='每个驱动原料的价格点数')
+    b.add_argument('--range', type=float, default=0.5, help='价格范围（当前价格的 ±比例）')
+    b.add_argument('--drivers', default=','.join(DEFAULT_DRIVERS), help='驱动原料，逗号分隔')
+    q = sub.add_parser('query', help='查询某阶段在给定价格下的配方')
+    q.add_argument('stage')
+    q.add_argument('prices', nargs='*', help='原料=价格')
+    args = parser.parse_args()
+
+    import 配方
+    models = 配方.build_stage_models()
+    if args.cmd == 'build':
+        t0 = time.perf_counter()
+        surfaces = build_all(models, args.drivers.split(','), args.grid, args.range)
+        for stage, s in surfaces.items():
+            print(f"{stage:10s} 驱动原料 {s.drivers}，网格 {s.cell_basis.size} 点，最优基 {len(s.vertices)} 个")
+        print(f"构建耗时 {time.perf_counter() - t0:.1f} 秒，已保存到 {SURFACE_DIR}")
+        return
+
+    model = models[args.stage]
+    path = surface_path(args.stage)
+    surface = PriceSurface.load(path, model) if os.path.exists(path) else None
+    if surface is None:
+        raise SystemExit(f"{args.stage} 没有可用的查询面（未构建或价格/约束已变），请先运行 build")
+    prices = {}
+    for item in args.prices:
+        name, value = item.split('=')
+        prices[name] = float(value)
+    t0 = time.perf_counter()
+    res = surface.query(prices)
+    elapsed = (time.perf_counter() - t0) * 1e6
+    if not res.success:
+        print("优化失败:", res.message)
+        return
+    print(f"成本 {res.fun:.4f} 元/kg DM（{res.source}，{elapsed:.0f} µs）")
+    for ing, pct in sorted(zip(model.ingredients, res.x), key=lambda x: -x[1]):
+        if pct > 1e-3:
+            print(f"  {ing:8s}: {pct * 100:6.2f}%")
+
+
+if __name__ == '__main__':
+    main()
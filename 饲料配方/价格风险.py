@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+价格不确定下的配方：蒙特卡洛抽样与鲁棒（最坏情况成本最低）配方。
+
+价格来源：
+    区间     原料目录中的 price_low/price_high（如 饲料原料价格.xlsx 中的 “78-85”），均匀抽样
+    波动率   estimate_volatility() 从历史价格估计的对数收益率标准差，对数正态抽样；
+             缺省使用 数据关联/全国饲料价格.xlsx 中玉米、豆粕的月均价，
+             其余原料可用 --default-vol 给一个统一的波动率
+    其它     固定为当前价格
+每个阶段的全部情景用 StageModel.solve_batch() 一次批量求解（热启动），
+再汇总成本与配比的分布。
+
+鲁棒配方采用情景最坏成本最小化（epigraph 形式）：
+    min t   s.t.  C_s · x ≤ t（每个情景 s），原阶段约束
+各原料价格只在独立区间内变化时，最坏情景就是全部取上限，这个顶点总会加入情景集。
+
+用法：python 价格风险.py -n 5000 --seed 0
+"""
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+
+# 单个阶段的抽样结果：prices (N, k)、batch 为 BatchResult、summary/composition 为 DataFrame
+MonteCarloResult = namedtuple('MonteCarloResult', ['prices', 'batch', 'summary', 'composition'])
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+FEED_PRICE_XLSX = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', '数据关联', '全国饲料价格.xlsx')
+# 全国饲料价格.xlsx 的列 → 跟随该价格波动的配方原料
+HISTORY_MAP = {
+    '玉米（元/公斤）': ['玉米', '压片玉米'],
+    '豆粕（元/公斤）': ['豆粕', '豆粕(3–6)'],
+}
+
+
+def estimate_volatility(history):
+    """
+    history: 行为时间、列为原料的价格表，返回各原料对数收益率的标准差（每期）
+    """
+    logret = np.log(history.astype(float)).diff().dropna(how='all')
+    return logret.std().dropna().to_dict()
+
+
+def feed_price_history(path=FEED_PRICE_XLSX):
+    """读取全国饲料价格（周度），按月取均值，列名换成 HISTORY_MAP 中的配方原料"""
+    df = pd.read_excel(path)
+    monthly = df.groupby(['年度', '月份'])[list(HISTORY_MAP)].mean()
+    return pd.DataFrame({ing: monthly[col] for col, ings in HISTORY_MAP.items() for ing in ings})
+
+
+def price_bounds(catalog, names, base):
+    """按原料名从目录取价格区间，目录中没有的原料区间退化为 base"""
+    low, high = np.array(base, dtype=float), np.array(base, dtype=float)
+    for j, name in enumerate(names):
+        i = catalog.index.get(name)
+        if i is not None and np.isfinite(catalog.price_low[i]):
+            low[j], high[j] = catalog.price_low[i], catalog.price_high[i]
+    return low, high
+
+
+def sample_prices(base, low, high, n, volatility=None, names=None, seed=None):
+    """
+    生成 n×k 价格情景：有区间（low < high）的原料均匀抽样；否则有波动率的原料对数正态抽样；
+    其余固定为 base。volatility 为 {原料: σ}，需要同时给出 names。
+    """
+    rng = np.random.default_rng(seed)
+    base = np.asarray(base, dtype=float)
+    C = np.tile(base, (n, 1))
+    ranged = high > low
+    C[:, ranged] = rng.uniform(low[ranged], high[ranged], size=(n, int(ranged.sum())))
+    if volatility:
+        for j, name in enumerate(names):
+            sigma = volatility.get(name)
+            if sigma and not ranged[j]:
+                C[:, j] = base[j] * np.exp(rng.normal(-0.5 * sigma ** 2, sigma, size=n))
+    return C
+
+
+def summarize(model, C, batch):
+    """汇总单个阶段的成本分布与各原料配比分布"""
+    ok = batch.status == 0
+    cost = batch.cost[ok]
+    summary = {'阶段': model.stage, '情景数': len(C), '可行情景': int(ok.sum())}
+    if ok.any():
+        summary.update({'成本均值': cost.mean(), '成本标准差': cost.std()})
+        summary.update({f'成本P{int(q * 100)}': v for q, v in zip(QUANTILES, np.quantile(cost, QUANTILES))})
+        X = batch.x[ok] * 100
+        qs = np.quantile(X, QUANTILES, axis=0)
+        composition = pd.DataFrame({
+            '原料': model.ingredients,
+            '平均配比%': X.mean(axis=0),
+            **{f'P{int(q * 100)}配比%': qs[k] for k, q in enumerate(QUANTILES)},
+            '入选概率': (X > 0.1).mean(axis=0),
+        })
+    else:
+        composition = pd.DataFrame(columns=['原料'])
+    return summary, composition
+
+
+def monte_carlo(model, n, low, high, volatility=None, seed=None):
+    """对一个阶段抽样 n 个价格情景并批量求解"""
+    C = sample_prices(model.c, low, high, n, volatility, model.ingredients, seed)
+    batch = model.solve_batch(C)
+    summary, composition = summarize(model, C, batch)
+    return MonteCarloResult(C, batch, summary, composition)
+
+
+def robust_ration(model, scenarios):
+    """
+    情景最坏成本最小的配方。变量为 [x, t]，返回 OptimizeResult，
+    其中 fun 为最坏情景成本，x 只含配比部分。
+    """
+    S = np.atleast_2d(np.asarray(scenarios, dtype=float))
+    n, k = S.shape[0], model.n
+    A_ub, b_ub, A_eq, b_eq = model.linprog_form()
+    pad = lambda A: sparse.hstack([A, sparse.csr_matrix((A.shape[0], 1))])
+    # C_s · x - t ≤ 0
+    A_sc = sparse.hstack([sparse.csr_matrix(S), -np.ones((n, 1))])
+    res = linprog(np.r_[np.zeros(k), 1.0],
+                  A_ub=sparse.vstack([pad(A_ub), A_sc]).tocsr(),
+                  b_ub=np.r_[b_ub, np.zeros(n)],
+                  A_eq=pad(A_eq), b_eq=b_eq,
+                  bounds=list(zip(model.lower, model.upper)) + [(None, None)],
+                  method='highs')
+    if res.success:
+        res.x = res.x[:k]
+    return res
+
+
+def run(stage_models, catalog, n=5000, volatility=None, seed=None):
+    """
+    对每个阶段做蒙特卡洛与鲁棒求解，返回 (成本分布汇总表, {阶段: MonteCarloResult}, {阶段: 鲁棒结果})
+    """
+    ss = np.random.SeedSequence(seed)
+    mc, robust, rows = {}, {}, []
+    for (stage, model), child in zip(stage_models.items(), ss.spawn(len(stage_models))):
+        low, high = price_bounds(catalog, model.ingredients, model.c)
+        r = monte_carlo(model, n, low, high, volatility, seed=child)
+        mc[stage] = r
+        scen = np.vstack([r.prices, high])
+        rb = robust_ration(model, scen)
+        robust[stage] = rb
+        row = dict(r.summary)
+        row['鲁棒最坏成本'] = rb.fun if rb.success else np.nan
+        # 鲁棒配方在当前价格下的成本，与成本P50对比即为“保险费”
+        row['鲁棒配方当前价成本'] = float(model.c @ rb.x) if rb.success else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows), mc, robust
+
+
+def main():
+    parser = argparse.ArgumentParser(description='价格区间下的蒙特卡洛与鲁棒配方')
+    parser.add_argument('-n', type=int, default=5000, help='每个阶段的价格情景数')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--history', help='历史价格表（CSV，行为时间，列为原料），用于估计波动率；'
+                                              '缺省读取 全国饲料价格.xlsx')
+    parser.add_argument('--default-vol', type=float, default=0.0,
+                        help='没有区间与历史数据的原料使用的对数波动率')
+    args = parser.parse_args()
+
+    import 配方
+    from 原料目录 import load_catalog
+    catalog = load_catalog(配方.price_dict, 配方.nutr_val, 配方.nut_idx, 配方.stage_ingredients)
+    models = 配方.build_stage_models(catalog)
+    vol = {}
+    if args.default_vol > 0:
+        vol = {name: args.default_vol for name in catalog.names}
+    if args.history:
+        vol.update(estimate_volatility(pd.read_csv(args.history, index_col=0, encoding='utf-8')))
+    elif os.path.exists(FEED_PRICE_XLSX):
+        vol.update(estimate_volatility(feed_price_history()))
+
+    table, mc, robust = run(models, catalog, args.n, vol, args.seed)
+    pd.set_option('display.width', 200)
+    print("\n================ 成本分布（元/kg DM） ================\n")
+    print(table.round(4).to_string(index=False))
+    for stage, rb in robust.items():
+        if not rb.success:
+            continue
+        print(f"\n===== {stage} 鲁棒配方（最坏成本 {rb.fun:.4f} 元/kg DM） =====")
+        for ing, pct in sorted(zip(models[stage].ingredients, rb.x), key=lambda x: -x[1]):
+            if pct > 1e-3:
+                print(f"  {ing:8s}: {pct * 100:6.2f}%")
+
+
+if __name__ == '__main__':
+    main()
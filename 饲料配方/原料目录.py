@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+原料目录：把 营养成分.xlsx 与 饲料原料价格.xlsx 解析一次，编译为按列存放的二进制缓存。
+
+缓存目录（默认 饲料配方/.cache/原料目录）中：
+    meta.json        原料名、营养名、来源文件的 mtime/大小/sha256、基准字典的哈希
+    price.npy        价格 (n,)，元/kg；区间价格取下限
+    price_low.npy    价格区间下限 (n,)
+    price_high.npy   价格区间上限 (n,)
+    nutrients.npy    营养矩阵 (n, m)，缺失为 nan
+之后的运行用 np.load(mmap_mode='r') 直接映射这些数组；只有工作簿内容（mtime 变化且
+sha256 变化）或 配方.py 中的基准字典变化时才重新解析。
+
+取值优先级：配方.py 中人工核对过的 price_dict / nutr_val 优先，工作簿补充它们没有的
+原料、价格区间和营养列（Ca、P、Fat、ADF）。两边都有且相差较大的值、阶段原料池中
+缺少价格或营养数据的原料，都在编译时报告，而不是等到求解时才 KeyError。
+"""
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from 求解器 import nutrient_table
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NUTRIENT_XLSX = os.path.join(HERE, '营养成分.xlsx')
+PRICE_XLSX = os.path.join(HERE, '饲料原料价格.xlsx')
+CACHE_DIR = os.path.join(HERE, '.cache', '原料目录')
+ARRAYS = ('price', 'price_low', 'price_high', 'nutrients')
+
+# —— 工作簿名称 → 目录名称（依据 nutr_val / price_dict 注释中的对应关系） ——
+NUTRIENT_ALIASES = {
+    '国产苜蓿': '苜蓿',
+    '进口苜蓿': '苜蓿草',
+    '进口燕麦干草': '进口燕麦',
+    '燕麦干草': '燕麦草',
+    '玉米秸': '玉米秸秆',
+    '水稻秸': '稻草',
+    '小麦麸': '小麦麸皮',
+    '甜菜粕': '甜菜颗粒',
+    '向日葵粕': '葵花粕',
+    '干啤酒糟': '啤酒糟',
+    '湿啤酒糟': '啤酒糟',
+}
+PRICE_ALIASES = {
+    '麸皮': '小麦麸皮',
+    '棉粕': '棉籽粕',
+    '苜蓿草饲料': '苜蓿草',
+}
+# 价格单位 → 换算为 元/kg 的除数
+PRICE_UNITS = {'元/吨': 1000.0, '元/公斤': 1.0}
+# 两边都有值时，相对差超过该比例记为冲突
+CONFLICT_TOL = 0.05
+
+
+class Catalog:
+    """
+    对齐后的原料目录：names、index（原料→行号）、nutrients（营养名列表）及各数组。
+    数组可能是只读的内存映射，不要原地修改。
+    """
+
+    def __init__(self, names, nutrients, arrays, report=None):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.nutrients = list(nutrients)
+        self.price = arrays['price']
+        self.price_low = arrays['price_low']
+        self.price_high = arrays['price_high']
+        self.values = arrays['nutrients']
+        self.report = list(report or [])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def price_dict(self):
+        """有价格的原料 → 元/kg"""
+        return {n: float(p) for n, p in zip(self.names, self.price) if np.isfinite(p)}
+
+    def nutrient_table(self, nut_idx):
+        """
+        按 nut_idx 的营养顺序构造 NutrientTable；任一所需营养缺失的原料不进入 index。
+        """
+        cols = [self.nutrients.index(nut) for nut in sorted(nut_idx, key=nut_idx.get)]
+        sub = np.asarray(self.values[:, cols])
+        ok = np.isfinite(sub).all(axis=1)
+        return nutrient_table({n: row for n, row, keep in zip(self.names, sub, ok) if keep},
+                              nut_idx)
+
+    def check_names(self, stage_ingredients, nut_idx=None):
+        """
+        检查阶段原料池中的名称，返回问题列表（每项一行说明）。
+        nut_idx 给出时同时检查这些营养是否齐全。
+        """
+        cols = None if nut_idx is None else [self.nutrients.index(n) for n in nut_idx]
+        issues = []
+        for stage, ings in stage_ingredients.items():
+            for ing in ings:
+                if ing not in self.index:
+                    issues.append(f"{stage}: 原料 {ing} 既没有价格也没有营养数据")
+                    continue
+                i = self.index[ing]
+                if not np.isfinite(self.price[i]):
+                    issues.append(f"{stage}: 原料 {ing} 没有价格")
+                if cols is not None and not np.isfinite(self.values[i, cols]).all():
+                    missing = [n for n, c in zip(nut_idx, cols) if not np.isfinite(self.values[i, c])]
+                    issues.append(f"{stage}: 原料 {ing} 缺少营养数据 {missing}")
+        return issues
+
+
+# —— 工作簿解析 ——
+def _nutrient_name(header):
+    m = re.match(r'\s*([A-Za-z_]+)', str(header))
+    return m.group(1) if m else None
+
+
+def parse_nutrient_workbook(path):
+    """
+    读取 营养成分.xlsx 的主表（到第一个空行为止），同名原料取平均，返回 (DataFrame, 重复名列表)。
+    """
+    raw = pd.read_excel(path, header=0)
+    names = raw.iloc[:, 0].astype('string').str.strip()
+    blank = names.isna() | (names == '')
+    end = int(blank.to_numpy().argmax()) if blank.any() else len(raw)
+    df = raw.iloc[:end, 1:].apply(pd.to_numeric, errors='coerce')
+    df.columns = [_nutrient_name(c) for c in df.columns]
+    df.index = names.iloc[:end].map(lambda n: NUTRIENT_ALIASES.get(n, n))
+    dup = sorted(df.index[df.index.duplicated()].unique())
+    return df.groupby(level=0, sort=False).mean(), dup
+
+
+def _parse_price(value, divisor):
+    """'78-85' 这样的区间返回 (低, 高)，单个数值返回 (值, 值)"""
+    if isinstance(value, str):
+        parts = [float(p) for p in re.findall(r'\d+(?:\.\d+)?', value)]
+        if not parts:
+            return None
+        low, high = parts[0], parts[-1]
+    elif pd.isna(value):
+        return None
+    else:
+        low = high = float(value)
+    return low / divisor, high / divisor
+
+
+def parse_price_workbook(path):
+    """
+    读取 饲料原料价格.xlsx：首行为单位（元/吨 或 元/公斤），其左侧一列为原料名。
+    返回 {原料: (低价, 高价)}，单位 元/kg。
+    """
+    raw = pd.read_excel(path, header=None, sheet_name=0)
+    prices = {}
+    for j in range(1, raw.shape[1]):
+        divisor = PRICE_UNITS.get(str(raw.iat[0, j]).strip())
+        if divisor is None:
+            continue
+        for name, value in zip(raw.iloc[1:, j - 1], raw.iloc[1:, j]):
+            if pd.isna(name):
+                continue
+            parsed = _parse_price(value, divisor)
+            if parsed is not None:
+                name = str(name).strip()
+                prices[PRICE_ALIASES.get(name, name)] = parsed
+    return prices
+
+
+# —— 编译 ——
+def compile_catalog(base_price, base_nutr, nut_idx,
+                    nutrient_xlsx=NUTRIENT_XLSX, price_xlsx=PRICE_XLSX):
+    """
+    合并基准字典与两个工作簿，返回 (names, nutrients, arrays, report)。
+    """
+    wb_nutr, dup = parse_nutrient_workbook(nutrient_xlsx)
+    wb_price = parse_price_workbook(price_xlsx)
+    report = [f"营养成分.xlsx 中 {n} 有多行，已取平均" for n in dup]
+
+    base_nuts = sorted(nut_idx, key=nut_idx.get)
+    nutrients = base_nuts + [c for c in wb_nutr.columns if c not in base_nuts]
+    names = list(dict.fromkeys([*base_nutr, *base_price, *wb_nutr.index, *wb_price]))
+    index = {n: i for i, n in enumerate(names)}
+    n, m = len(names), len(nutrients)
+
+    values = np.full((n, m), np.nan)
+    ncol = {nut: k for k, nut in enumerate(nutrients)}
+    for name, row in wb_nutr.iterrows():
+        for nut, v in row.items():
+            values[index[name], ncol[nut]] = v
+    # 工作簿只有 NDF，按 nutr_val 的惯例 Feed_NDF 取 NDF
+    if 'Feed_NDF' in ncol and 'NDF' in ncol:
+        fill = np.isnan(values[:, ncol['Feed_NDF']])
+        values[fill, ncol['Feed_NDF']] = values[fill, ncol['NDF']]
+    for name, vals in base_nutr.items():
+        for nut, v in zip(base_nuts, vals):
+            wb = values[index[name], ncol[nut]]
+            if np.isfinite(wb) and abs(wb - v) > CONFLICT_TOL * max(abs(v), 1e-9):
+                report.append(f"{name} 的 {nut}: nutr_val 为 {v}，工作簿为 {wb:.4g}，采用 nutr_val")
+            values[index[name], ncol[nut]] = v
+
+    price = np.full(n, np.nan)
+    price_low = np.full(n, np.nan)
+    price_high = np.full(n, np.nan)
+    for name, (low, high) in wb_price.items():
+        price[index[name]], price_low[index[name]], price_high[index[name]] = low, low, high
+    for name, p in base_price.items():
+        i = index[name]
+        if np.isfinite(price[i]) and abs(price[i] - p) > CONFLICT_TOL * p:
+            report.append(f"{name} 的价格: price_dict 为 {p}，工作簿为 {price[i]:.4g}，采用 price_dict")
+        price[i] = p
+        # 区间只在工作簿给出且包含 price_dict 的值时保留
+        if not (price_low[i] <= p <= price_high[i]):
+            price_low[i] = price_high[i] = p
+
+    arrays = {'price': price, 'price_low': price_low, 'price_high': price_high,
+              'nutrients': values}
+    return names, nutrients, arrays, report
+
+
+# —— 缓存 ——
+def _file_info(path, with_hash=True):
+    st = os.stat(path)
+    info = {'mtime': st.st_mtime, 'size': st.st_size}
+    if with_hash:
+        with open(path, 'rb') as f:
+            info['sha256'] = hashlib.sha256(f.read()).hexdigest()
+    return info
+
+
+def _base_hash(base_price, base_nutr, nut_idx):
+    payload = json.dumps([base_price, base_nutr, nut_idx], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cache_valid(meta, sources, base_hash):
+    """mtime 与大小都没变视为有效；mtime 变了但 sha256 相同也视为有效"""
+    if meta.get('base_hash') != base_hash or set(meta.get('sources', {})) != set(sources):
+        return False
+    for path, old in meta['sources'].items():
+        if not os.path.exists(path):
+            return False
+        now = _file_info(path, with_hash=False)
+        if now == {'mtime': old['mtime'], 'size': old['size']}:
+            continue
+        if _file_info(path)['sha256'] != old['sha256']:
+            return False
+    return True
+
+
+def load_catalog(base_price, base_nutr, nut_idx, stage_ingredients=None,
+                 nutrient_xlsx=NUTRIENT_XLSX, price_xlsx=PRICE_XLSX,
+                 cache_dir=CACHE_DIR, verbose=True):
+    """
+    读取原料目录：缓存有效时内存映射，否则重新解析工作簿并写缓存。
+    stage_ingredients 给出时检查阶段原料池的名称，问题并入 catalog.report。
+    """
+    sources = [os.path.abspath(nutrient_xlsx), os.path.abspath(price_xlsx)]
+    base_hash = _base_hash(base_price, base_nutr, nut_idx)
+    meta_path = os.path.join(cache_dir, 'meta.json')
+
+    meta, compiled = None, False
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if not _cache_valid(meta, sources, base_hash):
+            meta = None
+
+    if meta is None:
+        names, nutrients, arrays, report = compile_catalog(
+            base_price, base_nutr, nut_idx, nutrient_xlsx, price_xlsx)
+        compiled = True
+        os.makedirs(cache_dir, exist_ok=True)
+        for key in ARRAYS:
+            np.save(os.path.join(cache_dir, f'{key}.npy'), arrays[key])
+        meta = {'names': names, 'nutrients': nutrients, 'report': report,
+                'base_hash': base_hash,
+                'sources': {p: _file_info(p) for p in sources}}
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+    else:
+        # 内容未变但 mtime 变了时更新 mtime，下次无需再算哈希
+        fresh = {p: dict(meta['sources'][p], **_file_info(p, with_hash=False)) for p in sources}
+        if fresh != meta['sources']:
+            meta['sources'] = fresh
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=1)
+        arrays = {key: np.load(os.path.join(cache_dir, f'{key}.npy'), mmap_mode='r')
+                  for key in ARRAYS}
+
+    catalog = Catalog(meta['names'], meta['nutrients'], arrays, meta['report'])
+    # 工作簿合并问题只在编译时打印；阶段名称问题每次都检查
+    shown = list(catalog.report) if compiled else []
+    if stage_ingredients is not None:
+        issues = catalog.check_names(stage_ingredients, nut_idx)
+        catalog.report.extend(issues)
+        shown.extend(issues)
+    if verbose and shown:
+        print("原料目录检查：")
+        for line in shown:
+            print("  " + line)
+    return catalog
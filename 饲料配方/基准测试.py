@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+配方求解基准测试：建模与求解分开计时，比较不同求解方法，并在合成目录上测试规模扩展。
+
+    真实数据   配方.py 的各阶段，逐阶段计时
+    合成数据   synthetic_problem() 按真实 price_dict/nutr_val 的取值分布生成
+               n 种原料 × m 项营养的目录与可行的营养标准，不需要联网或额外文件
+方法：
+    highs-ds / highs-ipm / highs   scipy.optimize.linprog 的三种 HiGHS 方法（冷启动）
+    热启动                          StageModel.solve()（装有 highspy 时为常驻实例），
+                                    每次求解换一组 c×U(0.9, 1.1) 的扰动价格，从上一次的最优基出发
+峰值内存用 tracemalloc 记录（建模 + 一次求解）。结果写成 JSON，便于不同版本之间对比。
+
+用法：python 基准测试.py --sizes 50,200,1000 --nutrients 5,20 --repeat 5 -o 基准结果.json
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from importlib import metadata
+
+import numpy as np
+import scipy
+from scipy.optimize import linprog
+
+import 求解器
+from 求解器 import compile_stage
+
+METHODS = ('highs-ds', 'highs-ipm', 'highs')
+
+
+def synthetic_problem(n_ings, n_nuts, base_price, base_nutr, seed=None):
+    """
+    生成合成目录：价格从 base_price 中有放回抽样并加 ±20% 扰动；
+    每项营养的取值从 base_nutr 的某一列抽样（营养多于真实列数时循环使用）。
+    营养标准围绕一个随机混合配方的营养值取 ±10%，保证问题可行。
+    返回 (price_dict, nutr_val, nut_idx, ingredients, req)。
+    """
+    rng = np.random.default_rng(seed)
+    prices = np.array([float(p) for p in base_price.values()])
+    real = np.array(list(base_nutr.values()), dtype=float)
+    names = [f'原料{i:05d}' for i in range(n_ings)]
+    nut_idx = {f'N{k}': k for k in range(n_nuts)}
+
+    price = rng.choice(prices, n_ings) * rng.uniform(0.8, 1.2, n_ings)
+    values = np.column_stack([rng.choice(real[:, k % real.shape[1]], n_ings)
+                              * rng.uniform(0.9, 1.1, n_ings) for k in range(n_nuts)])
+    w = rng.dirichlet(np.ones(min(n_ings, 8)))
+    mix = w @ values[rng.choice(n_ings, len(w), replace=False)]
+    req = {f'N{k}': (0.9 * v, 1.1 * v) for k, v in enumerate(mix)}
+    return (dict(zip(names, price)), dict(zip(names, values)), nut_idx, names, req)
+
+
+def _best(fn, repeat):
+    """重复 repeat 次，返回 (最短耗时 ms, 最后一次的返回值)"""
+    best, out = np.inf, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+def bench_model(build, repeat=3, seed=0):
+    """
+    build() 返回一个 StageModel。返回该模型的计时记录列表（每种方法一条）。
+    """
+    build_ms, model = _best(build, repeat)
+
+    def form():
+        model._linprog_form = None  # 每次都重新转换
+        return model.linprog_form()
+
+    form_ms, (A_ub, b_ub, A_eq, b_eq) = _best(form, repeat)
+    if not len(b_ub):
+        A_ub = b_ub = None
+    bounds = np.column_stack([model.lower, model.upper])
+    base = {'阶段': model.stage, '原料数': model.n, '约束行数': model.A.shape[0],
+            '非零元': int(model.A.nnz), '建模ms': build_ms, '转换ms': form_ms}
+
+    records = []
+    for method in METHODS:
+        solve_ms, res = _best(lambda: linprog(model.c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                                              bounds=bounds, method=method), repeat)
+        records.append(dict(base, 方法=method, 求解ms=solve_ms, 状态=int(res.status),
+                            成本=float(res.fun) if res.status == 0 else None))
+    # 价格不变时 HiGHS 直接返回上一次的解，不能代表调价后的重算；按扰动价格轮流求解
+    draws = iter(model.c * np.random.default_rng(seed).uniform(0.9, 1.1, (repeat, model.n)))
+    model.solve()  # 先建好常驻实例，只计重算时间
+    solve_ms, _ = _best(lambda: model.solve(next(draws)), repeat)
+    res = model.solve()  # 成本按原价格报告，与冷启动各行可比
+    records.append(dict(base, 方法='热启动' if 求解器.highspy is not None else 'linprog',
+                        求解ms=solve_ms, 状态=int(res.status),
+                        成本=float(res.fun) if res.status == 0 else None))
+    return records
+
+
+def peak_memory(build):
+    """建模 + 一次求解的 Python 堆峰值（MB）"""
+    tracemalloc.start()
+    try:
+        build().solve()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_real(repeat=3):
+    import 配方
+    records = []
+    table = 求解器.nutrient_table(配方.nutr_val, 配方.nut_idx)
+    for stage, req in 配方.stages_req.items():
+        build = lambda stage=stage, req=req: compile_stage(
+            stage, 配方.stage_ingredients[stage], req, table, 配方.nut_idx,
+            配方.max_ingredient_pct.get(stage), 配方.min_ingredient_pct.get(stage), 配方.price_dict)
+        mem = peak_memory(build)
+        for r in bench_model(build, repeat):
+            records.append(dict(r, 数据='真实', 峰值内存MB=mem))
+    return records
+
+
+def bench_synthetic(sizes, nutrients, repeat=3, seed=0):
+    import 配方
+    records = []
+    for n in sizes:
+        for m in nutrients:
+            price, nutr, nut_idx, names, req = synthetic_problem(
+                n, m, 配方.price_dict, 配方.nutr_val, seed)
+            table = 求解器.nutrient_table(nutr, nut_idx)
+            build = lambda: compile_stage(f'合成{n}x{m}', names, req, table, nut_idx,
+                                          price_dict=price)
+            mem = peak_memory(build)
+            for r in bench_model(build, repeat, seed):
+                records.append(dict(r, 数据='合成', 营养数=m, 峰值内存MB=mem))
+    return records
+
+
+def environment():
+    return {'时间': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), '平台': platform.platform(),
+            'numpy': np.__version__, 'scipy': scipy.__version__,
+            'highspy': metadata.version('highspy') if 求解器.highspy is not None else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配方求解基准测试')
+    parser.add_argument('--sizes', default='50,200,1000', help='合成目录的原料数，逗号分隔')
+    parser.add_argument('--nutrients', default='5,20', help='合成目录的营养项数，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='每项计时重复次数（取最短）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--real-only', action='store_true', help='只测真实阶段')
+    parser.add_argument('-o', '--output', default='基准结果.json')
+    args = parser.parse_args()
+
+    records = bench_real(args.repeat)
+    if not args.real_only:
+        sizes = [int(s) for s in args.sizes.split(',')]
+        nutrients = [int(s) for s in args.nutrients.split(',')]
+        records += bench_synthetic(sizes, nutrients, args.repeat, args.seed)
+
+    import pandas as pd
+    df = pd.DataFrame(records)
+    pd.set_option('display.width', 200)
+    print(df[['数据', '阶段', '原料数', '约束行数', '方法', '建模ms', '求解ms', '峰值内存MB', '状态']]
+          .round(3).to_string(index=False))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'环境': environment(), '结果': records}, f, ensure_ascii=False, indent=1)
+    print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+实时调价：常驻进程，逐条读取 (原料, 价格) 行情，只重算用到该原料的阶段并输出配方差异。
+
+行情来源（每行一条）：标准输入、持续追加的文件（tail）、或本机 TCP 端口。
+行格式：  原料,价格   或   原料 价格   或   {"原料": "豆粕", "价格": 3.5}
+
+每个阶段的 StageModel 保留自己的 HiGHS 实例，调价后从上一次的最优基热启动，
+单个阶段重算通常在毫秒级。
+
+用法：
+    python 实时调价.py                   # 从标准输入读取
+    python 实时调价.py --file 行情.txt    # 跟踪文件新增的行
+    python 实时调价.py --port 9000       # 监听 127.0.0.1:9000
+"""
+import argparse
+import json
+import socket
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# 配比变化小于该值（质量分数）不计入差异
+DIFF_TOL = 1e-4
+
+
+def parse_tick(line):
+    """解析一行行情，返回 (原料, 价格)；空行或注释返回 None，价格非有限或为负时抛出 ValueError"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        d = json.loads(line)
+        name, price = str(d['原料']), float(d['价格'])
+    else:
+        name, price = line.replace('，', ',').replace(',', ' ').split()
+        price = float(price)
+    # float() 接受 nan/inf，写入目标系数后 HiGHS 会返回无意义的结果
+    if not np.isfinite(price) or price < 0:
+        raise ValueError(f"价格须为非负有限数：{price}")
+    return name, price
+
+
+class Repricer:
+    """
+    维护各阶段的当前价格与最近一次结果；update() 只重算受影响的阶段。
+    """
+
+    def __init__(self, stage_models):
+        self.models = stage_models
+        self.prices = {stage: model.c.copy() for stage, model in stage_models.items()}
+        # 倒排索引：原料 → 用到它的阶段
+        self.stages_of = defaultdict(set)
+        for stage, model in stage_models.items():
+            for ing in model.ingredients:
+                self.stages_of[ing].add(stage)
+        self.results = {stage: model.solve(self.prices[stage])
+                        for stage, model in stage_models.items()}
+
+    def update(self, ingredient, price):
+        """应用一条调价并重算受影响阶段，返回差异列表（每个阶段一个字典）"""
+        return self.update_many({ingredient: price})
+
+    def update_many(self, ticks):
+        """一次应用多条调价，每个受影响阶段只重算一次"""
+        touched = set()
+        for ing, price in ticks.items():
+            for stage in self.stages_of.get(ing, ()):
+                self.prices[stage][self.models[stage].index[ing]] = price
+                touched.add(stage)
+        return [self._resolve(stage) for stage in sorted(touched)]
+
+    def _resolve(self, stage):
+        model = self.models[stage]
+        old = self.results[stage]
+        new = model.solve(self.prices[stage])
+        self.results[stage] = new
+        diff = {'阶段': stage, '成功': bool(new.success),
+                '原成本': float(old.fun) if old.success else None,
+                '新成本': float(new.fun) if new.success else None,
+                '配比变化': {}}
+        if new.success:
+            before = old.x if old.success else np.zeros(model.n)
+            for ing, a, b in zip(model.ingredients, before, new.x):
+                if abs(b - a) > DIFF_TOL:
+                    diff['配比变化'][ing] = (round(float(a) * 100, 2), round(float(b) * 100, 2))
+        return diff
+
+
+# —— 行情来源 ——
+def iter_stdin():
+    for line in sys.stdin:
+        yield line
+
+
+def iter_file(path, poll=0.05, from_start=False):
+    """类似 tail -f：默认从文件末尾开始，持续读取新增行"""
+    with open(path, encoding='utf-8') as f:
+        if not from_start:
+            f.seek(0, 2)
+        while True:
+            line = f.readline()
+            if line:
+                yield line
+            else:
+                time.sleep(poll)
+
+
+def iter_socket(port, host='127.0.0.1'):
+    """监听本机端口，依次接受连接并逐行读取"""
+    with socket.create_server((host, port)) as server:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile('r', encoding='utf-8') as f:
+                for line in f:
+                    yield line
+
+
+def unchanged(diff):
+    """成本与配比都没有变化（或前后都失败）的阶段不输出"""
+    if not diff['成功']:
+        return diff['原成本'] is None
+    return (diff['原成本'] is not None and not diff['配比变化']
+            and abs(diff['新成本'] - diff['原成本']) < 1e-9)
+
+
+def format_diff(diff, elapsed_ms):
+    if not diff['成功']:
+        return f"[{elapsed_ms:.2f} ms] {diff['阶段']}: 优化失败"
+    old = '—' if diff['原成本'] is None else f"{diff['原成本']:.4f}"
+    changes = '，'.join(f"{ing} {a:.2f}%→{b:.2f}%" for ing, (a, b) in diff['配比变化'].items())
+    return (f"[{elapsed_ms:.2f} ms] {diff['阶段']}: 成本 {old} → {diff['新成本']:.4f} 元/kg DM"
+            + (f"；{changes}" if changes else "；配比不变"))
+
+
+def run(lines, repricer, as_json=False, out=sys.stdout):
+    for line in lines:
+        try:
+            tick = parse_tick(line)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"无法解析行情：{line.strip()!r}（{e}）", file=sys.stderr)
+            continue
+        if tick is None:
+            continue
+        t0 = time.perf_counter()
+        diffs = repricer.update(*tick)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        if not diffs:
+            print(f"{tick[0]} 不在任何阶段原料池中，忽略", file=sys.stderr)
+        for diff in diffs:
+            if unchanged(diff):
+                continue
+            if as_json:
+                print(json.dumps(dict(diff, 原料=tick[0], 价格=tick[1], 耗时ms=elapsed_ms),
+                                 ensure_ascii=False), file=out)
+            else:
+                print(format_diff(diff, elapsed_ms), file=out)
+        out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按实时行情增量重算阶段配方')
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument('--file', help='跟踪该文件新增的行情')
+    src.add_argument('--port', type=int, help='监听 127.0.0.1 的端口')
+    parser.add_argument('--from-start', action='store_true', help='--file 时从文件开头读取')
+    parser.add_argument('--json', action='store_true', help='以 JSON 行输出差异')
+    args = parser.parse_args()
+
+    import 配方
+    repricer = Repricer(配方.build_stage_models())
+    print(f"已加载 {len(repricer.models)} 个阶段，等待行情……", file=sys.stderr)
+
+    if args.file:
+        lines = iter_file(args.file, from_start=args.from_start)
+    elif args.port:
+        lines = iter_socket(args.port)
+    else:
+        lines = iter_stdin()
+    try:
+        run(lines, repricer, as_json=args.json)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+成本—营养权衡的帕累托前沿（ε-约束法）。
+
+对某个阶段的一项营养，把它的下限（side='lower'，“多 1% CP 要多花多少”）、
+上限（side='upper'，“少 5 个点淀粉要多花多少”）或上下限相同的目标值（side='target'）
+在可行范围内扫描，每个点求一次最低成本配方。
+
+跳过无信息的点：LP 右端项变化时，只要两个端点的最优基相同，区间内最优基都不变，
+成本随界限线性变化、配方也线性插值，中间的点无需求解。扫描按二分进行，
+只在最优基发生变化的区间继续细分，求解次数通常远少于网格点数。
+装有 highspy 时同一阶段的全部求解共用一个 HiGHS 实例，只改行界限后从上一个基热启动；
+不同阶段在进程池中并行。
+
+用法：
+    python 帕累托前沿.py --nutrient CP --side lower -n 50
+    python 帕累托前沿.py --stage 泌乳早期 --nutrient CP --second Starch --second-side upper -o 前沿.xlsx
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import 求解器
+from 求解器 import StageModel
+
+SIDES = ('lower', 'upper', 'target')
+SIDE_NAMES = {'lower': '≥', 'upper': '≤', 'target': '='}
+# 判断约束是否取等、原料是否入选的容差
+ACTIVE_TOL = 1e-9
+
+
+class _RowSweep:
+    """在同一个模型上反复修改一行的界限并求解，返回 (状态, 成本, 配比, 基签名)"""
+
+    def __init__(self, model, row):
+        self.model = model
+        self.row = row
+        self.rl, self.ru = model.row_lower.copy(), model.row_upper.copy()
+
+    def bounds_for(self, side, value):
+        lo, hi = self.rl[self.row], self.ru[self.row]
+        if side == 'lower':
+            return value, hi
+        if side == 'upper':
+            return lo, value
+        return value, value
+
+    def solve(self, lo, hi, c):
+        m = self.model
+        if 求解器.highspy is not None:
+            h = m._highs or m._build_highs()
+            h.changeRowBounds(self.row, lo, hi)
+            status, fun, x = m._solve_highs(c)
+            if status != 0:
+                return status, fun, x, None
+            basis = h.getBasis()
+            sig = (tuple(int(s) for s in basis.col_status), tuple(int(s) for s in basis.row_status))
+            return status, fun, x, sig
+        rl, ru = self.rl.copy(), self.ru.copy()
+        rl[self.row], ru[self.row] = lo, hi
+        tmp = StageModel(m.stage, m.ingredients, m.A, rl, ru, m.lower, m.upper)
+        status, fun, x = tmp._solve_linprog(c)
+        if status != 0:
+            return status, fun, x, None
+        # 没有基信息时以“入选原料 + 取等约束”近似最优基（非退化时两者一一对应）
+        ax = m.A @ x
+        sig = (tuple(np.flatnonzero((x > m.lower + ACTIVE_TOL) & (x < m.upper - ACTIVE_TOL))),
+               tuple(np.flatnonzero(np.abs(ax - rl) < ACTIVE_TOL)),
+               tuple(np.flatnonzero(np.abs(ax - ru) < ACTIVE_TOL)))
+        return status, fun, x, sig
+
+    def restore(self):
+        if 求解器.highspy is not None and self.model._highs is not None:
+            self.model._highs.changeRowBounds(self.row, self.rl[self.row], self.ru[self.row])
+
+
+def default_side(model, nutrient):
+    r = model.row_labels.index(nutrient)
+    return 'target' if model.row_lower[r] == model.row_upper[r] else 'lower'
+
+
+def feasible_range(model, nutrient, side):
+    """放开被扫描的一侧界限后，该营养在其余约束下可取到的 [最小值, 最大值]"""
+    r = model.row_labels.index(nutrient)
+    sweep = _RowSweep(model, r)
+    lo, hi = sweep.rl[r], sweep.ru[r]
+    lo, hi = {'lower': (-np.inf, hi), 'upper': (lo, np.inf), 'target': (-np.inf, np.inf)}[side]
+    a = model.A.getrow(r).toarray().ravel()
+    try:
+        s1, vmin, _, _ = sweep.solve(lo, hi, a)
+        s2, vmax, _, _ = sweep.solve(lo, hi, -a)
+    finally:
+        sweep.restore()
+    if s1 != 0 or s2 != 0:
+        return None
+    return vmin, -vmax
+
+
+def frontier(model, nutrient, side=None, n=50, c=None, values=None):
+    """
+    单项营养的前沿。values 缺省为可行范围内 n 个等距点。
+    返回 (前沿表, 网格点数)；前沿表只含实际求解的点，列为
+    阶段、营养、方向、界限、成本、边际成本、新基、各原料配比（%）。
+    """
+    c = model.c if c is None else np.asarray(c, dtype=float)
+    side = side or default_side(model, nutrient)
+    if values is None:
+        rng = feasible_range(model, nutrient, side)
+        if rng is None:
+            return pd.DataFrame(), 0
+        values = np.linspace(rng[0], rng[1], n)
+    values = np.asarray(values, dtype=float)
+    r = model.row_labels.index(nutrient)
+    sweep = _RowSweep(model, r)
+    solved = {}
+
+    def point(i):
+        if i not in solved:
+            solved[i] = sweep.solve(*sweep.bounds_for(side, values[i]), c)
+        return solved[i]
+
+    try:
+        # 二分：端点基相同（且都有解）的区间不再细分
+        stack = [(0, len(values) - 1)]
+        while stack:
+            i, j = stack.pop()
+            a, b = point(i), point(j)
+            if j - i <= 1 or (a[0] == 0 and b[0] == 0 and a[3] == b[3]):
+                continue
+            m = (i + j) // 2
+            stack += [(i, m), (m, j)]
+    finally:
+        sweep.restore()
+
+    rows, prev = [], None
+    for i in sorted(solved):
+        status, fun, x, sig = solved[i]
+        if status != 0:
+            continue
+        row = {'阶段': model.stage, '营养': nutrient, '方向': SIDE_NAMES[side],
+               '界限': values[i], '成本': fun, '新基': sig != prev}
+        row.update({ing: pct * 100 for ing, pct in zip(model.ingredients, x)})
+        rows.append(row)
+        prev = sig
+    df = pd.DataFrame(rows)
+    if len(df) > 1:
+        # 与下一个求解点之间的成本斜率（元/kg DM 每单位营养）
+        df.insert(5, '边际成本', (df['成本'].diff() / df['界限'].diff()).shift(-1))
+    return df, len(values)
+
+
+def frontier_2d(model, first, second, n=20, c=None):
+    """
+    两项营养的前沿面：first、second 为 (营养, side)。
+    对第一项的每个网格值固定其界限，再对第二项做一维前沿扫描。
+    """
+    (nut1, side1), (nut2, side2) = first, second
+    side1 = side1 or default_side(model, nut1)
+    rng = feasible_range(model, nut1, side1)
+    if rng is None:
+        return pd.DataFrame(), 0
+    r1 = model.row_labels.index(nut1)
+    outer = _RowSweep(model, r1)
+    frames, grid = [], 0
+    try:
+        for v in np.linspace(rng[0], rng[1], n):
+            lo, hi = outer.bounds_for(side1, v)
+            model.row_lower[r1], model.row_upper[r1] = lo, hi
+            if 求解器.highspy is not None and model._highs is not None:
+                model._highs.changeRowBounds(r1, lo, hi)
+            df, g = frontier(model, nut2, side2, n, c)
+            grid += g
+            if len(df):
+                df.insert(3, f'{nut1}界限', v)
+                frames.append(df)
+    finally:
+        model.row_lower[r1], model.row_upper[r1] = outer.rl[r1], outer.ru[r1]
+        model._linprog_form = None
+        outer.restore()
+    return (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()), grid
+
+
+def _stage_task(args):
+    """进程池任务：(模型, 第一项, 第二项或 None, n) → (阶段, 前沿表, 网格点数)"""
+    model, first, second, n = args
+    if first[0] not in model.row_labels or (second and second[0] not in model.row_labels):
+        return model.stage, pd.DataFrame(), 0
+    if second:
+        df, grid = frontier_2d(model, first, second, n)
+    else:
+        df, grid = frontier(model, first[0], first[1], n)
+    return model.stage, df, grid
+
+
+def run(stage_models, first, second=None, n=50, max_workers=None):
+    """所有阶段并行扫描，返回 {阶段: (前沿表, 网格点数)}"""
+    tasks = [(m, first, second, n) for m in stage_models.values()]
+    if max_workers == 1 or len(tasks) == 1:
+        results = [_stage_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_stage_task, tasks))
+    return {stage: (df, grid) for stage, df, grid in results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='成本—营养帕累托前沿（ε-约束扫描）')
+    parser.add_argument('--stage', action='append', help='只扫描这些阶段（可重复）；缺省全部')
+    parser.add_argument('--nutrient', default='CP')
+    parser.add_argument('--side', choices=SIDES, help='缺省：上下限相同的营养用 target，否则 lower')
+    parser.add_argument('--second', help='第二项营养（二维前沿）')
+    parser.add_argument('--second-side', choices=SIDES)
+    parser.add_argument('-n', type=int, default=50, help='每项营养的网格点数')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行进程数')
+    parser.add_argument('-o', '--output', help='结果写入 Excel（每个阶段一页）')
+    args = parser.parse_args()
+
+    import time
+    import 配方
+    models = 配方.build_stage_models()
+    if args.stage:
+        models = {s: models[s] for s in args.stage}
+    first = (args.nutrient, args.side)
+    second = (args.second, args.second_side) if args.second else None
+
+    t0 = time.perf_counter()
+    results = run(models, first, second, args.n, args.jobs)
+    elapsed = time.perf_counter() - t0
+
+    pd.set_option('display.width', 200)
+    for stage, (df, grid) in results.items():
+        print(f"\n===== {stage} =====")
+        if df.empty:
+            print("无可行点（阶段不可行或没有该营养约束）")
+            continue
+        print(f"网格 {grid} 点，实际求解 {len(df)} 点，最优基 {int(df['新基'].sum())} 个")
+        cols = [c for c in df.columns[:7] if c not in ('阶段',)]
+        print(df.loc[df['新基'], cols].round(4).to_string(index=False))
+    print(f"\n总耗时 {elapsed:.2f} 秒")
+
+    if args.output:
+        with pd.ExcelWriter(args.output) as writer:
+            for stage, (df, _) in results.items():
+                if not df.empty:
+                    df.to_excel(writer, sheet_name=stage[:31], index=False)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
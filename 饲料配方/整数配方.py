@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+饲料厂混合整数配方：在阶段 LP 之上加入料仓数与投料精度限制。
+
+    max_ings   最多使用的原料种数（料仓数）
+    min_incl   原料一旦使用，最低配比（质量分数）
+    step       投料增量（质量分数，如 0.005 表示按 0.5% 递增），配比必须是 step 的整数倍
+    nut_tol    取整后营养界限的相对放宽量；ME 这类上下限相同的约束在取整后往往无法精确满足
+
+变量为 y（配比 = scale·y，给出 step 时 y 为整数）与 z（是否使用，0/1）：
+    scale·y_j ≤ u_j·z_j，scale·y_j ≥ max(min_incl, l_j)·z_j，Σz ≤ max_ings，l_j > 0 时 z_j = 1
+装有 highspy 时以 LP 最优解取整后的配方作为初始可行解热启动，并支持时间上限与相对间隙目标；
+否则退回 scipy.optimize.milp（不支持热启动）。
+
+用法：python 整数配方.py --max-ings 6 --step 0.005 --min-incl 0.01 --time 10 --gap 0.01
+"""
+import argparse
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, OptimizeResult, milp
+
+import 求解器
+from 求解器 import STATUS_MESSAGES
+
+# 提前停止的 HiGHS 模型状态（均记为 linprog 的状态码 1）
+LIMIT_MESSAGES = {
+    'kTimeLimit': '达到时间上限',
+    'kIterationLimit': '达到迭代上限',
+    'kSolutionLimit': '达到解个数上限',
+    'kMemoryLimit': '达到内存上限',
+    'kInterrupt': '求解被中断',
+}
+
+
+def _mip_status(model_status, has_sol):
+    """把 HiGHS 的 MIP 模型状态映射为 (linprog 状态码, 说明)"""
+    S = 求解器.highspy.HighsModelStatus
+    if model_status == S.kOptimal:
+        return 0, STATUS_MESSAGES[0]
+    for name, text in LIMIT_MESSAGES.items():
+        if model_status == getattr(S, name, None):
+            return 1, text + ('，返回当前最好的整数解' if has_sol else '，未找到整数可行解')
+    status = 求解器._highs_status(model_status)
+    return status, STATUS_MESSAGES.get(status, STATUS_MESSAGES[4])
+
+
+def _build(model, max_ings, min_incl, step, nut_tol):
+    """构造 MILP 的 (c 系数缩放, A, row_lower, row_upper, lb, ub, integrality)"""
+    k = model.n
+    scale = step or 1.0
+    A = model.A.tocsr() * scale
+    rl, ru = model.row_lower.copy(), model.row_upper.copy()
+    # 第 0 行总配比保持为 1，只放宽营养行
+    rl[1:] = np.where(np.isfinite(rl[1:]), rl[1:] - nut_tol * np.abs(rl[1:]), rl[1:])
+    ru[1:] = np.where(np.isfinite(ru[1:]), ru[1:] + nut_tol * np.abs(ru[1:]), ru[1:])
+
+    I = sparse.identity(k, format='csr')
+    lo = np.maximum(min_incl, model.lower)
+    rows = [
+        sparse.hstack([A, sparse.csr_matrix((A.shape[0], k))]),
+        sparse.hstack([I * scale, -sparse.diags(model.upper)]),     # scale·y - u·z ≤ 0
+        sparse.hstack([I * scale, -sparse.diags(lo)]),              # scale·y - lo·z ≥ 0
+    ]
+    row_lower = [rl, np.full(k, -np.inf), np.zeros(k)]
+    row_upper = [ru, np.zeros(k), np.full(k, np.inf)]
+    if max_ings is not None:
+        rows.append(sparse.hstack([sparse.csr_matrix((1, k)), np.ones((1, k))]))
+        row_lower.append([-np.inf])
+        row_upper.append([float(max_ings)])
+
+    ymax = np.floor(model.upper / scale + 1e-9) if step else model.upper
+    lb = np.r_[np.zeros(k), (model.lower > 0).astype(float)]
+    ub = np.r_[ymax, np.ones(k)]
+    integrality = np.r_[np.full(k, 1 if step else 0), np.ones(k)].astype(int)
+    return (scale, sparse.vstack(rows).tocsc(), np.concatenate(row_lower),
+            np.concatenate(row_upper), lb, ub, integrality)
+
+
+def _initial_solution(x_lp, model, max_ings, step):
+    """把 LP 最优解截断到 max_ings 种原料并按 step 取整，作为 MILP 的初始解"""
+    x = np.where(np.isfinite(x_lp), x_lp, 0.0).copy()
+    if max_ings is not None and np.count_nonzero(x > 1e-9) > max_ings:
+        keep = np.argsort(-x)[:max_ings]
+        mask = np.zeros_like(x, dtype=bool)
+        mask[keep] = True
+        x[~mask] = 0.0
+    x = x / x.sum()
+    scale = step or 1.0
+    y = np.round(x / scale) if step else x
+    if step:
+        # 把取整误差补到配比最大的原料上，保证 Σx = 1
+        y[np.argmax(y)] += round(1.0 / scale) - y.sum()
+    z = (y > 0).astype(float)
+    return np.r_[y, z]
+
+
+def solve_mill(model, c=None, max_ings=None, min_incl=0.0, step=None, nut_tol=0.0,
+               time_limit=None, mip_gap=None, warm_start=True):
+    """
+    求解单个阶段的整数配方，返回 OptimizeResult：
+    x（配比）、fun、success、status、message、mip_gap、n_used、lp_cost（连续 LP 的成本；nut_tol > 0 时不再是下界）。
+    """
+    if step is not None and not (0 < step <= 1 and np.isclose(round(1 / step) * step, 1.0)):
+        raise ValueError(f"投料增量须能整除 1（如 0.005、0.01），实际为 {step}")
+    c = model.c if c is None else np.asarray(c, dtype=float)
+    k = model.n
+    lp = model.solve(c)
+    scale, A, row_lower, row_upper, lb, ub, integrality = _build(
+        model, max_ings, min_incl, step, nut_tol)
+    cost = np.r_[c * scale, np.zeros(k)]
+
+    if 求解器.highspy is not None:
+        highspy = 求解器.highspy
+        h = highspy.Highs()
+        h.silent()
+        hlp = highspy.HighsLp()
+        hlp.num_col_, hlp.num_row_ = 2 * k, A.shape[0]
+        hlp.col_cost_, hlp.col_lower_, hlp.col_upper_ = cost, lb, ub
+        hlp.row_lower_, hlp.row_upper_ = row_lower, row_upper
+        hlp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        hlp.a_matrix_.start_ = A.indptr.astype(np.int32)
+        hlp.a_matrix_.index_ = A.indices.astype(np.int32)
+        hlp.a_matrix_.value_ = A.data
+        hlp.integrality_ = [highspy.HighsVarType.kInteger if t else highspy.HighsVarType.kContinuous
+                            for t in integrality]
+        h.passModel(hlp)
+        if time_limit is not None:
+            h.setOptionValue('time_limit', float(time_limit))
+        if mip_gap is not None:
+            h.setOptionValue('mip_rel_gap', float(mip_gap))
+        if warm_start and lp.success:
+            sol = highspy.HighsSolution()
+            sol.col_value = list(_initial_solution(lp.x, model, max_ings, step))
+            sol.value_valid = True
+            h.setSolution(sol)
+        h.run()
+        info = h.getInfo()
+        status, message = _mip_status(h.getModelStatus(),
+                                      info.primal_solution_status == 2)  # kSolutionStatusFeasible
+        # 只有最优或提前停止时的整数解可用；不可行/无界/出错时即使有值也丢弃
+        has_sol = status in (0, 1) and info.primal_solution_status == 2
+        v = np.array(h.getSolution().col_value) if has_sol else None
+        fun = info.objective_function_value if has_sol else np.nan
+        gap = info.mip_gap if has_sol else np.nan
+    else:
+        options = {}
+        if time_limit is not None:
+            options['time_limit'] = float(time_limit)
+        if mip_gap is not None:
+            options['mip_rel_gap'] = float(mip_gap)
+        res = milp(cost, constraints=LinearConstraint(A, row_lower, row_upper),
+                   integrality=integrality, bounds=Bounds(lb, ub), options=options)
+        has_sol = res.x is not None
+        status = res.status
+        message = ('达到时间或迭代上限' + ('，返回当前最好的整数解' if has_sol else '，未找到整数可行解')
+                   if status == 1 else STATUS_MESSAGES.get(status, STATUS_MESSAGES[4]))
+        v, fun = (res.x, res.fun) if has_sol else (None, np.nan)
+        gap = getattr(res, 'mip_gap', np.nan) if has_sol else np.nan
+
+    x = v[:k] * scale if v is not None else np.full(k, np.nan)
+    return OptimizeResult(x=x, fun=fun, status=status, success=v is not None,
+                          message=message, mip_gap=gap,
+                          n_used=int(np.count_nonzero(x > 1e-9)) if v is not None else 0,
+                          lp_cost=lp.fun if lp.success else np.nan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='饲料厂整数配方（料仓数、最低添加量、投料增量）')
+    parser.add_argument('--max-ings', type=int, default=None, help='最多使用的原料种数')
+    parser.add_argument('--min-incl', type=float, default=0.0, help='使用时的最低配比（质量分数）')
+    parser.add_argument('--step', type=float, default=None, help='投料增量（质量分数）')
+    parser.add_argument('--nut-tol', type=float, default=0.01, help='营养界限的相对放宽量')
+    parser.add_argument('--time', type=float, default=10.0, help='每个阶段的时间上限（秒）')
+    parser.add_argument('--gap', type=float, default=0.01, help='相对间隙目标')
+    args = parser.parse_args()
+
+    import 配方
+    for stage, model in 配方.build_stage_models().items():
+        print(f"\n===== {stage} 整数配方 =====")
+        res = solve_mill(model, max_ings=args.max_ings, min_incl=args.min_incl, step=args.step,
+                         nut_tol=args.nut_tol, time_limit=args.time, mip_gap=args.gap)
+        if not res.success:
+            print("优化失败:", res.message)
+            continue
+        print(f"成本 {res.fun:.4f} 元/kg DM（连续 LP {res.lp_cost:.4f}，间隙 {res.mip_gap:.2%}，"
+              f"{res.n_used} 种原料）")
+        for ing, pct in sorted(zip(model.ingredients, res.x), key=lambda x: -x[1]):
+            if pct > 1e-9:
+                print(f"  {ing:8s}: {pct * 100:6.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+阶段配方 LP 的编译与批量求解。
+
+compile_stage() 只构造一次某个阶段的约束系统；StageModel.solve_batch() 对
+N×k 的价格矩阵逐行求解。装有 highspy 时沿用同一个 HiGHS 实例，每次只改目标系数，
+从上一次的最优基热启动；否则退回 scipy 的 linprog 逐次冷启动。
+
+约束形式：
+    row_lower ≤ A x ≤ row_upper   第 0 行为总配比 = 1，其余每个营养一行（上下限合为一行）
+    lower ≤ x ≤ upper             单原料最大/最小配比直接作为变量界限
+A 为 scipy.sparse 矩阵，营养数据通过 NutrientTable（原料→列号 + 稀疏营养矩阵）按列切片取得，
+原料目录增长到上千种时建模的时间与内存基本线性。
+"""
+from collections import namedtuple
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+import scipy
+from scipy import sparse
+from scipy.optimize import OptimizeResult, linprog
+
+try:
+    import highspy
+except ImportError:  # 没有 highspy 时退回 linprog
+    highspy = None
+
+# 实际使用的求解器及版本，求解缓存以此区分不同求解器给出的结果
+SOLVER_VERSION = (f"highspy {metadata.version('highspy')}" if highspy is not None
+                  else f"scipy {scipy.__version__}")
+
+# 与 linprog 一致的状态码：0 最优，2 不可行，3 无界，4 其它
+STATUS_MESSAGES = {
+    0: 'Optimization terminated successfully.',
+    2: 'The problem is infeasible.',
+    3: 'The problem is unbounded.',
+    4: 'Numerical difficulties encountered.',
+}
+
+# 批量求解结果：cost (N,)、x (N, k)、status (N,)；失败行的 cost/x 为 nan
+BatchResult = namedtuple('BatchResult', ['cost', 'x', 'status'])
+
+# 灵敏度报告：result 为 OptimizeResult，constraints/ranging 为 DataFrame
+Sensitivity = namedtuple('Sensitivity', ['result', 'constraints', 'ranging'])
+
+# 营养表：index 为 原料→列号，matrix 为 营养×原料 的 csc 矩阵，nut_idx 为 营养→行号
+NutrientTable = namedtuple('NutrientTable', ['index', 'matrix', 'nut_idx'])
+
+
+def nutrient_table(nutr_val, nut_idx):
+    """把 {原料: [营养值…]} 字典转为 NutrientTable，只保存非零项"""
+    names = list(nutr_val.keys())
+    dense = np.array([nutr_val[n] for n in names], dtype=float).reshape(len(names), -1)
+    return NutrientTable({n: i for i, n in enumerate(names)},
+                         sparse.csc_matrix(dense.T), dict(nut_idx))
+
+
+def _highs_status(model_status):
+    """把 HighsModelStatus 映射为 linprog 的状态码"""
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        return 0
+    if model_status == highspy.HighsModelStatus.kInfeasible:
+        return 2
+    if model_status in (highspy.HighsModelStatus.kUnbounded,
+                        highspy.HighsModelStatus.kUnboundedOrInfeasible):
+        return 3
+    return 4
+
+
+class StageModel:
+    """
+    单个阶段编译好的 LP：min c·x，s.t. row_lower ≤ A x ≤ row_upper，lower ≤ x ≤ upper。
+    约束只构造一次，价格向量 c 可以反复替换。
+    """
+
+    def __init__(self, stage, ingredients, A, row_lower, row_upper, lower, upper,
+                 c=None, row_labels=None, max_limits=None, min_limits=None):
+        self.stage = stage
+        self.ingredients = list(ingredients)
+        self.index = {ing: j for j, ing in enumerate(self.ingredients)}
+        self.A = sparse.csr_matrix(A, dtype=float)
+        self.row_lower = np.asarray(row_lower, dtype=float)
+        self.row_upper = np.asarray(row_upper, dtype=float)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.c = None if c is None else np.asarray(c, dtype=float)
+        # A 每行的名称：第 0 行为“总配比”，其余为营养名
+        self.row_labels = list(row_labels) if row_labels is not None else [
+            str(r) for r in range(self.A.shape[0])]
+        # 来自 max/min_ingredient_pct 的变量界限 {原料: 界限}
+        self.max_limits = dict(max_limits or {})
+        self.min_limits = dict(min_limits or {})
+        self._highs = None
+        self._linprog_form = None
+
+    @property
+    def n(self):
+        return len(self.ingredients)
+
+    def price_vector(self, price_dict):
+        """按本阶段原料顺序从价格字典取出 c"""
+        return np.array([price_dict[i] for i in self.ingredients], dtype=float)
+
+    # —— HiGHS 实例：首次求解时构造，之后只改目标系数 ——
+    def _build_highs(self):
+        A = self.A.tocsc()
+        lp = highspy.HighsLp()
+        lp.num_col_ = self.n
+        lp.num_row_ = A.shape[0]
+        lp.col_cost_ = np.zeros(self.n) if self.c is None else self.c
+        lp.col_lower_ = self.lower
+        lp.col_upper_ = self.upper
+        lp.row_lower_ = self.row_lower
+        lp.row_upper_ = self.row_upper
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = A.indptr.astype(np.int32)
+        lp.a_matrix_.index_ = A.indices.astype(np.int32)
+        lp.a_matrix_.value_ = A.data
+        h = highspy.Highs()
+        h.silent()
+        h.passModel(lp)
+        self._highs = h
+        self._cols = np.arange(self.n, dtype=np.int32)
+        return h
+
+    def _solve_highs(self, c):
+        h = self._highs or self._build_highs()
+        h.changeColsCost(self.n, self._cols, c)
+        h.run()
+        status = _highs_status(h.getModelStatus())
+        if status != 0:
+            return status, np.nan, np.full(self.n, np.nan)
+        x = np.array(h.getSolution().col_value)
+        return 0, h.getInfo().objective_function_value, x
+
+    def linprog_form(self):
+        """把区间行拆成 linprog 需要的 (A_ub, b_ub, A_eq, b_eq)，结果缓存"""
+        if self._linprog_form is None:
+            eq = self.row_lower == self.row_upper
+            hi = ~eq & np.isfinite(self.row_upper)
+            lo = ~eq & np.isfinite(self.row_lower)
+            A_ub = sparse.vstack([self.A[hi], -self.A[lo]]).tocsr()
+            b_ub = np.concatenate([self.row_upper[hi], -self.row_lower[lo]])
+            self._linprog_form = (A_ub, b_ub, self.A[eq], self.row_lower[eq])
+        return self._linprog_form
+
+    def _solve_linprog(self, c):
+        A_ub, b_ub, A_eq, b_eq = self.linprog_form()
+        res = linprog(c, A_eq=A_eq, b_eq=b_eq,
+                      A_ub=A_ub if len(b_ub) else None,
+                      b_ub=b_ub if len(b_ub) else None,
+                      bounds=np.column_stack([self.lower, self.upper]), method='highs')
+        if not res.success:
+            return res.status, np.nan, np.full(self.n, np.nan)
+        return 0, res.fun, res.x
+
+    def _solve_one(self, c):
+        if highspy is not None:
+            return self._solve_highs(c)
+        return self._solve_linprog(c)
+
+    def solve(self, c=None):
+        """
+        单次求解，返回与 linprog 相同字段的 OptimizeResult（x, fun, success, status, message）
+        """
+        c = self.c if c is None else np.asarray(c, dtype=float)
+        if not np.all(np.isfinite(c)):
+            raise ValueError(f"{self.stage}: 价格向量含 NaN 或无穷大")
+        status, fun, x = self._solve_one(c)
+        return OptimizeResult(x=x, fun=fun, status=status, success=status == 0,
+                              message=STATUS_MESSAGES.get(status, STATUS_MESSAGES[4]))
+
+    def solve_batch(self, C):
+        """
+        对 N×k 价格矩阵逐行求解（每行一个价格情景），返回 BatchResult。
+        相邻情景的最优基通常相同或相近，热启动后多数情景只需少量迭代。
+        """
+        C = np.atleast_2d(np.asarray(C, dtype=float))
+        if C.shape[1] != self.n:
+            raise ValueError(f"{self.stage}: 价格矩阵应为 N×{self.n}，实际为 {C.shape}")
+        if not np.all(np.isfinite(C)):
+            bad = np.flatnonzero(~np.isfinite(C).all(axis=1))
+            raise ValueError(f"{self.stage}: 价格矩阵第 {bad.tolist()} 行含 NaN 或无穷大")
+        N = C.shape[0]
+        cost = np.full(N, np.nan)
+        x = np.full((N, self.n), np.nan)
+        status = np.zeros(N, dtype=int)
+        for r in range(N):
+            status[r], cost[r], x[r] = self._solve_one(C[r])
+        return BatchResult(cost, x, status)
+
+    def sensitivity(self, c=None):
+        """
+        一次求解同时给出对偶价格与成本敏感性，不必为每个价格变动重新求解。
+
+        constraints: 每条营养/配比约束的当前值、界限、是否紧约束及影子价格
+                     （该界限提高一个单位时成本的变化，元/kg DM）
+        ranging:     每种原料价格在当前最优基保持不变时的允许区间，
+                     即“豆粕涨到多少之前配方结构不变”。需要 highspy。
+        """
+        if highspy is None:
+            raise ImportError("成本敏感性分析需要 highspy：pip install highspy")
+        c = self.c if c is None else np.asarray(c, dtype=float)
+        res = self.solve(c)
+        if not res.success:
+            return Sensitivity(res, None, None)
+
+        h = self._highs
+        sol = h.getSolution()
+        row_dual = np.array(sol.row_dual)
+        col_dual = np.array(sol.col_dual)[:self.n]
+        activity = self.A @ res.x
+        rows = []
+
+        def add(kind, name, side, value, bound, dual):
+            active = bool(np.isclose(value, bound, atol=1e-7))
+            # 最小化问题中，紧的下限对偶值 ≥ 0，紧的上限对偶值 ≤ 0
+            shadow = (max(dual, 0.0) if side == '下限' else min(dual, 0.0)) if active else 0.0
+            rows.append({'约束类型': kind, '名称': name, '方向': side, '当前值': value,
+                         '界限': bound, '紧约束': active, '影子价格': shadow})
+
+        # 第 0 行为总配比等式，不列入报告
+        for r in range(1, self.A.shape[0]):
+            name = self.row_labels[r]
+            if np.isfinite(self.row_upper[r]):
+                add('营养', name, '上限', activity[r], self.row_upper[r], row_dual[r])
+            if np.isfinite(self.row_lower[r]):
+                add('营养', name, '下限', activity[r], self.row_lower[r], row_dual[r])
+        for ing, mx in self.max_limits.items():
+            j = self.index[ing]
+            add('最大配比', ing, '上限', res.x[j], mx, col_dual[j])
+        for ing, mn in self.min_limits.items():
+            j = self.index[ing]
+            add('最小配比', ing, '下限', res.x[j], mn, col_dual[j])
+        constraints = pd.DataFrame(rows)
+
+        _, rng = h.getRanging()
+        up = np.array(rng.col_cost_up.value_)[:self.n]
+        dn = np.array(rng.col_cost_dn.value_)[:self.n]
+        ranging = pd.DataFrame({
+            '原料': self.ingredients,
+            '配比': res.x,
+            '价格': c,
+            '价格下限': dn,
+            '价格上限': up,
+            '可上涨': up - c,
+            '可下降': c - dn,
+            '检验数': col_dual,
+        })
+        return Sensitivity(res, constraints, ranging)
+
+    def __getstate__(self):
+        # HiGHS 实例不能序列化，进程间传递时丢弃，用时重建
+        state = self.__dict__.copy()
+        state['_highs'] = None
+        return state
+
+
+def compile_stage(stage, stage_ings, req, nutr_val, nut_idx=None,
+                  max_pct=None, min_pct=None, price_dict=None):
+    """
+    构造单个阶段的约束系统：总配比为 1，营养上下限，单原料最大/最小配比。
+
+    nutr_val 可以是 {原料: [营养值…]} 字典，也可以是预先构造好的 NutrientTable
+    （大目录下应复用同一个 NutrientTable，避免每个阶段重复转换）。
+    max_pct/min_pct 中不在原料池里的原料与原脚本一样忽略。
+    """
+    if isinstance(nutr_val, NutrientTable):
+        table = nutr_val
+    else:
+        table = nutrient_table({i: nutr_val[i] for i in stage_ings}, nut_idx)
+    nut_idx = table.nut_idx if nut_idx is None else nut_idx
+
+    cols = [table.index[i] for i in stage_ings]
+    nuts = list(req.keys())
+    M = table.matrix[:, cols].tocsr()[[nut_idx[nut] for nut in nuts]]
+    A = sparse.vstack([sparse.csr_matrix(np.ones((1, len(stage_ings)))), M])
+
+    inf = np.inf
+    row_lower = [1.0] + [-inf if req[nut][0] is None else req[nut][0] for nut in nuts]
+    row_upper = [1.0] + [inf if req[nut][1] is None else req[nut][1] for nut in nuts]
+
+    pos = {ing: j for j, ing in enumerate(stage_ings)}
+    lower = np.zeros(len(stage_ings))
+    upper = np.ones(len(stage_ings))
+    max_limits = {ing: mx for ing, mx in (max_pct or {}).items() if ing in pos}
+    min_limits = {ing: mn for ing, mn in (min_pct or {}).items() if ing in pos}
+    for ing, mx in max_limits.items():
+        upper[pos[ing]] = min(upper[pos[ing]], mx)
+    for ing, mn in min_limits.items():
+        lower[pos[ing]] = max(lower[pos[ing]], mn)
+
+    c = None if price_dict is None else [price_dict[i] for i in stage_ings]
+    return StageModel(stage, stage_ings, A, row_lower, row_upper, lower, upper, c=c,
+                      row_labels=['总配比'] + nuts,
+                      max_limits=max_limits, min_limits=min_limits)
+
+
+def compile_stages(stages_req, stage_ingredients, nutr_val, nut_idx,
+                   max_ingredient_pct=None, min_ingredient_pct=None, price_dict=None):
+    """对 stages_req 中的每个阶段调用 compile_stage，返回 {阶段: StageModel}"""
+    max_ingredient_pct = max_ingredient_pct or {}
+    min_ingredient_pct = min_ingredient_pct or {}
+    if not isinstance(nutr_val, NutrientTable):
+        nutr_val = nutrient_table(nutr_val, nut_idx)
+    return {
+        stage: compile_stage(stage, stage_ingredients[stage], req, nutr_val, nut_idx,
+                             max_ingredient_pct.get(stage), min_ingredient_pct.get(stage),
+                             price_dict)
+        for stage, req in stages_req.items()
+    }
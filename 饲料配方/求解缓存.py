@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+配方求解缓存：相同的问题直接返回保存的结果。
+
+键为问题的规范哈希（sha256）：原料池及顺序、价格向量、约束矩阵与上下限（营养界限、
+最大/最小配比都在其中）、求解选项。两级缓存：
+    内存   OrderedDict 实现的 LRU，按条数淘汰
+    磁盘   每个结果一个 pickle 文件，总大小超过上限时按最近访问时间淘汰
+hits/misses 计数通过 stats() 查看。
+
+用法：
+    cache = SolveCache(directory='.cache/求解缓存')
+    res = cache.solve(model)          # 与 model.solve() 相同的 OptimizeResult
+    out = cache.cached(model, fn, 报告='灵敏度')   # 缓存 fn(c) 的任意可 pickle 结果
+    print(cache.stats())
+"""
+import copy
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, '.cache', '求解缓存')
+
+
+def _array_bytes(a):
+    # -0.0 与 0.0 视为相同
+    return (np.ascontiguousarray(a, dtype=float) + 0.0).tobytes()
+
+
+def problem_key(model, c, options=None):
+    """问题的规范哈希"""
+    h = hashlib.sha256()
+    h.update(json.dumps(model.ingredients, ensure_ascii=False).encode('utf-8'))
+    A = model.A.tocsr()
+    A.sort_indices()
+    for part in (c, A.data, model.row_lower, model.row_upper, model.lower, model.upper):
+        h.update(_array_bytes(part))
+    h.update(np.ascontiguousarray(A.indices, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(A.indptr, dtype=np.int64).tobytes())
+    h.update(json.dumps(options or {}, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+class SolveCache:
+    """内存 LRU + 磁盘两级缓存；directory 为 None 时只用内存"""
+
+    def __init__(self, maxsize=1024, directory=CACHE_DIR, max_bytes=64 * 2 ** 20):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # —— 内存层 ——
+    def _remember(self, key, res):
+        self._memory[key] = res
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    # —— 磁盘层 ——
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                res = pickle.load(f)
+        except OSError:
+            return None
+        except Exception:
+            # 文件损坏，或类/模块改名后旧条目无法还原：删掉，按未命中重新计算
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # 记录最近访问时间，供淘汰使用
+        except OSError:      # 其它进程恰好淘汰了该文件
+            pass
+        return res
+
+    def _store(self, key, res):
+        if not self.directory:
+            return
+        tmp = self._path(key) + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(res, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    # —— 对外接口 ——
+    def get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits_memory += 1
+            return copy.deepcopy(self._memory[key])
+        res = self._load(key)
+        if res is not None:
+            self.hits_disk += 1
+            self._remember(key, res)
+            return copy.deepcopy(res)
+        self.misses += 1
+        return None
+
+    def put(self, key, res):
+        res = copy.deepcopy(res)
+        self._remember(key, res)
+        self._store(key, res)
+
+    def cached(self, model, compute, c=None, **options):
+        """
+        带缓存的 compute(c)，键为 model 在价格 c 下的问题哈希加 options。
+        options 只参与键的计算（如求解器版本），须能区分不同的 compute。
+        """
+        c = model.c if c is None else np.asarray(c, dtype=float)
+        key = problem_key(model, c, options)
+        res = self.get(key)
+        if res is None:
+            res = compute(c)
+            self.put(key, res)
+        return res
+
+    def solve(self, model, c=None, **options):
+        """带缓存的 model.solve(c)；options 只参与键的计算（如求解器版本、方法）"""
+        return self.cached(model, model.solve, c, **options)
+
+    def stats(self):
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        disk_files = disk_bytes = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    disk_files += 1
+                    disk_bytes += os.path.getsize(os.path.join(self.directory, name))
+        return {'内存命中': self.hits_memory, '磁盘命中': self.hits_disk, '未命中': self.misses,
+                '命中率': hits / total if total else 0.0,
+                '内存条数': len(self._memory), '磁盘条数': disk_files, '磁盘字节': disk_bytes}
+
+    def clear(self):
+        self._memory.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, name))
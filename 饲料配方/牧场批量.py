@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+牧场/栏舍级批量配方：读入栏舍定义表，把每个栏舍的 LP 分发到进程池求解。
+
+栏舍定义表（CSV 或 Excel），每行一个栏舍：
+    牧场, 栏舍, 阶段                 必填
+    原料                             可选，以“、”或“,”分隔；缺省用 stage_ingredients[阶段]
+    价格_<原料>                      可选，覆盖该栏舍的原料价格（元/kg）
+    <营养>_下限, <营养>_上限          可选，覆盖 stages_req[阶段] 中的营养界限
+
+原料价格向量与营养矩阵只在每个工作进程启动时通过 initializer 传递一次，
+任务本身只携带栏舍的少量字段；结果按完成顺序流式返回。
+
+用法：python 牧场批量.py 栏舍.csv -o 结果.csv -j 8
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from 求解器 import compile_stage, nutrient_table
+
+PRICE_PREFIX = '价格_'
+BOUND_SUFFIX = {'_下限': 0, '_上限': 1}
+
+# 工作进程内的共享数据，由 _init_worker 设置
+_shared = {}
+
+
+def build_catalog(price_dict, nutr_val, nut_idx):
+    """
+    把价格字典与营养字典对齐：names、index（原料→列号）、prices (n,)、table（稀疏营养表）。
+    没有营养数据的原料不进入目录；没有价格的原料价格记为 nan。
+    """
+    table = nutrient_table(nutr_val, nut_idx)
+    names = list(table.index)
+    return {
+        'names': names,
+        'index': table.index,
+        'prices': np.array([price_dict.get(n, np.nan) for n in names], dtype=float),
+        'table': table,
+    }
+
+
+def _init_worker(catalog, defaults):
+    _shared['catalog'] = catalog
+    _shared['defaults'] = defaults
+
+
+def _split_ings(value):
+    return [s.strip() for s in str(value).replace(',', '、').split('、') if s.strip()]
+
+
+def parse_pen(row):
+    """把栏舍表的一行整理成任务字典（只含该栏舍自己的覆盖项）"""
+    pen = {'牧场': row['牧场'], '栏舍': row['栏舍'], '阶段': row['阶段'],
+           'ingredients': None, 'prices': {}, 'bounds': {}}
+    for key, value in row.items():
+        if key in ('牧场', '栏舍', '阶段') or pd.isna(value):
+            continue
+        if key == '原料':
+            pen['ingredients'] = _split_ings(value)
+        elif key.startswith(PRICE_PREFIX):
+            pen['prices'][key[len(PRICE_PREFIX):]] = float(value)
+        else:
+            for suffix, side in BOUND_SUFFIX.items():
+                if key.endswith(suffix):
+                    pen['bounds'][(key[:-len(suffix)], side)] = float(value)
+    return pen
+
+
+def load_pens(path):
+    """读取栏舍定义表，返回任务字典列表"""
+    if str(path).lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path, encoding='utf-8')
+    missing = {'牧场', '栏舍', '阶段'} - set(df.columns)
+    if missing:
+        raise ValueError(f"栏舍定义表缺少列：{sorted(missing)}")
+    return [parse_pen(row) for row in df.to_dict('records')]
+
+
+def solve_pen(pen):
+    """在工作进程中求解单个栏舍，失败时把原因写进结果而不是抛出"""
+    catalog, defaults = _shared['catalog'], _shared['defaults']
+    stage = pen['阶段']
+    out = {'牧场': pen['牧场'], '栏舍': pen['栏舍'], '阶段': stage,
+           '成功': False, '成本': np.nan, '信息': '', '配方': {}}
+
+    ings = pen['ingredients'] or defaults['stage_ingredients'].get(stage)
+    if not ings:
+        out['信息'] = f"阶段 {stage} 没有原料池"
+        return out
+    unknown = [i for i in ings if i not in catalog['index']]
+    if unknown:
+        out['信息'] = f"缺少营养数据：{unknown}"
+        return out
+
+    req = dict(defaults['stages_req'].get(stage, {}))
+    for (nut, side), value in pen['bounds'].items():
+        low, high = req.get(nut, (None, None))
+        req[nut] = (value, high) if side == 0 else (low, value)
+    if not req:
+        out['信息'] = f"阶段 {stage} 没有营养需求"
+        return out
+    unknown = [n for n in req if n not in defaults['nut_idx']]
+    if unknown:
+        out['信息'] = f"未知营养指标：{unknown}"
+        return out
+
+    cols = [catalog['index'][i] for i in ings]
+    c = catalog['prices'][cols].copy()
+    for ing, price in pen['prices'].items():
+        if ing in ings:
+            c[ings.index(ing)] = price
+    if not np.isfinite(c).all():
+        out['信息'] = f"价格缺失或无效：{[i for i, p in zip(ings, c) if not np.isfinite(p)]}"
+        return out
+
+    model = compile_stage(stage, ings, req, catalog['table'], defaults['nut_idx'],
+                          defaults['max_ingredient_pct'].get(stage),
+                          defaults['min_ingredient_pct'].get(stage))
+    res = model.solve(c)
+    out['成功'] = bool(res.success)
+    out['信息'] = res.message
+    if res.success:
+        out['成本'] = res.fun
+        out['配方'] = {i: x for i, x in zip(ings, res.x) if x > 1e-9}
+    return out
+
+
+def iter_herd(pens, catalog, defaults, max_workers=None):
+    """并行求解全部栏舍，按完成顺序逐个产出结果字典"""
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(catalog, defaults)) as pool:
+        futures = [pool.submit(solve_pen, pen) for pen in pens]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+def results_frame(results):
+    """把结果字典列表整理为宽表：每个原料一列配比（%）"""
+    rows = []
+    for r in results:
+        row = {k: r[k] for k in ('牧场', '栏舍', '阶段', '成功', '成本', '信息')}
+        row.update({ing: pct * 100 for ing, pct in r['配方'].items()})
+        rows.append(row)
+    return pd.DataFrame(rows).sort_values(['牧场', '栏舍']).reset_index(drop=True)
+
+
+def default_inputs():
+    """从 配方.py 取默认价格、营养与阶段定义"""
+    import 配方
+    catalog = build_catalog(配方.price_dict, 配方.nutr_val, 配方.nut_idx)
+    defaults = {
+        'stage_ingredients': 配方.stage_ingredients,
+        'stages_req': 配方.stages_req,
+        'max_ingredient_pct': 配方.max_ingredient_pct,
+        'min_ingredient_pct': 配方.min_ingredient_pct,
+        'nut_idx': 配方.nut_idx,
+    }
+    return catalog, defaults
+
+
+def main():
+    parser = argparse.ArgumentParser(description='栏舍级批量配方优化')
+    parser.add_argument('pens', help='栏舍定义表（CSV/Excel）')
+    parser.add_argument('-o', '--output', default='栏舍配方结果.csv')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    pens = load_pens(args.pens)
+    catalog, defaults = default_inputs()
+    results = []
+    for r in iter_herd(pens, catalog, defaults, max_workers=args.jobs):
+        results.append(r)
+        cost = f"{r['成本']:.2f} 元/kg DM" if r['成功'] else f"优化失败: {r['信息']}"
+        print(f"[{len(results)}/{len(pens)}] {r['牧场']} {r['栏舍']} {r['阶段']}: {cost}")
+
+    results_frame(results).to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 import numpy as np
-from scipy.optimize import linprog
+
+import 求解器
+from 求解器 import compile_stages
+from 原料目录 import load_catalog
+from 求解缓存 import SolveCache
+from 配方评估 import evaluate, from_dict
+from 不可行诊断 import diagnose, print_diagnosis, validate_stages
 
 price_dict = {
     # 0–2月龄
@@ -56,7 +62,6 @@ price_dict = {
     # 其它补充
     '燕麦青干草':  3.00,
     '小麦':        2.45,
-    '玉米秸秆':    1.00,
     '木薯渣':      1.16,   # Converted from 163.99元/ton to元/kg
     '阴离子盐预混料':1.50,
     '苜蓿草':    1.50,
@@ -325,59 +330,7 @@ min_ingredient_pct = {
 }
 
 
-
-optimization_results = {}
-
-print("\n================ 饲料价格上涨情况下的优化配方 ================\n")
-for stage, req in stages_req.items():
-    print(f"\n===== {stage} 优化配方 =====")
-    stage_ings = stage_ingredients[stage]
-    idxs = [ingredients.index(i) for i in stage_ings]
-    c = np.array([price_dict[i] for i in stage_ings])
-    M = nut_mat[:, idxs]
-
-    A_eq = [np.ones(len(idxs))]
-    b_eq = [1.0]
-    A_ub, b_ub = [], []
-
-    for nut, (low, high) in req.items():
-        row = M[nut_idx[nut]]
-        if high is not None:
-            A_ub.append(row); b_ub.append(high)
-        if low is not None:
-            A_ub.append(-row); b_ub.append(-low)
-
-    for ing, mx in max_ingredient_pct.get(stage, {}).items():
-        if ing in stage_ings:
-            i = stage_ings.index(ing)
-            row = np.zeros(len(idxs)); row[i] = 1
-            A_ub.append(row); b_ub.append(mx)
-    for ing, mn in min_ingredient_pct.get(stage, {}).items():
-        if ing in stage_ings:
-            i = stage_ings.index(ing)
-            row = np.zeros(len(idxs)); row[i] = -1
-            A_ub.append(row); b_ub.append(-mn)
-
-    res = linprog(c, A_eq=np.array(A_eq), b_eq=np.array(b_eq),
-                  A_ub=np.array(A_ub), b_ub=np.array(b_ub),
-                  bounds=[(0,1)]*len(idxs), method='highs')
-
-    optimization_results[stage] = res
-    if res.success:
-        print(f"成本 {res.fun:.2f} 元/kg DM")
-        for ing, pct in sorted(zip(stage_ings, res.x), key=lambda x:-x[1]):
-            if pct>1e-3: print(f"  {ing:8s}: {pct*100:6.2f}%")
-        vals = M @ res.x
-        print("营养价值:", {nut: vals[nut_idx[nut]] for nut in nut_idx})
-    else:
-        print("优化失败:", res.message)
-
-# （后续可添加典型配方对比等）
-# —— 对比典型配方 ——
-
-print("\n\n================ 传统配方（价格上涨后）================\n")
-
-# 典型配方定义
+# —— 典型配方定义 ——
 typical_formulations = {
     # —— 生长阶段，保持不变 ——
     '0-2月龄':    {'压片玉米':50,'豆粕':25,'燕麦片':15,'苜蓿':8,'预混料':2},
@@ -399,37 +352,117 @@ typical_formulations = {
 }
 
 
-# 计算并打印典型配方成本与营养价值
-for stage, formulation in typical_formulations.items():
-    print(f"\n===== {stage} 典型配方 =====")
-    cost = sum(price_dict[ing] * (pct / 100) for ing, pct in formulation.items())
-    print(f"成本: {cost:.2f} 元/kg DM")
-    print("\n配方组成:")
-    for ing, pct in formulation.items():
-        print(f"  {ing:15s}: {pct:6.2f}%")
-    nutrition = {nut: 0 for nut in nut_idx}
-    for ing, pct in formulation.items():
-        for nut, idx in nut_idx.items():
-            nutrition[nut] += nutr_val[ing][idx] * (pct / 100)
-    print("\n营养价值:")
-    for nut, value in nutrition.items():
-        print(f"  {nut:10s}: {value:6.2f}")
-
-# —— 成本对比分析 ——
-
-print("\n\n================ 成本对比分析 ================\n")
-print("阶段\t\t优化配方成本\t典型配方成本\t节约百分比")
-print("-------------------------------------------------------------")
-
-for stage in stage_ingredients.keys():
-    res = optimization_results.get(stage)
-    if res and res.success:
-        optimized_cost = res.fun
-        typ = typical_formulations.get(stage, {})
-        typical_cost = sum(price_dict[ing] * (pct / 100) for ing, pct in typ.items())
-        saving_pct = (typical_cost - optimized_cost) / typical_cost * 100 if typical_cost else 0.0
-        print(f"{stage:10s}\t{optimized_cost:6.2f} 元/kg\t{typical_cost:6.2f} 元/kg\t{saving_pct:6.2f}%")
+def build_stage_models(catalog=None):
+    """
+    按当前价格与约束编译各阶段 LP，返回 {阶段: StageModel}。
+    catalog 为 原料目录.load_catalog() 的结果时，价格与营养取自目录。
+    """
+    if catalog is None:
+        return compile_stages(stages_req, stage_ingredients, nutr_val, nut_idx,
+                              max_ingredient_pct, min_ingredient_pct, price_dict)
+    return compile_stages(stages_req, stage_ingredients, catalog.nutrient_table(nut_idx),
+                          nut_idx, max_ingredient_pct, min_ingredient_pct,
+                          catalog.price_dict())
+
+
+def print_sensitivity(sens):
+    """打印紧约束的影子价格与入选原料的价格允许区间"""
+    tight = sens.constraints[sens.constraints['紧约束']]
+    print("紧约束影子价格:",
+          {f"{r.名称}{r.方向}": round(r.影子价格, 4) for r in tight.itertuples()})
+    print("价格允许区间（最优基不变）:")
+    for r in sens.ranging[sens.ranging['配比'] > 1e-3].itertuples():
+        print(f"  {r.原料:8s}: {r.价格:7.3f} 元/kg  [{r.价格下限:.3f}, {r.价格上限:.3f}]")
+
+
+def stage_report(model, c=None):
+    """
+    求解一个阶段并附上报告，返回 (结果, 报告)：成功时报告为灵敏度分析（需要 highspy，
+    否则为 None），失败时为不可行诊断。结果整体可放进求解缓存，命中时不必再求解。
+    """
+    if 求解器.highspy is not None:
+        sens = model.sensitivity(c)
+        res, report = sens.result, sens
     else:
-        print(f"{stage:10s}\t优化失败\t\t\t")
-
-print("\n\n================ 结束 ================\n")
+        res, report = model.solve(c), None
+    if not res.success:
+        report = diagnose(model, min_count=True)
+    return res, report
+
+
+def main():
+    optimization_results = {}
+    catalog = load_catalog(price_dict, nutr_val, nut_idx, stage_ingredients)
+    issues = validate_stages(stages_req, stage_ingredients, catalog.nutrient_table(nut_idx), nut_idx,
+                             max_ingredient_pct, min_ingredient_pct)
+    if issues:
+        print("阶段定义检查：")
+        for issue in issues:
+            print(" ", issue)
+    stage_models = build_stage_models(catalog)
+    # 价格与约束未变的阶段直接取上次的结果（连同灵敏度/诊断报告）
+    cache = SolveCache()
+
+    print("\n================ 饲料价格上涨情况下的优化配方 ================\n")
+    for stage, model in stage_models.items():
+        print(f"\n===== {stage} 优化配方 =====")
+        stage_ings = model.ingredients
+        idxs = [ingredients.index(i) for i in stage_ings]
+        M = nut_mat[:, idxs]
+
+        res, report = cache.cached(model, lambda c, model=model: stage_report(model, c),
+                                   报告='阶段', 诊断='最少放宽', solver=求解器.SOLVER_VERSION)
+
+        optimization_results[stage] = res
+        if res.success:
+            print(f"成本 {res.fun:.2f} 元/kg DM")
+            for ing, pct in sorted(zip(stage_ings, res.x), key=lambda x:-x[1]):
+                if pct>1e-3: print(f"  {ing:8s}: {pct*100:6.2f}%")
+            vals = M @ res.x
+            print("营养价值:", {nut: vals[nut_idx[nut]] for nut in nut_idx})
+            if report is not None:
+                print_sensitivity(report)
+        else:
+            print("优化失败:", res.message)
+            print_diagnosis(report)
+
+    # （后续可添加典型配方对比等）
+    # —— 对比典型配方 ——
+
+    print("\n\n================ 传统配方（价格上涨后）================\n")
+
+    # 典型配方的成本与营养价值一次批量计算
+    typical = evaluate(from_dict(typical_formulations), catalog.price_dict(),
+                       catalog.nutrient_table(nut_idx), stages_req).set_index('配方')
+    for stage, formulation in typical_formulations.items():
+        print(f"\n===== {stage} 典型配方 =====")
+        print(f"成本: {typical.at[stage, '成本']:.2f} 元/kg DM")
+        print("\n配方组成:")
+        for ing, pct in formulation.items():
+            print(f"  {ing:15s}: {pct:6.2f}%")
+        print("\n营养价值:")
+        for nut in nut_idx:
+            print(f"  {nut:10s}: {typical.at[stage, nut]:6.2f}")
+
+    # —— 成本对比分析 ——
+
+    print("\n\n================ 成本对比分析 ================\n")
+    print("阶段\t\t优化配方成本\t典型配方成本\t节约百分比")
+    print("-------------------------------------------------------------")
+
+    for stage in stage_ingredients.keys():
+        res = optimization_results.get(stage)
+        if res and res.success:
+            optimized_cost = res.fun
+            typical_cost = typical.at[stage, '成本'] if stage in typical.index else 0.0
+            saving_pct = (typical_cost - optimized_cost) / typical_cost * 100 if typical_cost else 0.0
+            print(f"{stage:10s}\t{optimized_cost:6.2f} 元/kg\t{typical_cost:6.2f} 元/kg\t{saving_pct:6.2f}%")
+        else:
+            print(f"{stage:10s}\t优化失败\t\t\t")
+
+    print("\n求解缓存:", cache.stats())
+    print("\n\n================ 结束 ================\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+批量评估配方：成本、营养值与阶段标准（stages_req）的符合情况。
+
+全部配方装进一个稀疏矩阵 X（配方 × 原料，质量分数），一次矩阵乘法得到：
+    成本 = X · 价格        营养 = X · 营养矩阵ᵀ
+再与各配方所属阶段的上下限逐项比较，输出每个配方一行的符合性表。
+原料名在计算前统一检查，不认识的名称或缺价格、缺营养数据的原料直接报错并列出全部问题。
+
+输入表（CSV 或 Excel）两种格式均可：
+    长表   配方,阶段,原料,配比          每行一种原料
+    宽表   配方,阶段,<原料1>,<原料2>…   每行一个配方
+配比为百分数；缺少“阶段”列时以配方名作为阶段名。
+
+用法：python 配方评估.py 牧场配方.xlsx -o 评估结果.xlsx
+      python 配方评估.py                # 评估 配方.py 中的典型配方
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# 营养值与界限比较时的相对容差
+TOL = 1e-6
+KEY_COLS = ('配方', '阶段')
+
+
+def from_dict(formulations):
+    """{配方: {原料: 配比%}} → 长表，阶段名即配方名（typical_formulations 的格式）"""
+    rows = [(name, name, ing, pct) for name, f in formulations.items() for ing, pct in f.items()]
+    return pd.DataFrame(rows, columns=['配方', '阶段', '原料', '配比'])
+
+
+def load_recipes(path):
+    """读取 CSV/Excel 配方表，统一转为长表"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path, encoding='utf-8')
+    df.columns = [str(c).strip() for c in df.columns]
+    if '配方' not in df:
+        raise ValueError(f"{path} 缺少“配方”列")
+    if '阶段' not in df:
+        df['阶段'] = df['配方']
+    if '原料' not in df:
+        df = df.melt(id_vars=list(KEY_COLS), var_name='原料', value_name='配比')
+    df = df.dropna(subset=['配比'])
+    df['原料'] = df['原料'].astype(str).str.strip()
+    df['配比'] = pd.to_numeric(df['配比'], errors='raise')
+    return df.loc[df['配比'] != 0, ['配方', '阶段', '原料', '配比']].reset_index(drop=True)
+
+
+def check_names(recipes, price_dict, table):
+    """检查原料名；有问题时抛出 ValueError，列出每个问题原料及用到它的配方"""
+    problems = []
+    for ing, used in recipes.groupby('原料')['配方']:
+        missing = []
+        if ing not in table.index:
+            missing.append('营养数据')
+        if ing not in price_dict:
+            missing.append('价格')
+        if missing:
+            where = '、'.join(map(str, used.unique()[:5])) + ('等' if used.nunique() > 5 else '')
+            problems.append(f"  {ing}: 缺少{'与'.join(missing)}（{where}）")
+    if problems:
+        raise ValueError("以下原料无法评估：\n" + "\n".join(problems))
+
+
+def pack(recipes, table):
+    """
+    长表 → (配方键表, 稀疏矩阵 X)，X 为 配方 × 目录原料 的质量分数；同一配方重复的原料累加。
+    阶段留空的配方自成一组（与 drop_duplicates 一致），评估时记为无阶段标准。
+    """
+    codes = recipes.groupby(list(KEY_COLS), sort=False, dropna=False).ngroup().to_numpy()
+    keys = recipes[list(KEY_COLS)].drop_duplicates()
+    cols = recipes['原料'].map(table.index).to_numpy(dtype=np.int64)
+    X = sparse.csr_matrix((recipes['配比'].to_numpy(dtype=float) / 100, (codes, cols)),
+                          shape=(len(keys), table.matrix.shape[1]))
+    X.sum_duplicates()
+    return keys.reset_index(drop=True), X
+
+
+def bound_matrices(stages, stages_req, nutrients):
+    """各配方所属阶段的营养上下限（配方 × 营养），没有该项标准的位置为 ∓inf"""
+    L = np.full((len(stages), len(nutrients)), -np.inf)
+    U = np.full((len(stages), len(nutrients)), np.inf)
+    has_req = np.zeros(len(stages), dtype=bool)
+    for stage, rows in pd.Series(np.arange(len(stages))).groupby(np.asarray(stages), dropna=False):
+        req = stages_req.get(stage)
+        if req is None:
+            continue
+        has_req[rows.to_numpy()] = True
+        for k, nut in enumerate(nutrients):
+            lo, hi = req.get(nut, (None, None))
+            if lo is not None:
+                L[rows.to_numpy(), k] = lo
+            if hi is not None:
+                U[rows.to_numpy(), k] = hi
+    return L, U, has_req
+
+
+def evaluate(recipes, price_dict, table, stages_req):
+    """
+    recipes 为长表（见 load_recipes/from_dict），table 为 NutrientTable。
+    返回每个配方一行的 DataFrame：配方、阶段、合计%、成本、各营养值、违反项数、违反明细、达标。
+    """
+    check_names(recipes, price_dict, table)
+    keys, X = pack(recipes, table)
+    names = sorted(table.index, key=table.index.get)
+    price = np.array([price_dict.get(n, 0.0) for n in names], dtype=float)
+    nutrients = sorted(table.nut_idx, key=table.nut_idx.get)
+
+    cost = X @ price
+    N = np.asarray((X @ table.matrix.T).todense())[:, [table.nut_idx[n] for n in nutrients]]
+    L, U, has_req = bound_matrices(keys['阶段'].to_numpy(), stages_req, nutrients)
+    low = N < L - TOL * np.abs(L)
+    high = N > U + TOL * np.abs(U)
+
+    out = keys.copy()
+    out['合计%'] = np.asarray(X.sum(axis=1)).ravel() * 100
+    out['成本'] = cost
+    for k, nut in enumerate(nutrients):
+        out[nut] = N[:, k]
+    out['违反项数'] = low.sum(axis=1) + high.sum(axis=1)
+    detail = []
+    for i in range(len(out)):
+        items = [f"{nut}<{L[i, k]:g}" for k, nut in enumerate(nutrients) if low[i, k]]
+        items += [f"{nut}>{U[i, k]:g}" for k, nut in enumerate(nutrients) if high[i, k]]
+        detail.append('；'.join(items) if has_req[i] else '无阶段标准')
+    out['违反明细'] = detail
+    out['达标'] = has_req & (out['违反项数'].to_numpy() == 0)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量评估配方的成本与营养达标情况')
+    parser.add_argument('recipes', nargs='?', help='配方表（CSV/Excel）；缺省评估典型配方')
+    parser.add_argument('-o', '--output', help='结果表（.csv 或 .xlsx）')
+    args = parser.parse_args()
+
+    import 配方
+    from 原料目录 import load_catalog
+    catalog = load_catalog(配方.price_dict, 配方.nutr_val, 配方.nut_idx, verbose=False)
+    recipes = load_recipes(args.recipes) if args.recipes else from_dict(配方.typical_formulations)
+    try:
+        table = evaluate(recipes, catalog.price_dict(), catalog.nutrient_table(配方.nut_idx),
+                         配方.stages_req)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    pd.set_option('display.width', 200)
+    print(table.round(3).to_string(index=False))
+    print(f"\n共 {len(table)} 个配方，达标 {int(table['达标'].sum())} 个")
+    if args.output:
+        if args.output.lower().endswith('.xlsx'):
+            table.to_excel(args.output, index=False)
+        else:
+            table.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
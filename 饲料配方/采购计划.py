@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+多期采购与库存计划：12–24 个月 × 全部阶段放进一个稀疏 LP。
+
+变量（每个月 t）：
+    x[t,s,j]   阶段 s 的日粮配比（沿用该阶段 StageModel 的全部约束）
+    buy[t,i]   原料 i 的采购量（kg DM）
+    inv[t,i]   月末库存（kg DM）
+约束：
+    inv[t,i] = inv[t-1,i] + buy[t,i] - Σ_s D[t,s]·x[t,s,i]      D = 头数 × 采食量 × 天数
+    Σ_i inv[t,i] ≤ 仓储容量；不可储存的原料 inv = 0
+目标：Σ_t Σ_i 价格[t,i]·buy[t,i] + 仓储费[i]·inv[t,i]
+
+价格曲线：forward_curve() 以当前 price_dict 为基准，玉米、豆粕类原料按
+数据关联/全国饲料价格.xlsx 的月度季节性系数浮动；也可以传入自己的远期价格表。
+
+用法：python 采购计划.py --start 2025-01 --months 12 [--herd 牛群.csv] [--curve 远期价格.csv]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+
+from 价格风险 import FEED_PRICE_XLSX, HISTORY_MAP
+
+# 常用采食量参考值（kg DM/头/天）
+DEFAULT_DMI = {
+    '0-2月龄': 1.5, '3-6月龄': 4.0, '7-13月龄': 7.0, '14-23月龄': 10.0,
+    '围产产前21天': 12.0, '围产产后21天': 18.0,
+    '泌乳早期': 22.0, '泌乳中期': 21.0, '泌乳后期': 19.0,
+    '干奶前期': 13.0, '干奶后期': 12.0,
+}
+# 鲜奶、鲜糟、鲜渣等默认视为随用随购，不进入库存
+PERISHABLE = {'全脂牛奶', '啤酒糟', '酒糟', '甘薯渣', '苹果粕', '木薯渣'}
+# 默认月仓储费：价格的 1%
+CARRY_RATE = 0.01
+
+
+def month_index(start, months):
+    return pd.period_range(start=start, periods=months, freq='M')
+
+
+def seasonal_factors(path=FEED_PRICE_XLSX):
+    """全国饲料价格的月度季节系数：各自然月均价 / 全年均价，返回 {配方原料: Series(1..12)}"""
+    df = pd.read_excel(path)
+    factors = {}
+    for col, ings in HISTORY_MAP.items():
+        by_month = df.groupby('月份')[col].mean()
+        for ing in ings:
+            factors[ing] = by_month / by_month.mean()
+    return factors
+
+
+def forward_curve(price_dict, periods, factors=None):
+    """以当前价格为基准的远期价格表（行为月份，列为原料），有季节系数的原料按系数浮动"""
+    curve = pd.DataFrame({ing: float(p) for ing, p in price_dict.items()},
+                         index=periods, dtype=float)
+    for ing, f in (factors or {}).items():
+        if ing in curve:
+            # 以第一个月为基准，保证首月价格等于当前价格
+            rel = f.reindex(periods.month).to_numpy() / f.get(periods[0].month, 1.0)
+            curve[ing] = curve[ing] * rel
+    return curve
+
+
+def build_plan(stage_models, heads, periods, curve, capacity=np.inf, dmi=None,
+               carry=None, init_inv=None, perishable=PERISHABLE):
+    """
+    构造计划 LP，返回 (c, A_ub, b_ub, A_eq, b_eq, bounds, layout)。
+    heads: {阶段: 头数} 或 DataFrame（行为月份，列为阶段）。
+    """
+    dmi = dict(DEFAULT_DMI, **(dmi or {}))
+    stages = [s for s in stage_models if _heads(heads, s, periods).any()]
+    ings = list(dict.fromkeys(i for s in stages for i in stage_models[s].ingredients))
+    pos = {ing: i for i, ing in enumerate(ings)}
+    T, n = len(periods), len(ings)
+    days = periods.days_in_month.to_numpy()
+
+    # —— x 变量布局：每月依次排列各阶段的配比列 ——
+    ks = [stage_models[s].n for s in stages]
+    per_t = sum(ks)
+    nx, nb = T * per_t, T * n
+    nvar = nx + 2 * nb
+    buy0, inv0 = nx, nx + nb
+
+    # 阶段约束：每月一组块对角
+    blocks = [stage_models[s].A for s in stages]
+    A_stage = sparse.block_diag(blocks * T, format='csr')
+    rl_stage = np.tile(np.concatenate([stage_models[s].row_lower for s in stages]), T)
+    ru_stage = np.tile(np.concatenate([stage_models[s].row_upper for s in stages]), T)
+
+    # 消耗矩阵：原料 × 本月配比列，系数为 D[t,s]
+    cols_ing = np.concatenate([[pos[i] for i in stage_models[s].ingredients] for s in stages])
+    stage_of_col = np.repeat(np.arange(len(stages)), ks)
+    D = np.column_stack([_heads(heads, s, periods) * dmi[s] * days for s in stages])  # T×S
+
+    t_idx = np.repeat(np.arange(T), per_t)
+    rows_bal = t_idx * n + np.tile(cols_ing, T)
+    vals_use = D[t_idx, np.tile(stage_of_col, T)]
+    # 库存平衡：inv[t] - inv[t-1] - buy[t] + use[t] = init（t=0）或 0
+    tt = np.arange(nb)
+    A_bal = sparse.coo_matrix(
+        (np.concatenate([vals_use, np.ones(nb), -np.ones(nb), -np.ones(nb - n)]),
+         (np.concatenate([rows_bal, tt, tt, tt[n:]]),
+          np.concatenate([np.arange(nx), inv0 + tt, buy0 + tt, inv0 + tt[:-n]]))),
+        shape=(nb, nvar)).tocsr()
+    b_bal = np.zeros(nb)
+    if init_inv:
+        for ing, q in init_inv.items():
+            if ing in pos:
+                b_bal[pos[ing]] = q
+
+    # 阶段约束拆成 linprog 的等式/不等式
+    A_st = sparse.hstack([A_stage, sparse.csr_matrix((A_stage.shape[0], 2 * nb))]).tocsr()
+    eq = rl_stage == ru_stage
+    hi = ~eq & np.isfinite(ru_stage)
+    lo = ~eq & np.isfinite(rl_stage)
+    A_eq = sparse.vstack([A_st[eq], A_bal]).tocsr()
+    b_eq = np.concatenate([rl_stage[eq], b_bal])
+    A_ub = [A_st[hi], -A_st[lo]]
+    b_ub = [ru_stage[hi], -rl_stage[lo]]
+    if np.isfinite(capacity):
+        A_cap = sparse.coo_matrix((np.ones(nb), (np.repeat(np.arange(T), n), inv0 + tt)),
+                                  shape=(T, nvar))
+        A_ub.append(A_cap)
+        b_ub.append(np.full(T, float(capacity)))
+
+    # 目标与变量界限
+    price = curve.reindex(columns=ings).to_numpy(dtype=float)
+    if np.isnan(price).any():
+        missing = [i for i, bad in zip(ings, np.isnan(price).any(axis=0)) if bad]
+        raise ValueError(f"远期价格表缺少原料：{missing}")
+    carry_cost = np.array([(carry or {}).get(i, CARRY_RATE * price[0, j]) for j, i in enumerate(ings)])
+    c = np.concatenate([np.zeros(nx), price.ravel(), np.tile(carry_cost, T)])
+
+    lower = np.concatenate([np.tile(np.concatenate([stage_models[s].lower for s in stages]), T),
+                            np.zeros(2 * nb)])
+    upper = np.concatenate([np.tile(np.concatenate([stage_models[s].upper for s in stages]), T),
+                            np.full(nb, np.inf),
+                            np.tile([0.0 if i in perishable else np.inf for i in ings], T)])
+    layout = {'stages': stages, 'ingredients': ings, 'ks': ks, 'periods': periods,
+              'nx': nx, 'nb': nb, 'D': D}
+    return (c, sparse.vstack(A_ub).tocsr(), np.concatenate(b_ub), A_eq, b_eq,
+            np.column_stack([lower, upper]), layout)
+
+
+def _heads(heads, stage, periods):
+    if isinstance(heads, pd.DataFrame):
+        if stage not in heads:
+            return np.zeros(len(periods))
+        return heads[stage].reindex(periods).fillna(0).to_numpy(dtype=float)
+    return np.full(len(periods), float(heads.get(stage, 0)))
+
+
+def solve_plan(stage_models, heads, periods, curve, **kwargs):
+    """
+    求解计划 LP，返回 (res, 采购表, 库存表, 日粮表)。
+    采购/库存表为 月份 × 原料（吨 DM），日粮表为 (月份, 阶段) × 原料（%）。
+    """
+    c, A_ub, b_ub, A_eq, b_eq, bounds, L = build_plan(stage_models, heads, periods, curve, **kwargs)
+    res = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+    if not res.success:
+        return res, None, None, None
+    T, n, nx, nb = len(periods), len(L['ingredients']), L['nx'], L['nb']
+    buy = pd.DataFrame(res.x[nx:nx + nb].reshape(T, n) / 1000, index=periods, columns=L['ingredients'])
+    inv = pd.DataFrame(res.x[nx + nb:].reshape(T, n) / 1000, index=periods, columns=L['ingredients'])
+    rows, off = [], 0
+    for t, p in enumerate(periods):
+        for s, k in zip(L['stages'], L['ks']):
+            rows.append(pd.Series(res.x[off:off + k] * 100, index=stage_models[s].ingredients,
+                                  name=(p, s)))
+            off += k
+    rations = pd.DataFrame(rows).fillna(0.0)
+    rations.index = pd.MultiIndex.from_tuples(rations.index, names=['月份', '阶段'])
+    return res, buy, inv, rations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多期采购与库存计划')
+    parser.add_argument('--start', default=str(pd.Period.now('M') + 1))
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--herd', help='牛群表（CSV：阶段,头数[,采食量]）；缺省每个可行阶段 100 头')
+    parser.add_argument('--curve', help='远期价格表（CSV：首列为月份 YYYY-MM，其余列为原料）')
+    parser.add_argument('--capacity', type=float, default=np.inf, help='仓储容量（吨 DM）')
+    parser.add_argument('-o', '--output', default='采购计划.xlsx')
+    args = parser.parse_args()
+
+    import 配方
+    models = 配方.build_stage_models()
+    periods = month_index(args.start, args.months)
+
+    dmi = {}
+    if args.herd:
+        herd = pd.read_csv(args.herd, encoding='utf-8')
+        heads = dict(zip(herd['阶段'], herd['头数']))
+        if '采食量' in herd:
+            dmi = dict(zip(herd['阶段'], herd['采食量']))
+    else:
+        heads = {s: 100 for s, m in models.items() if m.solve().success}
+    skipped = [s for s in heads if s not in models or not models[s].solve().success]
+    if skipped:
+        print("以下阶段单期即不可行，不纳入计划：", skipped)
+        heads = {s: h for s, h in heads.items() if s not in skipped}
+
+    if args.curve:
+        curve = pd.read_csv(args.curve, index_col=0, encoding='utf-8')
+        curve.index = pd.PeriodIndex(curve.index, freq='M')
+        curve = curve.reindex(periods).ffill()
+    else:
+        curve = forward_curve(配方.price_dict, periods, seasonal_factors())
+
+    res, buy, inv, rations = solve_plan(models, heads, periods, curve,
+                                        capacity=args.capacity * 1000, dmi=dmi)
+    if not res.success:
+        print("计划求解失败:", res.message)
+        return
+    print(f"计划总成本 {res.fun / 10000:.2f} 万元（{len(periods)} 个月，变量 {len(res.x)} 个）")
+    print("\n采购计划（吨 DM）:")
+    print(buy.loc[:, buy.sum() > 1e-6].round(1).to_string())
+    with pd.ExcelWriter(args.output) as writer:
+        buy.to_excel(writer, sheet_name='采购')
+        inv.to_excel(writer, sheet_name='库存')
+        rations.to_excel(writer, sheet_name='日粮')
+    print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()